@@ -1,11 +1,13 @@
 from .component_factory import ComponentFactory
 from .pipeline_manager import PipelineManager
+from .prediction_cache import PredictionCache
 from .problem_manager import ProblemManager
 from .sampler_factory import SamplerFactory
 
 __all__ = [
     'ComponentFactory',
     'PipelineManager',
+    'PredictionCache',
     'ProblemManager',
     'SamplerFactory',
     ]
@@ -52,6 +52,9 @@ class ComponentFactory(object):
         :param config: Parameters used to instantiate all components.
         :type config: :py:class:`ptp.configuration.ConfigInterface`
 
+        .. note::
+            The component will use the runtime context (``AppState`` with global variables) the ``config`` belongs to.
+
         :return: tuple (component, component class).
         """
 
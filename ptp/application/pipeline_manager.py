@@ -18,6 +18,8 @@ __author__ = "Tomasz Kornuta"
 
 
 import os
+import copy
+import time
 import torch
 from datetime import datetime
 from numpy import inf
@@ -25,7 +27,9 @@ from numpy import inf
 import ptp.components
 
 import ptp.utils.logger as logging
-from ptp.utils.app_state import AppState
+import ptp.configuration.config_parsing as config_parse
+from ptp.configuration.config_interface import ConfigInterface
+from ptp.configuration.runtime_context import RuntimeContext
 from ptp.configuration.configuration_error import ConfigurationError
 from ptp.application.component_factory import ComponentFactory
 
@@ -41,25 +45,40 @@ class PipelineManager(object):
         :param config: Parameters used to instantiate all required components.
         :type config: :py:class:`ptp.configuration.ConfigInterface`
 
+        .. note::
+            The pipeline (and all its components) will use the runtime context the ``config`` belongs to \
+            (by default the context wrapping the ``AppState`` and ``ConfigRegistry`` singletons).
+
         """
         # Initialize the logger.
         self.name = name
         self.config = config
-        self.app_state = AppState()
-        self.logger = logging.initialize_logger(name)
+        # Get the runtime context and its application state.
+        self.context = config.context
+        self.app_state = self.context.app_state
+        self.logger = logging.initialize_logger(name, app_state=self.app_state)
 
         # Set initial values of all pipeline elements.
         # Empty list of all components, sorted by their priorities.
         self.__components = {}
+        # Names of aggregators added by the components (component name -> list of keys).
+        self.__aggregator_keys = {}
         # Empty list of all models - it will contain only "references" to objects stored in the components list.
         self.models = []
         # Empty list of all losses - it will contain only "references" to objects stored in the components list.
         self.losses = []
+        # Version of parameters of models, incremented whenever they are loaded or quantized \
+        # (so e.g. the prediction cache knows when its entries became stale).
+        self.parameters_version = 0
 
         # Initialization of best loss - as INF.
         self.best_loss = inf
         self.best_status = "Unknown"
 
+        # Times spent in components (name -> (number of calls, seconds)), measured only when timing is enabled.
+        self.timings = {}
+        self.timing = False
+
 
     def build(self, use_logger=True):
         """
@@ -201,18 +220,10 @@ class PipelineManager(object):
         :return: True if this is currently the best model (until the current episode, considering the loss).
         """
         # Checkpoint to be saved.
-        chkpt = {'name': self.name,
-                 'timestamp': datetime.now(),
-                 'episode': self.app_state.episode,
-                 'loss': loss,
-                 'status': training_status,
-                 'status_timestamp': datetime.now(),
-                }
-        
+        chkpt = self.create_checkpoint(training_status, loss)
+
         model_str = ''
-        # Save state dicts of all models.
         for model in self.models:
-            model.save_to_checkpoint(chkpt)
             model_str += "  + Model '{}' [{}] params saved \n".format(model.name, type(model).__name__)
 
         # Save the intermediate checkpoint.
@@ -249,6 +260,33 @@ class PipelineManager(object):
         # Else: that was not the best "model".
         return False
 
+    def create_checkpoint(self, training_status, loss):
+        """
+        Creates checkpoint (dictionary) containing the state dicts of all models in the pipeline along with some additional statistics.
+
+        :param training_status: String representing the current status of training.
+        :type training_status: str
+
+        :param loss: Loss value associated with the checkpoint.
+
+        :return: Checkpoint (dictionary) that can be saved to file.
+        """
+        chkpt = {'name': self.name,
+                 'timestamp': datetime.now(),
+                 'episode': self.app_state.episode,
+                 'loss': loss,
+                 'status': training_status,
+                 'status_timestamp': datetime.now(),
+                 'quantized': [model.name for model in self.models if model.quantized],
+                }
+        
+        # Save state dicts of all models.
+        for model in self.models:
+            model.save_to_checkpoint(chkpt)
+
+        return chkpt
+
+
     def load(self, checkpoint_file):
         """
         Loads parameters of models in the pipeline from the specified checkpoint file.
@@ -280,6 +318,8 @@ class PipelineManager(object):
                 model_str += "  + Model '{}' [{}] params not found in checkpoint!\n".format(model.name, type(model).__name__)
                 warning = True
 
+        self.parameters_version += 1
+
         # Log results.
         log_str += model_str
         if warning:
@@ -287,6 +327,116 @@ class PipelineManager(object):
         else:
             self.logger.info(log_str)
 
+    def export(self, artifact_file):
+        """
+        Exports the built pipeline into a single, self-contained artifact, that can be next restored \
+        (by :py:func:`restore`) without parsing the configuration files or accessing the data folders.
+
+        The artifact contains:
+            - configurations of all components (in the order of their priorities),
+            - default configurations of all component classes,
+            - global variables (e.g. sizes of inputs or word mappings exported by the problem),
+            - vocabularies (word mappings) used by the components,
+            - state dicts of all models.
+
+        :param artifact_file: Name of the file (with path) the artifact will be saved to.
+        :type artifact_file: str
+        """
+        components = []
+        default_configs = {}
+        vocabularies = {}
+        for prio in self.__priorities:
+            comp = self.__components[prio]
+            c_config = copy.deepcopy(comp.config.to_dict())
+            # Models will be restored from the artifact, not from the checkpoints.
+            c_config.pop("load", None)
+            components.append((comp.name, c_config))
+            default_configs[type(comp).__module__] = config_parse.load_class_default_config_file(type(comp), self.context)
+            # Remember the word mappings.
+            if hasattr(comp, "word_to_ix"):
+                vocabularies[comp.name] = comp.word_to_ix
+
+        artifact = {'name': self.name,
+                    'timestamp': str(datetime.now()),
+                    'components': components,
+                    'default_configs': default_configs,
+                    'globals': {key: self.app_state[key] for key in self.app_state.globalkeys()},
+                    'vocabularies': vocabularies,
+                    'quantized': [model.name for model in self.models if model.quantized],
+                    'models': {model.name: model.state_dict() for model in self.models},
+                    }
+        artifact_file = os.path.expanduser(artifact_file)
+        torch.save(artifact, artifact_file)
+        self.logger.info("Exported pipeline '{}' with {} components to artifact:\n {}".format(self.name, len(components), artifact_file))
+
+
+    @staticmethod
+    def restore(artifact_file, context=None):
+        """
+        Restores the pipeline from the artifact created by :py:func:`export`.
+
+        The default configurations and vocabularies are taken from the artifact, so no configuration files, \
+        word mappings files or pretrained embeddings are loaded from the disk.
+
+        :param artifact_file: Name of the file (with path) containing the artifact.
+        :type artifact_file: str
+
+        :param context: Runtime context the pipeline will be restored in (DEFAULT: None, means that a new, independent \
+        context will be created, so several artifacts can be restored in a single process)
+        :type context: :py:class:`ptp.configuration.RuntimeContext`
+
+        :return: Restored :py:class:`PipelineManager` (with models set to evaluation mode).
+        """
+        # This is to be able to load a CUDA-trained model on CPU
+        artifact = torch.load(os.path.expanduser(artifact_file), map_location=lambda storage, loc: storage)
+
+        if context is None:
+            # Global variables are immutable, so every artifact gets its own context.
+            context = RuntimeContext()
+        app_state = context.app_state
+        # Restore the global variables.
+        for key, value in artifact['globals'].items():
+            app_state[key] = value
+
+        # Restore the default configurations.
+        for class_module, param_dict in artifact['default_configs'].items():
+            config_parse.add_class_default_config(class_module, param_dict, context)
+
+        # Restore the configuration.
+        config = {'name': artifact['name']}
+        for (c_key, c_config) in artifact['components']:
+            if c_key in artifact['vocabularies']:
+                # Import the word mappings from (component-specific) global variable.
+                vocabulary_key = "{}_word_mappings".format(c_key)
+                app_state[vocabulary_key] = artifact['vocabularies'][c_key]
+                if c_config.get("globals", None) is None:
+                    c_config["globals"] = {}
+                c_config["globals"]["word_mappings"] = vocabulary_key
+                c_config["import_word_mappings_from_globals"] = True
+            # Embeddings will be restored along with the rest of the model.
+            if "pretrained_embeddings_file" in c_config:
+                c_config["pretrained_embeddings_file"] = ''
+            config[c_key] = c_config
+        root_config = ConfigInterface(context=context)
+        root_config.add_config_params({'pipeline': config})
+
+        # Build the pipeline.
+        pipeline = PipelineManager(artifact['name'], root_config['pipeline'])
+        errors = pipeline.build()
+        if errors > 0:
+            raise ConfigurationError("Found {} errors while restoring pipeline from artifact '{}'".format(errors, artifact_file))
+
+        # Load the models.
+        chkpt = dict(artifact['models'])
+        chkpt['quantized'] = artifact['quantized']
+        for model in pipeline.models:
+            model.load_from_checkpoint(chkpt)
+        pipeline.eval()
+
+        pipeline.logger.info("Restored pipeline '{}' from artifact (exported on {})".format(artifact['name'], artifact['timestamp']))
+        return pipeline
+
+
     def load_models(self):
         """
         Method analyses the configuration and loads models one by one by looking whether they got 'load' variable present in their configuration section.
@@ -353,6 +503,7 @@ class PipelineManager(object):
             exit(-6)
         else:
             self.logger.info(log_str)
+        self.parameters_version += 1
 
 
     def freeze_models(self):
@@ -501,27 +652,49 @@ class PipelineManager(object):
         :param data_dict: :py:class:`ptp.utils.DataDict` object containing both input data to be processed and that will be extended by the results.
 
         """
+        # Pipeline might be used outside of the worker (e.g. when restored from artifact), without command line arguments.
+        use_gpu = (self.app_state.args is not None) and self.app_state.args.use_gpu
+
         # TODO: Convert to gpu/CUDA.
-        if self.app_state.args.use_gpu:
+        if use_gpu:
             data_dict.cuda()
 
         for prio in self.__priorities:
             # Get component
             comp = self.__components[prio]
             # Forward step.
-            comp(data_dict)
+            if self.timing:
+                start = time.perf_counter()
+                comp(data_dict)
+                calls, seconds = self.timings[comp.name]
+                self.timings[comp.name] = (calls + 1, seconds + time.perf_counter() - start)
+            else:
+                comp(data_dict)
             # Component might add some fields to DataDict, move them to GPU if required.
-            if self.app_state.args.use_gpu:
+            if use_gpu:
                 data_dict.cuda()
             #print("after {}".format(comp.name))
             #print(data_dict.keys())
 
+    def enable_timing(self):
+        """
+        Enables measuring of times spent in the components during the forward pass.
+
+        .. note::
+            Times are measured on the host, i.e. asynchronous (GPU) computations are attributed to the \
+            components that are waiting for their results.
+
+        """
+        # Create all entries at once, so the dictionary can be safely read by other threads.
+        self.timings = {self.__components[prio].name: (0, 0.0) for prio in self.__priorities}
+        self.timing = True
+
     def eval(self):
         """ 
         Sets evaluation mode for all models in the pipeline.
         """
         for model in self.models:
-            model.eval
+            model.eval()
 
     def train(self):
         """ 
@@ -530,6 +703,15 @@ class PipelineManager(object):
         for model in self.models:
             model.train()
 
+    def reset_states(self, training=None):
+        """ 
+        Resets states carried between consecutive batches by all models in the pipeline.
+
+        :param training: Mode which states will be reset: training (True), evaluation (False) or both (DEFAULT: None)
+        """
+        for model in self.models:
+            model.reset_state(training)
+
     def cuda(self):
         """ 
         Moves all models to GPU.
@@ -539,6 +721,19 @@ class PipelineManager(object):
             model.cuda()
 
 
+    def quantize(self):
+        """ 
+        Applies post-training dynamic int8 quantization to all models in the pipeline.
+
+        .. warning::
+            Quantized models can be executed on CPU only.
+        """
+        self.logger.info("Quantizing model(s)")
+        for model in self.models:
+            model.quantize()
+        self.parameters_version += 1
+
+
     def zero_grad(self):
         """ 
         Resets gradients in all trainable components of the pipeline.
@@ -587,8 +782,10 @@ class PipelineManager(object):
         num_losses = 0
         for loss in self.losses:
             for key in loss.loss_keys():
-                loss_sum += data_dict[key].cpu().item()
+                loss_sum += data_dict[key].detach()
                 num_losses +=1
+        # Synchronize with the host once.
+        loss_sum = float(loss_sum)
         # Display additional information for multi-loss pipelines.
         if num_losses > 1:
             self.logger.info("Total loss: {}".format(loss_sum))
@@ -640,7 +837,8 @@ class PipelineManager(object):
 
     def collect_statistics(self, stat_col, data_dict):
         """
-        Collects statistics for every component in the pipeline.
+        Collects statistics for every component in the pipeline (skipping the components which \
+        collection policy excludes the current episode).
 
         :param stat_col: :py:class:`ptp.utils.StatisticsCollector`.
 
@@ -650,7 +848,8 @@ class PipelineManager(object):
         """
         for prio in self.__priorities:
             comp = self.__components[prio]
-            comp.collect_statistics(stat_col, data_dict)
+            if comp.should_collect_statistics(stat_col):
+                comp.collect_statistics(stat_col, data_dict)
 
 
     def add_aggregators(self, stat_agg):
@@ -662,7 +861,10 @@ class PipelineManager(object):
         """
         for prio in self.__priorities:
             comp = self.__components[prio]
+            # Remember the aggregators added by the component.
+            keys = set(stat_agg.aggregators.keys())
             comp.add_aggregators(stat_agg)
+            self.__aggregator_keys[comp.name] = [key for key in stat_agg.aggregators.keys() if key not in keys]
 
 
     def aggregate_statistics(self, stat_col, stat_agg):
@@ -676,4 +878,11 @@ class PipelineManager(object):
         """
         for prio in self.__priorities:
             comp = self.__components[prio]
-            comp.aggregate_statistics(stat_col, stat_agg)
+            # Skip components that do not collect statistics in this phase, leaving their aggregators missing.
+            if not comp.collects_statistics_in_phase(stat_col.phase):
+                for key in self.__aggregator_keys.get(comp.name, []):
+                    stat_agg.aggregators[key] = None
+        for prio in self.__priorities:
+            comp = self.__components[prio]
+            if comp.collects_statistics_in_phase(stat_col.phase):
+                comp.aggregate_statistics(stat_col, stat_agg)
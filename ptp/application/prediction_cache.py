@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import os
+import hashlib
+import torch
+from collections import OrderedDict
+
+import ptp.utils.logger as logging
+from ptp.data_types.data_dict import DataDict
+
+
+class PredictionCache(object):
+    """
+    Content-addressed cache of predictions, placed in front of :py:func:`PipelineManager.forward` (for inference only).
+
+    Every sample (row) of the batch is identified by a hash of the input streams consumed by the pipeline, combined \
+    with the fingerprint of the models' parameters. Samples that were already processed are taken out of the batch, \
+    the remaining ones are passed through the pipeline, and the cached and newly computed rows of the output streams \
+    are merged back into the processed ``DataDict``.
+
+    The cache is bounded (Least Recently Used entries are removed first) and can be stored to/restored from file.
+
+    The fingerprint is recomputed (and stale entries are dropped) whenever parameters of models are loaded from \
+    a checkpoint or quantized by the pipeline manager. Changes made in other ways (e.g. by an optimizer) require \
+    a call to :py:func:`refresh`. Typical usage, replacing the call of ``pipeline.forward`` in the testing loop:
+
+        >>> pipeline.load(checkpoint_file)
+        >>> cache = PredictionCache(pipeline, problem.output_data_definitions().keys(), ['predictions'])
+        >>> for batch in problem.dataloader:
+        >>>     cache.forward(batch)
+
+    .. warning::
+        Only the indicated output streams are returned for the batch, i.e. all other streams produced by the pipeline \
+        (e.g. losses) are dropped. Rows of tensor streams must have identical shapes across the samples.
+    """
+
+    def __init__(self, pipeline, input_keys, output_keys, max_entries=10000, cache_file=None):
+        """
+        Initializes the cache.
+
+        :param pipeline: Pipeline used for processing of samples that are not in the cache.
+        :type pipeline: :py:class:`PipelineManager`
+
+        :param input_keys: List of (problem output) streams consumed by the pipeline, used for computing of the hash.
+
+        :param output_keys: List of streams produced by the pipeline that will be cached.
+
+        :param max_entries: Maximum number of cached samples (DEFAULT: 10000)
+        :type max_entries: int
+
+        :param cache_file: Name of the file (with path) the cache will be loaded from (if exists), optional (DEFAULT: None)
+        :type cache_file: str
+        """
+        self.pipeline = pipeline
+        self.input_keys = list(input_keys)
+        self.output_keys = list(output_keys)
+        self.max_entries = max_entries
+        self.logger = logging.initialize_logger('PredictionCache', app_state=pipeline.app_state)
+
+        # Cached rows: hash -> {output_key: row}.
+        self.entries = OrderedDict()
+
+        # Fingerprint of the models - cached entries become invalid when parameters change.
+        self.fingerprint = None
+        self.refresh()
+
+        # Statistics.
+        self.hits = 0
+        self.misses = 0
+
+        if cache_file is not None and os.path.isfile(os.path.expanduser(cache_file)):
+            self.load(cache_file)
+
+
+    def refresh(self):
+        """
+        Recomputes the fingerprint of the models, dropping all cached entries when their parameters have changed.
+        """
+        self.parameters_version = self.pipeline.parameters_version
+        fingerprint = self.compute_fingerprint()
+        if self.fingerprint is not None and fingerprint != self.fingerprint and len(self.entries) > 0:
+            self.logger.info("Parameters of models have changed, dropping {} cached predictions".format(len(self.entries)))
+            self.entries.clear()
+        self.fingerprint = fingerprint
+
+
+    def compute_fingerprint(self):
+        """
+        Computes fingerprint of the pipeline, i.e. hash of the parameters (and buffers) of all its models.
+
+        :return: Fingerprint (hex string).
+        """
+        digest = hashlib.sha1(self.pipeline.name.encode())
+        for model in self.pipeline.models:
+            digest.update(model.name.encode())
+            for name, value in model.state_dict().items():
+                digest.update(name.encode())
+                self.__update_digest(digest, value)
+        return digest.hexdigest()
+
+
+    def __update_digest(self, digest, value):
+        """
+        Updates the digest with the content of a given value (tensor, list, string etc.).
+        """
+        if isinstance(value, torch.Tensor):
+            value = value.detach().cpu()
+            if value.is_quantized:
+                value = value.int_repr()
+            digest.update(str(value.dtype).encode())
+            digest.update(str(tuple(value.shape)).encode())
+            digest.update(value.contiguous().numpy().tobytes())
+        elif isinstance(value, (list, tuple)):
+            digest.update(str(len(value)).encode())
+            for item in value:
+                self.__update_digest(digest, item)
+        else:
+            digest.update(repr(value).encode())
+
+
+    def sample_hash(self, data_dict, index):
+        """
+        Computes hash of a single sample (row) of the batch.
+
+        :param data_dict: ``DataDict`` containing the batch.
+
+        :param index: Index of the sample in the batch.
+
+        :return: Hash (hex string).
+        """
+        digest = hashlib.sha1(self.fingerprint.encode())
+        for key in self.input_keys:
+            digest.update(key.encode())
+            self.__update_digest(digest, data_dict[key][index])
+        return digest.hexdigest()
+
+
+    def forward(self, data_dict):
+        """
+        Processes the batch, using the cached predictions when possible.
+
+        :param data_dict: :py:class:`ptp.utils.DataDict` object containing input data, that will be extended by the cached output streams.
+
+        """
+        # Parameters of models were loaded (or quantized) in the meantime.
+        if self.parameters_version != self.pipeline.parameters_version:
+            self.refresh()
+
+        batch_size = len(data_dict[self.input_keys[0]])
+        hashes = [self.sample_hash(data_dict, i) for i in range(batch_size)]
+
+        # Find the samples that must be processed (once, even if repeated in the batch).
+        missing = OrderedDict()
+        for i, h in enumerate(hashes):
+            if h in self.entries:
+                self.entries.move_to_end(h)
+                self.hits += 1
+            elif h not in missing:
+                missing[h] = i
+                self.misses += 1
+            else:
+                self.hits += 1
+        missing = list(missing.values())
+
+        if len(missing) > 0:
+            # Create batch consisting of the missing samples only.
+            sub_dict = DataDict({key: self.__select_rows(value, missing, batch_size) for key, value in data_dict.items()})
+            # Process it.
+            self.pipeline.forward(sub_dict)
+            # Cache outputs.
+            for row, i in enumerate(missing):
+                self.entries[hashes[i]] = {key: self.__get_row(sub_dict[key], row) for key in self.output_keys}
+                self.entries.move_to_end(hashes[i])
+
+        # Merge the cached rows into the outputs.
+        outputs = {}
+        for key in self.output_keys:
+            rows = [self.entries[h][key] for h in hashes]
+            if all(isinstance(row, torch.Tensor) for row in rows):
+                outputs[key] = torch.stack(rows)
+            else:
+                outputs[key] = rows
+        data_dict.extend(outputs)
+
+        # Remove the least recently used entries.
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+    def __select_rows(self, value, rows, batch_size):
+        """
+        Selects rows of a given stream.
+        """
+        if isinstance(value, torch.Tensor) and value.dim() > 0 and value.shape[0] == batch_size:
+            return value[torch.tensor(rows, dtype=torch.long, device=value.device)]
+        elif isinstance(value, list) and len(value) == batch_size:
+            return [value[i] for i in rows]
+        # Otherwise: pass the value "as is".
+        return value
+
+
+    def __get_row(self, value, row):
+        """
+        Gets a copy of a single row of a given stream.
+        """
+        if isinstance(value, torch.Tensor):
+            # Clone, so the entry won't keep the whole batch in memory.
+            return value[row].detach().clone()
+        return value[row]
+
+
+    def save(self, cache_file):
+        """
+        Saves the cache to file.
+
+        :param cache_file: Name of the file (with path).
+        :type cache_file: str
+        """
+        cache_file = os.path.expanduser(cache_file)
+        torch.save({'fingerprint': self.fingerprint, 'entries': list(self.entries.items())}, cache_file)
+        self.logger.info("Saved {} cached predictions to '{}'".format(len(self.entries), cache_file))
+
+
+    def load(self, cache_file):
+        """
+        Loads the cache from file. Entries created for a different fingerprint (i.e. other model parameters) are skipped.
+
+        :param cache_file: Name of the file (with path).
+        :type cache_file: str
+        """
+        cache_file = os.path.expanduser(cache_file)
+        # This is to be able to load the cache created on GPU on CPU.
+        cache = torch.load(cache_file, map_location=lambda storage, loc: storage)
+        if cache['fingerprint'] != self.fingerprint:
+            self.logger.warning("Skipping cached predictions from '{}' as they were created by different model(s)".format(cache_file))
+            return
+        for h, entry in cache['entries']:
+            self.entries[h] = entry
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self.logger.info("Loaded {} cached predictions from '{}'".format(len(self.entries), cache_file))
+
+
+    def __len__(self):
+        """
+        Returns the number of cached samples.
+        """
+        return len(self.entries)
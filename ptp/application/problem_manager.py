@@ -21,6 +21,7 @@ import logging
 import numpy as np
 
 from torch.utils.data import DataLoader
+from torch.utils.data.sampler import BatchSampler, RandomSampler, SequentialSampler
 
 import ptp
 
@@ -95,18 +96,43 @@ class ProblemManager(object):
                 # Set shuffle to False - REQUIRED as those two are exclusive.
                 self.config['dataloader'].add_config_params({'shuffle': False})
 
+            # Problems returning consecutive parts of sequences in consecutive batches cannot be shuffled.
+            if getattr(self.problem, 'sequential_batches', False):
+                if self.sampler is not None:
+                    raise ConfigurationError("Problem returns sequential batches, thus it cannot be used along with a sampler")
+                self.config['dataloader'].add_config_params({'shuffle': False})
+
+            # Check whether the DataLoader should be driven by a batch sampler.
+            self.batch_sampler = self.config['dataloader']['batch_sampler']
+            if isinstance(self.sampler, BatchSampler):
+                self.batch_sampler = self.sampler
+            elif self.batch_sampler is None and hasattr(self.problem, '__getitems__'):
+                # Problem fetches whole batches at once (see Problem), so the DataLoader will pass it batches of indices.
+                sampler = self.sampler
+                if sampler is None:
+                    sampler = RandomSampler(self.problem) if self.config['dataloader']['shuffle'] else SequentialSampler(self.problem)
+                self.batch_sampler = BatchSampler(sampler, self.config['problem']['batch_size'], self.config['dataloader']['drop_last'])
+
             # build the DataLoader on top of the validation problem
-            self.dataloader = DataLoader(dataset=self.problem,
-                                batch_size=self.config['problem']['batch_size'],
-                                shuffle=self.config['dataloader']['shuffle'],
-                                sampler=self.sampler,
-                                batch_sampler=self.config['dataloader']['batch_sampler'],
-                                num_workers=self.config['dataloader']['num_workers'],
-                                collate_fn=self.problem.collate_fn,
-                                pin_memory=self.config['dataloader']['pin_memory'],
-                                drop_last=self.config['dataloader']['drop_last'],
-                                timeout=self.config['dataloader']['timeout'],
-                                worker_init_fn=self.worker_init_fn)
+            if self.batch_sampler is not None:
+                self.dataloader = DataLoader(dataset=self.problem,
+                                    batch_sampler=self.batch_sampler,
+                                    num_workers=self.config['dataloader']['num_workers'],
+                                    collate_fn=self.problem.collate_fn,
+                                    pin_memory=self.config['dataloader']['pin_memory'],
+                                    timeout=self.config['dataloader']['timeout'],
+                                    worker_init_fn=self.worker_init_fn)
+            else:
+                self.dataloader = DataLoader(dataset=self.problem,
+                                    batch_size=self.config['problem']['batch_size'],
+                                    shuffle=self.config['dataloader']['shuffle'],
+                                    sampler=self.sampler,
+                                    num_workers=self.config['dataloader']['num_workers'],
+                                    collate_fn=self.problem.collate_fn,
+                                    pin_memory=self.config['dataloader']['pin_memory'],
+                                    drop_last=self.config['dataloader']['drop_last'],
+                                    timeout=self.config['dataloader']['timeout'],
+                                    worker_init_fn=self.worker_init_fn)
 
             # Display sizes.
             if log:
@@ -187,6 +213,10 @@ class ProblemManager(object):
         :return: Number of iterations to perform to go though the entire dataset once.
 
         """
+        # Batch sampler knows the number of batches.
+        if self.batch_sampler is not None:
+            return len(self.batch_sampler)
+
         # "Estimate" dataset size.
         if (self.sampler is not None):
             problem_size = len(self.sampler)
@@ -204,7 +234,12 @@ class ProblemManager(object):
         """
         Returns total number of samples, calculated depending on the settings (batch size, dataloader, drop last etc.).
         """
-        if self.dataloader.drop_last:
+        if self.batch_sampler is not None:
+            if self.batch_sampler.drop_last:
+                total_num_samples = len(self.batch_sampler) * self.batch_sampler.batch_size
+            else:
+                total_num_samples = len(self.batch_sampler.sampler)
+        elif self.dataloader.drop_last:
             # if we are supposed to drop the last (incomplete) batch.
             total_num_samples = len(self.dataloader) * self.dataloader.batch_size
         elif self.sampler is not None:
@@ -50,8 +50,7 @@ class SamplerFactory(object):
 
         .. warning::
 
-            ``torch.utils.data.sampler.BatchSampler``, \
-            ``torch.utils.data.sampler.DistributedSampler`` are not supported yet.
+            ``torch.utils.data.sampler.DistributedSampler`` is not supported yet.
 
         .. note::
 
@@ -72,7 +71,15 @@ class SamplerFactory(object):
 
         .. note::
 
-            ``torch.utils.data.sampler.WeightedRandomSampler`` expercse additional parameter 'weights'.
+            ``torch.utils.data.sampler.WeightedRandomSampler`` expercse additional parameter 'weights' \
+            (name of the file with weights). When it is not present, the sampler uses the ``sample_weights`` \
+            provided by the problem (e.g. numbers of occurrences of collapsed samples).
+
+        .. note::
+
+            ``torch.utils.data.sampler.BatchSampler`` expects 'batch_size' and accepts 'drop_last' (DEFAULT: False) \
+            along with the 'sampler' subsection, configuring the sampler which indices will be grouped \
+            (DEFAULT: ``RandomSampler``).
 
         :return: Instance of a given sampler or ``None`` if the section not present or couldn't build the sampler.
 
@@ -155,17 +162,39 @@ class SamplerFactory(object):
 
             elif sampler_class.__name__ == 'WeightedRandomSampler':
 
-                # Check presence of the name attribute.
-                if 'weights' not in config:
+                if 'weights' in config:
+                    # Load weights from file.
+                    weights = np.fromfile(os.path.expanduser(config['weights']), dtype=float, count=-1, sep=',')
+                elif getattr(problem, 'sample_weights', None) is not None:
+                    # Use weights provided by the problem.
+                    weights = problem.sample_weights
+                else:
                     raise ConfigurationError("The sampler configuration section does not contain the key 'weights' "
-                                    "required by WeightedRandomSampler.")
+                                    "required by WeightedRandomSampler (and problem does not provide sample weights).")
 
-                # Load weights from file.
-                weights = np.fromfile(os.path.expanduser(config['weights']), dtype=float, count=-1, sep=',')
                 # Create sampler class.
                 sampler = sampler_class(weights, len(problem), replacement=True)
 
-            elif sampler_class.__name__ in ['BatchSampler', 'DistributedSampler']:
+            elif sampler_class.__name__ == 'BatchSampler':
+
+                # Check presence of the batch_size attribute.
+                if 'batch_size' not in config:
+                    raise ConfigurationError("The sampler configuration section does not contain the key 'batch_size' "
+                                    "required by BatchSampler.")
+
+                # Build the sampler which indices will be grouped into batches.
+                if 'sampler' in config and config['sampler']:
+                    sampler = SamplerFactory.build(problem, config['sampler'])
+                    if sampler is None:
+                        raise ConfigurationError("Could not build the sampler used by BatchSampler")
+                else:
+                    sampler = torch.utils.data.sampler.RandomSampler(problem)
+
+                drop_last = config['drop_last'] if 'drop_last' in config else False
+                # Create sampler class.
+                sampler = sampler_class(sampler, int(config['batch_size']), bool(drop_last))
+
+            elif sampler_class.__name__ in ['DistributedSampler']:
                 # Sorry, don't support those. Yet;)
                 logger.error("Sampler Factory currently does not support {} sampler. Please pick one of the others "
                              "or use defaults random sampling.".format(sampler_class.__name__))
@@ -17,10 +17,11 @@
 __author__ = "Tomasz Kornuta"
 
 import abc
+import zlib
+import numpy as np
 
 import ptp.utils.logger as logging
 
-from ptp.utils.app_state import AppState
 from ptp.utils.globals_facade import GlobalsFacade
 from ptp.utils.key_mappings_facade import KeyMappingsFacade
 
@@ -46,9 +47,9 @@ class Component(abc.ABC):
 
             >>> self.logger = logging.getLogger(self.name)        
 
-        - sets the access to ``AppState``: for dtype, visualization flag etc.
+        - sets the access to ``AppState`` (of the runtime context the configuration belongs to): for dtype, visualization flag etc.
 
-            >>> self.app_state = AppState()
+            >>> self.app_state = config.context.app_state
 
         :param name: Name of the component.
 
@@ -61,15 +62,15 @@ class Component(abc.ABC):
         self.name = name
         self.config = config
 
-        # Get access to AppState: for command line args, globals etc.
-        self.app_state = AppState()
+        # Get access to AppState of the runtime context: for command line args, globals etc.
+        self.app_state = config.context.app_state
 
         # Initialize logger.
-        self.logger = logging.initialize_logger(self.name)        
+        self.logger = logging.initialize_logger(self.name, app_state=self.app_state)
 
         # Load default configuration.
         if class_type is not None:
-            self.config.add_default_params(load_class_default_config_file(class_type))
+            self.config.add_default_params(load_class_default_config_file(class_type, config.context))
 
         # Initialize the "streams mapping facility".
         if "streams" not in config or config["streams"] is None:
@@ -93,7 +94,26 @@ class Component(abc.ABC):
         self.statistics_keys = KeyMappingsFacade(self.__statistics_keys)
 
         # Facade for accessing global parameters (stored still in AppState).
-        self.globals = GlobalsFacade(self.__global_keys)
+        self.globals = GlobalsFacade(self.__global_keys, self.app_state)
+
+        # Initialize the statistics collection policy.
+        if "statistics_collection" not in config or config["statistics_collection"] is None:
+            policy = {}
+        else:
+            policy = config["statistics_collection"]
+        self.statistics_interval = max(1, int(policy["interval"])) if "interval" in policy else 1
+        self.statistics_fraction = float(policy["fraction"]) if "fraction" in policy else 1.0
+        # Episodes are sampled with a generator of the component, so the global numpy stream (e.g. used for shuffling) is not affected.
+        seed = int(policy["seed"]) if "seed" in policy and policy["seed"] is not None else -1
+        if seed < 0:
+            # Derive the seed from the name, so components are sampled independently, but reproducibly.
+            seed = zlib.crc32(self.name.encode('utf-8'))
+        self.statistics_random = np.random.RandomState(seed)
+        if "phases" in policy and policy["phases"] is not None and policy["phases"] != '':
+            self.statistics_phases = policy["phases"].replace(" ", "").split(",")
+        else:
+            # All phases.
+            self.statistics_phases = None
 
 
     def summarize_io(self, priority = -1):
@@ -210,6 +230,19 @@ class Component(abc.ABC):
         return  errors
 
 
+    def is_logging_episode(self):
+        """
+        Checks whether the current episode is the one in which the component should log (i.e. at the logging interval of the worker). \
+        Outside of the workers (e.g. in a pipeline restored from the artifact) the worker arguments are not set, so nothing is logged.
+
+        :return: True if the component should log in the current episode.
+
+        """
+        if getattr(self.app_state.args, "logging_interval", None) is None:
+            return False
+        return self.app_state.episode % self.app_state.args.logging_interval == 0
+
+
     @abc.abstractmethod
     def __call__(self, data_dict):
         """
@@ -235,6 +268,37 @@ class Component(abc.ABC):
         pass
 
 
+    def collects_statistics_in_phase(self, phase):
+        """
+        Checks whether the component collects statistics in a given phase (according to the ``phases`` \
+        of its ``statistics_collection`` policy).
+
+        :param phase: Phase of the collector (e.g. training, validation or testing), None means unknown.
+
+        :return: True if statistics should be collected in that phase.
+
+        """
+        return self.statistics_phases is None or phase is None or phase in self.statistics_phases
+
+
+    def should_collect_statistics(self, stat_col):
+        """
+        Decides whether the statistics should be collected in the current episode of a given collector, \
+        according to the ``statistics_collection`` policy of the component: collection phases, \
+        interval (every N-th episode) and fraction (random subset) of episodes.
+
+        :param stat_col: :py:class:`ptp.configuration.StatisticsCollector`.
+
+        :return: True if statistics should be collected.
+
+        """
+        if not self.collects_statistics_in_phase(stat_col.phase):
+            return False
+        if stat_col.episode_index % self.statistics_interval != 0:
+            return False
+        return self.statistics_fraction >= 1.0 or self.statistics_random.rand() < self.statistics_fraction
+
+
     def collect_statistics(self, stat_col, data_dict):
         """
         Base statistics collection.
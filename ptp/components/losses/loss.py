@@ -16,8 +16,6 @@
 
 __author__ = "Tomasz Kornuta"
 
-import torch
-
 from ptp.components.component import Component
 
 
@@ -68,7 +66,7 @@ class Loss(Component):
 
         """
         # Add loss statistics with formatting.
-        stat_col.add_statistics(self.key_loss, '{:12.10f}')
+        stat_col.add_statistics(self.key_loss, '{:12.10f}', weighted=False)
 
     def collect_statistics(self, stat_col, data_dict):
         """
@@ -77,7 +75,8 @@ class Loss(Component):
         :param stat_col: ``StatisticsCollector``.
 
         """
-        stat_col[self.key_loss] = data_dict[self.key_loss].item()
+        # Keep the loss on device, it will be synchronized with the host at logging interval.
+        stat_col[self.key_loss] = data_dict[self.key_loss].detach()
 
     def add_aggregators(self, stat_agg):
         """
@@ -92,13 +91,15 @@ class Loss(Component):
         stat_agg.add_aggregator(self.key_loss+'_min', '{:12.10f}')
         stat_agg.add_aggregator(self.key_loss+'_max', '{:12.10f}')
         stat_agg.add_aggregator(self.key_loss+'_std', '{:12.10f}')
+        stat_agg.add_aggregator(self.key_loss+'_p50', '{:12.10f}')
+        stat_agg.add_aggregator(self.key_loss+'_p95', '{:12.10f}')
 
     def aggregate_statistics(self, stat_col, stat_agg):
         """
         Aggregates the statistics collected by the ``StatisticsCollector``.
 
         .. note::
-            Computes min, max, mean, std of the loss as these are basic statistical aggregator by default.
+            Computes min, max, mean, std, median and 95th percentile of the loss as these are basic statistical aggregator by default.
 
             Given that the ``StatisticsAggregator`` uses the statistics collected by the ``StatisticsCollector``, \
             It should be ensured that these statistics are correctly collected (i.e. use of ``self.add_statistics()`` \
@@ -109,11 +110,14 @@ class Loss(Component):
         :param stat_agg: ``StatisticsAggregator``
 
         """
-        # Get loss values.
-        loss_values = stat_col[self.key_loss]
+        # Get streaming statistics of the loss.
+        loss = stat_col.get_stream(self.key_loss)
 
         # Calculate default aggregates.
-        stat_agg.aggregators[self.key_loss] = torch.mean(torch.tensor(loss_values))
-        stat_agg.aggregators[self.key_loss+'_min'] = min(loss_values)
-        stat_agg.aggregators[self.key_loss+'_max'] = max(loss_values)
-        stat_agg.aggregators[self.key_loss+'_std'] = 0.0 if len(loss_values) <= 1 else torch.std(torch.tensor(loss_values))
+        stat_agg.aggregators[self.key_loss] = loss.mean
+        stat_agg.aggregators[self.key_loss+'_min'] = loss.min
+        stat_agg.aggregators[self.key_loss+'_max'] = loss.max
+        # Unbiased estimator of the standard deviation.
+        stat_agg.aggregators[self.key_loss+'_std'] = loss.std(ddof=1)
+        stat_agg.aggregators[self.key_loss+'_p50'] = loss.quantile(0.5)
+        stat_agg.aggregators[self.key_loss+'_p95'] = loss.quantile(0.95)
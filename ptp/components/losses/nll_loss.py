@@ -42,6 +42,11 @@ class NLLLoss(Loss):
         # Get masking flag.
         self.use_masking = self.config["use_masking"]
 
+        # Get weighting flag.
+        self.use_weights = self.config["use_weights"]
+        if self.use_weights:
+            self.key_weights = self.stream_keys["weights"]
+
         # Get number of targets dimensions.
         self.num_targets_dims = self.config["num_targets_dims"]
 
@@ -61,6 +66,8 @@ class NLLLoss(Loss):
             }
         if self.use_masking:
             input_defs[self.key_masks] = DataDefinition([-1], [torch.Tensor], "Batch of masks [BATCH_SIZE]")
+        if self.use_weights:
+            input_defs[self.key_weights] = DataDefinition([-1], [torch.Tensor], "Batch of weights of samples (with mean 1 over the whole set) [BATCH_SIZE]")
         return input_defs
 
     def output_data_definitions(self):
@@ -114,6 +121,18 @@ class NLLLoss(Loss):
         #print("\nTarget: {}\n Prediction: {}".format(targets.view(-1), predictions.view(-1, last_dim)))
 
         # Calculate loss.
-        loss = self.loss_function(predictions.view(-1, last_dim), targets.view(-1))
+        if self.use_weights:
+            # Losses of samples [BATCH_SIZE x ...].
+            losses = nn.functional.nll_loss(predictions.view(-1, last_dim), targets.view(-1), reduction='none').view(targets.size(0), -1)
+            weights = data_dict[self.key_weights].type(losses.dtype).to(losses.device)
+            if self.use_masking:
+                # Masked samples do not contribute to the loss.
+                weights = weights * masks.type(losses.dtype).to(losses.device)
+            weights = weights.view(-1, 1).expand_as(losses)
+            # Weights are normalized over the whole set, so dividing by the number of losses (and not by the sum \
+            # of weights in batch) keeps the estimate of the weighted mean unbiased.
+            loss = (losses * weights).sum() / losses.numel()
+        else:
+            loss = self.loss_function(predictions.view(-1, last_dim), targets.view(-1))
         # Add it to datadict.
         data_dict.extend({self.key_loss: loss})
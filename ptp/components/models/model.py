@@ -16,6 +16,7 @@
 
 __author__ = "Tomasz Kornuta & Vincent Marois"
 
+import torch
 import numpy as np
 
 from torch.nn import Module
@@ -63,6 +64,9 @@ class Model(Module, Component):
         # Flag indicating whether the model is frozen or not.
         self.frozen = False
 
+        # Flag indicating whether the model was (dynamically) quantized or not.
+        self.quantized = False
+
 
     def save_to_checkpoint(self, chkpt):
         """
@@ -83,6 +87,9 @@ class Model(Module, Component):
         """
         if section is None:
             section = self.name
+        # Quantized state dict can be loaded only into a model with the same (quantized) structure.
+        if section in chkpt.get('quantized', []) and not self.quantized:
+            self.quantize()
         self.load_state_dict(chkpt[section])
 
     def freeze(self):
@@ -95,6 +102,32 @@ class Model(Module, Component):
             param.requires_grad = False
 
 
+    def quantize(self):
+        """
+        Applies post-training dynamic int8 quantization to the model, i.e. replaces its ``Linear``, ``LSTM`` \
+        and ``GRU`` submodules (in place) with their dynamically quantized counterparts.
+
+        .. warning::
+            Quantized modules can be executed on CPU only. The inputs/outputs of the model remain unchanged.
+        """
+        if self.quantized:
+            return
+        torch.ao.quantization.quantize_dynamic(self, {torch.nn.Linear, torch.nn.LSTM, torch.nn.GRU}, dtype=torch.qint8, inplace=True)
+        # Quantized model cannot be trained anymore.
+        self.quantized = True
+        self.frozen = True
+
+
+    def reset_state(self, training=None):
+        """
+        Resets the state carried by the model between consecutive batches (e.g. the hidden state of a recurrent model). \
+        Stateless models do nothing.
+
+        :param training: Mode which state will be reset: training (True), evaluation (False) or both (DEFAULT: None)
+        """
+        pass
+
+
     def summarize(self):
         """
         Summarizes the model by showing the trainable/non-trainable parameters and weights\
@@ -153,7 +186,9 @@ class Model(Module, Component):
         #    print(param_tensor, "\t", module_.state_dict()[param_tensor].size())
 
         if indent_ == 0:
-            if self.frozen:
+            if self.quantized:
+                mod_str += "\t\t[QUANTIZED]"
+            elif self.frozen:
                 mod_str += "\t\t[FROZEN]"
             else:
                 mod_str += "\t\t[TRAINABLE]"
@@ -15,6 +15,7 @@
 __author__ = "Tomasz Kornuta"
 
 import torch
+from collections import OrderedDict
 
 from ptp.configuration.configuration_error import ConfigurationError
 from ptp.components.models.model import Model
@@ -130,6 +131,27 @@ class RecurrentNeuralNetwork(Model):
             self.key_input_state = self.stream_keys["input_state"]
         if self.output_last_state:
             self.key_output_state = self.stream_keys["output_state"]
+
+        # Size of the cache storing the last hidden states of the sessions (0 means that the cache is disabled).
+        self.session_cache_size = self.config["session_cache_size"]
+        if self.session_cache_size > 0:
+            if self.initial_state == "Input":
+                raise ConfigurationError("RNN session cache cannot be used along with 'initial_state: Input'")
+            if "None" in self.input_mode:
+                raise ConfigurationError("RNN session cache cannot be used along with 'input_mode: {}'".format(self.input_mode))
+            self.key_sessions = self.stream_keys["sessions"]
+            self.logger.info("Using cache storing hidden states of up to {} sessions".format(self.session_cache_size))
+        # Cached hidden states, one per session, separate for the training and evaluation modes.
+        self.sessions_states = {}
+
+        # Carry the (detached) last hidden state over to the next batch (truncated BPTT).
+        self.carry_over_state = self.config["carry_over_state"]
+        if self.carry_over_state:
+            if self.initial_state == "Input" or self.session_cache_size > 0:
+                raise ConfigurationError("RNN hidden state cannot be carried over along with 'initial_state: Input' or session cache")
+            self.logger.info("Carrying the hidden state over between consecutive batches")
+        # Carried states, separate for the training and evaluation modes.
+        self.carried_states = {}
         
         self.logger.info("Initializing RNN with input size = {}, hidden size = {} and prediction size = {}".format(self.input_size, self.hidden_size, self.prediction_size))
 
@@ -158,6 +180,88 @@ class RecurrentNeuralNetwork(Model):
             return self.init_hidden.expand(self.num_layers, batch_size, self.hidden_size).contiguous()
 
 
+    def restore_sessions_state(self, sessions):
+        """
+        Creates the hidden state for a batch of sessions, using the cached states of the already started sessions \
+        and initial state for the new ones.
+
+        .. note::
+            Every session can appear only once in a batch, as its inputs must be processed sequentially.
+
+        :param sessions: List of session identifiers [BATCH_SIZE]
+
+        :return: Hidden state (tuple (hidden_state, memory_cell) for LSTM).
+        """
+        if len(set(sessions)) != len(sessions):
+            raise ValueError("RNN session cache cannot process batch containing the same session more than once (sessions: {})".format(sessions))
+        cache = self.sessions_states.setdefault(self.training, OrderedDict())
+        init_state = self.initialize_hiddens_state(1)
+        states = []
+        for session in sessions:
+            if session in cache:
+                cache.move_to_end(session)
+                states.append(cache[session])
+            else:
+                states.append(init_state)
+
+        # Concatenate along the batch dimension.
+        if self.cell_type == 'LSTM':
+            return (torch.cat([h for (h, _) in states], dim=1), torch.cat([c for (_, c) in states], dim=1))
+        else:
+            return torch.cat(states, dim=1)
+
+
+    def store_sessions_state(self, sessions, hidden):
+        """
+        Stores the last hidden states of the sessions in the cache, removing the least recently used ones when it is full.
+
+        :param sessions: List of session identifiers [BATCH_SIZE]
+
+        :param hidden: Last hidden state (tuple (hidden_state, memory_cell) for LSTM).
+        """
+        cache = self.sessions_states.setdefault(self.training, OrderedDict())
+        for i, session in enumerate(sessions):
+            if self.cell_type == 'LSTM':
+                state = (hidden[0][:, i:i+1, :].detach(), hidden[1][:, i:i+1, :].detach())
+            else:
+                state = hidden[:, i:i+1, :].detach()
+            cache[session] = state
+            cache.move_to_end(session)
+
+        while len(cache) > self.session_cache_size:
+            cache.popitem(last=False)
+
+
+    def reset_sessions(self, sessions=None, training=None):
+        """
+        Removes the hidden states of the indicated sessions from the cache.
+
+        :param sessions: List of session identifiers (DEFAULT: None, meaning all sessions)
+
+        :param training: Mode which cache will be reset: training (True), evaluation (False) or both (DEFAULT: None)
+        """
+        for mode, cache in self.sessions_states.items():
+            if training is not None and mode != training:
+                continue
+            if sessions is None:
+                cache.clear()
+            else:
+                for session in sessions:
+                    cache.pop(session, None)
+
+
+    def reset_state(self, training=None):
+        """
+        Resets the hidden states carried over between consecutive batches.
+
+        :param training: Mode which state will be reset: training (True), evaluation (False) or both (DEFAULT: None)
+        """
+        if training is None:
+            self.carried_states.clear()
+        else:
+            self.carried_states.pop(training, None)
+
+
     def input_data_definitions(self):
         """ 
         Function returns a dictionary with definitions of input data that are required by the component.
@@ -175,6 +279,10 @@ class RecurrentNeuralNetwork(Model):
         if self.initial_state == "Input":
             d[self.key_input_state] = DataDefinition([-1, 2 if self.cell_type == 'LSTM' else 1, self.input_size, 1, self.hidden_size], [torch.tensor], "Batch of RNN last states")
 
+        # Session identifiers.
+        if self.session_cache_size > 0:
+            d[self.key_sessions] = DataDefinition([-1, 1], [list, str], "Batch of session identifiers [BATCH_SIZE] x [string]")
+
         return d
 
     def output_data_definitions(self):
@@ -227,8 +335,14 @@ class RecurrentNeuralNetwork(Model):
         # Initialize hidden state.
         if self.initial_state == "Input":
             hidden = data_dict[self.key_input_state]
+        elif self.session_cache_size > 0:
+            # Continue the sessions, i.e. process only the new inputs.
+            hidden = self.restore_sessions_state(data_dict[self.key_sessions])
         else:
-            hidden = self.initialize_hiddens_state(batch_size)
+            hidden = self.carried_states.get(self.training) if self.carry_over_state else None
+            # Start from the initial state when there is no carried state for the given batch size.
+            if hidden is None or (hidden[0] if self.cell_type == 'LSTM' else hidden).shape[1] != batch_size:
+                hidden = self.initialize_hiddens_state(batch_size)
 
         activations = []
 
@@ -252,6 +366,16 @@ class RecurrentNeuralNetwork(Model):
             activations, hidden = self.rnn_cell(inputs, hidden)
 
         
+        # Remember the last states of the sessions.
+        if self.session_cache_size > 0:
+            self.store_sessions_state(data_dict[self.key_sessions], hidden)
+        elif self.carry_over_state:
+            # Detach the state, so gradients will not flow to the previous batches.
+            if self.cell_type == 'LSTM':
+                self.carried_states[self.training] = (hidden[0].detach(), hidden[1].detach())
+            else:
+                self.carried_states[self.training] = hidden.detach()
+
         # Propagate activations through dropout layer.
         activations = self.dropout(activations)
 
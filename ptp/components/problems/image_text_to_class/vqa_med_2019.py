@@ -17,8 +17,10 @@
 
 __author__ = "Chaitanya Shivade, Tomasz Kornuta"
 
+import json
 import string
-import tqdm
+import hashlib
+import numpy as np
 import pandas as pd
 from PIL import Image
 from torchvision import transforms
@@ -27,7 +29,10 @@ import os
 import torch
 from torchvision import transforms
 
+from ptp.configuration import ConfigurationError
 from ptp.components.problems.problem import Problem
+from ptp.components.utils.image_cache import ImageCache
+from ptp.components.utils.image_augmentation import BatchImageAugmentation
 from ptp.data_types.data_definition import DataDefinition
 
 
@@ -142,14 +147,36 @@ class VQAMED2019(Problem):
         # Load dataset.
         self.logger.info("Loading dataset from files:\n {}".format(source_files))
         self.dataset = self.load_dataset(source_files, source_categories)
-        self.logger.info("Loaded dataset consisting of {} samples".format(len(self.dataset)))
+        self.logger.info("Loaded dataset consisting of {} samples".format(len(self)))
+
+        # Create the transforms (once).
+        self.resize = transforms.Resize([self.height,self.width])
+        # The former flag would be silently ignored.
+        if "use_augmentation" in self.config:
+            raise ConfigurationError("'use_augmentation' is not supported anymore, please use the 'augmentation' section (with 'enabled' flag) instead")
+        # Augmentation and normalization are applied to the whole batch in collate_fn.
+        # Use normalization that the pretrained models from TorchVision require.
+        normalization = {'mean': [0.485, 0.456, 0.406], 'std': [0.229, 0.224, 0.225]}
+        self.batch_transform = BatchImageAugmentation.from_config(self.config["augmentation"], **normalization)
+        if self.batch_transform is None:
+            self.batch_transform = BatchImageAugmentation(**normalization)
+
+        # Open the store of preprocessed (resized) images.
+        if self.config['image_cache'] in ['lazy', 'prebuild']:
+            self.image_cache = ImageCache(os.path.join(self.split_folder, 'image_cache'), self.image_folder,
+                self.height, self.width, logger=self.logger)
+            if self.config['image_cache'] == 'prebuild':
+                self.logger.info("Filling the image cache...")
+                self.image_cache.build()
+        else:
+            self.image_cache = None
 
         # Display exemplary sample.
         self.logger.info("Exemplary sample:\n [ category: {}\t image_ids: {}\t question: {}\t answer: {} ]".format(
-            self.dataset[0][self.key_image_ids],
-            self.dataset[0][self.key_questions],
-            self.dataset[0][self.key_answers],
-            self.dataset[0][self.key_category_ids]
+            self.category_idx_to_word[int(self.dataset['categories'][0])],
+            self.dataset['image_table'][self.dataset['image_codes'][0]],
+            self.dataset['question_table'][self.dataset['question_codes'][0]],
+            self.dataset['answer_table'][self.dataset['answer_codes'][0]]
             ))
 
     def filter_sources(self, source_files, source_categories):
@@ -179,57 +206,93 @@ class VQAMED2019(Problem):
         return source_files, source_categories
 
 
+    # Names of columns of the (columnar) index of the dataset.
+    index_columns = ['image_codes', 'question_codes', 'answer_codes', 'categories', 'image_table', 'question_table', 'answer_table']
+
     def load_dataset(self, source_files, source_categories):
         """
-        Loads the dataset from one or more files.
+        Loads the dataset from one or more files, using the index cached on disk if it is valid.
+
+        The dataset is stored as a columnar index: arrays with codes of images, questions and answers (i.e. indices \
+        in tables of unique strings), along with the categories of questions (with binary questions already detected).
 
         :param source_files: List of source files.
 
         :param source_categories: List of categories associated with each of those files. (<UNK> unknown)
+
+        :return: Dictionary of numpy arrays (see ``index_columns``).
+        """
+        source_files = [os.path.join(self.split_folder, data_file) for data_file in source_files]
+
+        # Key of the cache: source files (along with their modification times) and the processing settings.
+        key = json.dumps({
+            'files': [[data_file, os.path.getmtime(data_file)] for data_file in source_files],
+            'categories': list(source_categories),
+            'remove_punctuation': self.remove_punctuation
+            })
+        cache_folder = os.path.join(self.split_folder, 'index_cache', 'index_' + hashlib.sha1(key.encode()).hexdigest())
+
+        if os.path.isdir(cache_folder):
+            self.logger.info('Loading cached index from {}'.format(cache_folder))
+            return {column: np.load(os.path.join(cache_folder, column + '.npy'), mmap_mode='r') for column in self.index_columns}
+
+        dataset = self.parse_dataset(source_files, source_categories)
+
+        # Save the index - to a temporary folder first, so incomplete index will be never loaded.
+        tmp_folder = cache_folder + '.tmp{}'.format(os.getpid())
+        os.makedirs(tmp_folder, exist_ok=True)
+        for column in self.index_columns:
+            np.save(os.path.join(tmp_folder, column + '.npy'), dataset[column])
+        try:
+            os.rename(tmp_folder, cache_folder)
+            self.logger.info('Cached index in {}'.format(cache_folder))
+        except OSError:
+            # Other process has just cached the same index.
+            for column in self.index_columns:
+                os.remove(os.path.join(tmp_folder, column + '.npy'))
+            os.rmdir(tmp_folder)
+        return dataset
+
+    def parse_dataset(self, source_files, source_categories):
         """
-        # Set containing list of tuples.
-        dataset = []
+        Parses the source files into columnar index of the dataset (with column-wise string operations).
 
+        :param source_files: List of source files (with paths).
+
+        :param source_categories: List of categories associated with each of those files. (<UNK> unknown)
+
+        :return: Dictionary of numpy arrays (see ``index_columns``).
+        """
         # Create table used for removing punctuations.
         table = str.maketrans({key: None for key in string.punctuation})
 
-        # Process files with categories.
+        frames = []
         for data_file, category in zip(source_files, source_categories):
-            # Set absolute path to file.
-            data_file = os.path.join(self.split_folder, data_file)
             self.logger.info('Loading dataset from {} (category: {})...'.format(data_file, category))
             # Load file content using '|' separator.
-            df = pd.read_csv(filepath_or_buffer=data_file, sep='|',header=None,
-                    names=[self.key_image_ids,self.key_questions,self.key_answers])
-
-            # Add tdqm bar.
-            t = tqdm.tqdm(total=len(df.index))
-            for _, row in df.iterrows():
-                # Retrieve question and answer.
-                question = row[self.key_questions]
-                answer = row[self.key_answers]
-
-                # Process question - if required.
-                if self.remove_punctuation in ["questions","all"]:
-                    question = question.translate(table)
-
-                # Process answer - if required.
-                if self.remove_punctuation in ["answers","all"]:
-                    answer = answer.translate(table)
-
-                # Add record to dataset.
-                dataset.append({
-                    self.key_image_ids: row[self.key_image_ids],
-                    self.key_questions: question,
-                    self.key_answers: answer,
-                    # Add category.
-                    self.key_category_ids: category
-                    })
-
-                t.update()
-            t.close()
-
-        # Return the created list.
+            df = pd.read_csv(filepath_or_buffer=data_file, sep='|', header=None, dtype=str, keep_default_na=False,
+                    names=['image_ids', 'questions', 'answers'])
+            df['categories'] = category
+            frames.append(df)
+        df = pd.concat(frames, ignore_index=True)
+
+        # Process questions and answers - if required.
+        if self.remove_punctuation in ["questions","all"]:
+            df['questions'] = df['questions'].str.translate(table)
+        if self.remove_punctuation in ["answers","all"]:
+            df['answers'] = df['answers'].str.translate(table)
+
+        # Encode strings as indices in tables of unique strings.
+        dataset = {}
+        for column, name in [('image_ids', 'image'), ('questions', 'question'), ('answers', 'answer')]:
+            codes, uniques = pd.factorize(df[column])
+            dataset[name + '_codes'] = codes.astype(np.int32)
+            dataset[name + '_table'] = np.array(uniques, dtype=str)
+
+        # Detect the binary (yes/no) questions - once per unique question.
+        binary = np.array([self.predict_yes_no(question) for question in dataset['question_table']], dtype=bool)
+        categories = df['categories'].to_numpy(dtype=np.int8)
+        dataset['categories'] = np.where(binary[dataset['question_codes']], np.int8(4), categories)
         return dataset
 
     def __len__(self):
@@ -238,7 +301,7 @@ class VQAMED2019(Problem):
 
         :return: The size of the problem.
         """
-        return len(self.dataset)
+        return len(self.dataset['categories'])
 
 
     def output_data_definitions(self):
@@ -268,32 +331,21 @@ class VQAMED2019(Problem):
 
         :return: DataDict({'indices', 'images', 'images_ids','questions', 'answers', 'category_ids', 'image_sizes'})
         """
-        # Get item.
-        item = self.dataset[index]
-
         # Load the adequate image.
-        img_id = item[self.key_image_ids]
+        img_id = str(self.dataset['image_table'][self.dataset['image_codes'][index]])
         extension = '.jpg'
-        # Load the image.
-        img = Image.open(os.path.join(self.image_folder, img_id + extension))
-        # Get its width and height.
-        width, height = img.size
-
-        if(self.config['use_augmentation'] == 'True'):
-            rotate = (-45, 135)
-            translate = (0.05, 0.25)
-            scale = (0.5, 2)
-            transforms_list = [transforms.RandomAffine(rotate, translate, scale), transforms.RandomHorizontalFlip()]
+        if self.image_cache is not None:
+            # Get the resized image and its original size from cache.
+            img, (height, width) = self.image_cache.get(img_id)
         else:
-            transforms_list = []
-        # Resize the image and transform to Torch Tensor.
-        transforms_com = transforms.Compose(transforms_list + [
-                transforms.Resize([self.height,self.width]),
-                transforms.ToTensor(),
-                # Use normalization that the pretrained models from TorchVision require.
-                transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-                ])
-        img = transforms_com(img) #.type(torch.FloatTensor).squeeze()
+            # Load the image.
+            img = Image.open(os.path.join(self.image_folder, img_id + extension))
+            # Get its width and height.
+            width, height = img.size
+            # Resize the image.
+            img = np.asarray(self.resize(img.convert('RGB')))
+        # Transform to (uint8) Torch Tensor - it will be augmented and normalized in collate_fn.
+        img = torch.from_numpy(np.array(img)).permute(2, 0, 1)
 
         #print("img: min_val = {} max_val = {}".format(torch.min(img),torch.max(img)) )
 
@@ -307,17 +359,13 @@ class VQAMED2019(Problem):
         data_dict[self.key_image_sizes] = torch.FloatTensor([float(height/self.scale_image_height), float(width/self.scale_image_width)])
 
         # Question.
-        data_dict[self.key_questions] = item[self.key_questions]
-        data_dict[self.key_answers] = item[self.key_answers]
-
-        # Question category related variables.
-        # Check if this is binary question.
-        if self.predict_yes_no(item[self.key_questions]):
-            data_dict[self.key_category_ids] = 4 # Binary.
-            data_dict[self.key_category_names] = self.category_idx_to_word[4]
-        else:
-            data_dict[self.key_category_ids] = item[self.key_category_ids]
-            data_dict[self.key_category_names] = self.category_idx_to_word[item[self.key_category_ids]]
+        data_dict[self.key_questions] = str(self.dataset['question_table'][self.dataset['question_codes'][index]])
+        data_dict[self.key_answers] = str(self.dataset['answer_table'][self.dataset['answer_codes'][index]])
+
+        # Question category related variables (binary questions were detected when loading the dataset).
+        category = int(self.dataset['categories'][index])
+        data_dict[self.key_category_ids] = category
+        data_dict[self.key_category_names] = self.category_idx_to_word[category]
 
         # Return sample.
         return data_dict
@@ -346,8 +394,9 @@ class VQAMED2019(Problem):
         # Collate indices.
         data_dict = self.create_data_dict([sample[self.key_indices] for sample in batch])
 
-        # Stack images.
-        data_dict[self.key_images] = torch.stack([item[self.key_images] for item in batch]).type(torch.FloatTensor)
+        # Stack images, augment (optionally) and normalize them.
+        images = torch.stack([item[self.key_images] for item in batch]).float().div(255)
+        data_dict[self.key_images] = self.batch_transform(images)
         data_dict[self.key_image_ids] = [item[self.key_image_ids] for item in batch]
         data_dict[self.key_image_sizes] = torch.stack([item[self.key_image_sizes] for item in batch]).type(torch.FloatTensor)
 
@@ -18,8 +18,10 @@
 __author__ = "Tomasz Kornuta, Younes Bouhadjar, Vincent Marois"
 
 import numpy as np
+import torch
 
 from ptp.components.problems.problem import Problem
+from ptp.components.utils.image_augmentation import BatchImageAugmentation
 
 class ImageToClassProblem(Problem):
     """
@@ -29,6 +31,10 @@ class ImageToClassProblem(Problem):
 
     Provides some basic features useful in all problems of such type.
 
+    In the ``in_memory`` mode the subclass keeps the whole dataset as tensors: ``self.images`` (uint8 \
+    [NUM_SAMPLES x DEPTH x HEIGHT x WIDTH], already resized) and ``self.targets`` (int64 [NUM_SAMPLES]), \
+    so the whole batch is fetched with a single gather (see :py:func:`__getitems__`).
+
     """
 
     def __init__(self, name, class_type, config):
@@ -50,6 +56,63 @@ class ImageToClassProblem(Problem):
         self.key_inputs = self.stream_keys["inputs"]
         self.key_targets = self.stream_keys["targets"]
 
+        # Augmentation of batches of images (optional).
+        if "augmentation" in self.config:
+            self.batch_transform = BatchImageAugmentation.from_config(self.config["augmentation"])
+        else:
+            self.batch_transform = None
+
+        # Keep the whole dataset in memory as tensors (optional, set by subclasses).
+        self.in_memory = self.config["in_memory"] if "in_memory" in self.config else False
+        self.images = None
+        self.targets = None
+
+
+    def __getitems__(self, indices):
+        """
+        Fetches the whole batch of samples (called by the ``DataLoader`` with indices generated by its batch sampler).
+
+        :param indices: List of indices of samples.
+
+        :return: DataDict containing the batch (``in_memory`` mode) or list of samples (otherwise).
+
+        """
+        if not self.in_memory:
+            return [self[index] for index in indices]
+        return self.fetch_batch(torch.as_tensor(indices, dtype=torch.int64))
+
+
+    def fetch_batch(self, indices):
+        """
+        Creates the batch from the tensors kept in memory, with a single gather.
+
+        :param indices: Tensor with indices of samples [BATCH_SIZE].
+
+        :return: DataDict containing the batch.
+
+        """
+        data_dict = self.create_data_dict(indices)
+        # Same conversion as the one done by transforms.ToTensor.
+        data_dict[self.key_inputs] = self.images.index_select(0, indices).float().div_(255)
+        data_dict[self.key_targets] = self.targets.index_select(0, indices)
+        return data_dict
+
+
+    def collate_fn(self, batch):
+        """
+        Generates a batch of samples (with the default collate) and augments the images (if indicated).
+
+        :param batch: List of :py:class:`ptp.utils.DataDict` retrieved by :py:func:`__getitem__` \
+        or DataDict with the whole batch fetched by :py:func:`__getitems__`.
+
+        :return: DataDict containing the created batch.
+
+        """
+        data_dict = super(ImageToClassProblem, self).collate_fn(batch)
+        if self.batch_transform is not None:
+            data_dict[self.key_inputs] = self.batch_transform(data_dict[self.key_inputs])
+        return data_dict
+
 
     def show_sample(self, data_dict, sample_number=0):
         """
@@ -18,7 +18,9 @@
 __author__ = "Tomasz Kornuta, Younes Bouhadjar, Vincent Marois"
 
 import os
+import numpy as np
 import torch
+from PIL import Image
 from torchvision import datasets, transforms
 
 from ptp.components.problems.image_to_class.image_to_class_problem import ImageToClassProblem
@@ -80,8 +82,9 @@ class MNIST(ImageToClassProblem):
             # Up-scale and transform to tensors.
             transform = transforms.Compose([transforms.Resize((self.height, self.width)), transforms.ToTensor()])
 
-            self.logger.warning('Upscaling the images to [{}, {}]. Slows down batch generation.'.format(
-                self.width, self.height))
+            if not self.in_memory:
+                self.logger.warning('Upscaling the images to [{}, {}]. Slows down batch generation.'.format(
+                    self.width, self.height))
 
         else:
             # Default MNIST settings.
@@ -94,6 +97,12 @@ class MNIST(ImageToClassProblem):
         self.dataset = datasets.MNIST(root=data_folder, train=self.use_train_data, download=True,
                                       transform=transform)
 
+        if self.in_memory:
+            # Keep the whole dataset as tensors, resizing the images once.
+            cache_folder = os.path.expanduser(self.config['cache_folder']) if self.config['cache_folder'] != '' else data_folder
+            self.images = self.load_images(cache_folder)
+            self.targets = self.dataset.targets.long()
+
         # Set global variables - all dimensions ASIDE OF BATCH.
         self.globals["num_classes"] = 10
         self.globals["image_width"] = self.width
@@ -108,6 +117,42 @@ class MNIST(ImageToClassProblem):
         # Export to globals.
         self.globals["label_word_mappings"] = word_to_ix
 
+    def load_images(self, cache_folder):
+        """
+        Returns all images as a single uint8 tensor [NUM_SAMPLES x 1 x HEIGHT x WIDTH]. \
+        Resized images are computed once (exactly as by the transform applied to single samples) and cached in the cache folder \
+        (when it cannot be written, they are kept in memory only).
+
+        :param cache_folder: Folder with cached (resized) images.
+
+        :return: Tensor with images.
+        """
+        images = self.dataset.data.unsqueeze(1)
+        if (self.height, self.width) == tuple(images.shape[2:]):
+            return images
+
+        cache_file = os.path.join(cache_folder, "mnist_{}_{}x{}.pt".format("train" if self.use_train_data else "test", self.height, self.width))
+        if os.path.isfile(cache_file):
+            return torch.load(cache_file)
+
+        self.logger.info("Resizing all images to [{}, {}]...".format(self.height, self.width))
+        # Resize PIL images, so they are equal to the ones returned when not kept in memory.
+        resize = transforms.Resize((self.height, self.width))
+        images = torch.from_numpy(np.stack([np.array(resize(Image.fromarray(image))) for image in self.dataset.data.numpy()])).unsqueeze(1)
+        # Save to a temporary file first, so incomplete images will be never loaded.
+        tmp_file = cache_file + '.tmp{}'.format(os.getpid())
+        try:
+            os.makedirs(cache_folder, exist_ok=True)
+            torch.save(images, tmp_file)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            self.logger.warning("Cannot cache resized images in '{}' ({}), keeping them in memory only".format(cache_folder, e))
+            if os.path.isfile(tmp_file):
+                os.remove(tmp_file)
+            return images
+        self.logger.info("Cached resized images in '{}'".format(cache_file))
+        return images
+
     def __len__(self):
         """
         Returns the "size" of the "problem" (total number of samples).
@@ -143,11 +188,26 @@ class MNIST(ImageToClassProblem):
             - targets: Index of the target class
         """
         # Get image and target.
-        img, target = self.dataset.__getitem__(index)
+        if self.in_memory:
+            img, target = self.images[index].float().div(255), self.targets[index]
+        else:
+            img, target = self.dataset.__getitem__(index)
   
         # Return data_dict.
         data_dict = self.create_data_dict(index)
         data_dict[self.key_inputs] = img
         data_dict[self.key_targets] = target
-        data_dict[self.key_labels] = self.ix_to_word[target.item()]
+        data_dict[self.key_labels] = self.ix_to_word[int(target)]
+        return data_dict
+
+    def fetch_batch(self, indices):
+        """
+        Creates the batch from the tensors kept in memory, with a single gather.
+
+        :param indices: Tensor with indices of samples [BATCH_SIZE].
+
+        :return: DataDict containing the batch.
+        """
+        data_dict = super(MNIST, self).fetch_batch(indices)
+        data_dict[self.key_labels] = [self.ix_to_word[target] for target in data_dict[self.key_targets].tolist()]
         return data_dict
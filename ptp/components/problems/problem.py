@@ -32,6 +32,13 @@ class Problem(Component, Dataset):
 
     Implements features & attributes used by all subclasses.
 
+    .. note::
+
+        Subclasses can optionally implement the batch API, i.e. method ``__getitems__(indices)`` returning \
+        a DataDict with the whole batch for a given list of indices (e.g. built with slicing and fancy indexing). \
+        The :py:class:`ptp.application.ProblemManager` detects it and drives the ``DataLoader`` with a batch sampler, \
+        whereas :py:func:`collate_fn` passes such batches through unchanged.
+
     """
 
     def __init__(self, name, class_type, config):
@@ -153,6 +160,9 @@ class Problem(Component, Dataset):
         :return: DataDict containing the created batch.
 
         """
+        # Batch was already created by __getitems__.
+        if isinstance(batch, DataDict):
+            return batch
         return DataDict({key: torch.utils.data.dataloader.default_collate([sample[key] for sample in batch]) for key in batch[0]})
 
 
@@ -14,6 +14,8 @@
 
 __author__ = "Tomasz Kornuta"
 
+import torch
+
 from ptp.components.problems.problem import Problem
 from ptp.data_types.data_definition import DataDefinition
 
@@ -82,3 +84,18 @@ class LanguageIdentification(Problem):
         data_dict[self.key_inputs] = self.inputs[index]
         data_dict[self.key_targets] = self.targets[index]
         return data_dict
+
+
+    def __getitems__(self, indices):
+        """
+        Getter method returning the whole batch at once.
+
+        :param indices: List of indices of samples.
+
+        :return: ``DataDict({'indices','inputs','targets'})`` containing the batch.
+
+        """
+        data_dict = self.create_data_dict(torch.as_tensor(indices, dtype=torch.int64))
+        data_dict[self.key_inputs] = [self.inputs[index] for index in indices]
+        data_dict[self.key_targets] = [self.targets[index] for index in indices]
+        return data_dict
@@ -15,8 +15,11 @@
 __author__ = "Tomasz Kornuta"
 
 import os
+import numpy as np
+import torch
 
 import ptp.components.utils.io as io
+from ptp.components.utils.mapped_lines import MappedLines
 from .language_identification import LanguageIdentification
 
 
@@ -27,6 +30,9 @@ class WiLYLanguageIdentification(LanguageIdentification):
 
     The dataset contains sentences from 235 languages.
 
+    Sentences are read on access through ``mmap`` (see :py:class:`ptp.components.utils.mapped_lines.MappedLines`), \
+    whereas labels are stored as array of codes along with the table of labels (both cached next to the file with labels).
+
     .. _dataset: https://zenodo.org/record/841984
     .. _arxiv: https://arxiv.org/abs/1801.07779
     """
@@ -62,9 +68,79 @@ class WiLYLanguageIdentification(LanguageIdentification):
             inputs_file = "x_test.txt"
             targets_file = "y_test.txt"
 
-        # Load files.
-        self.inputs = io.load_string_list_from_txt_file(self.data_folder, inputs_file)
-        self.targets = io.load_string_list_from_txt_file(self.data_folder, targets_file)
+        # Index (map) inputs and load encoded targets.
+        self.inputs = MappedLines(self.data_folder, inputs_file)
+        self.target_codes, self.target_labels = self.load_targets(targets_file)
 
         # Assert that they are equal in size!
-        assert len(self.inputs) == len(self.targets), "Number of inputs loaded from {} not equal to number of targets loaded from {}!".format(inputs_file, targets_file)
+        assert len(self.inputs) == len(self.target_codes), "Number of inputs loaded from {} not equal to number of targets loaded from {}!".format(inputs_file, targets_file)
+
+
+    def load_targets(self, targets_file):
+        """
+        Loads targets encoded as codes of labels, encoding them (and caching next to the file) if required.
+
+        :param targets_file: Name of the file with targets (one label per line).
+
+        :return: Tuple (array of codes [NUM_SAMPLES], list of labels).
+        """
+        codes_file = targets_file + '.codes.npy'
+        labels_file = targets_file + '.labels.txt'
+        if not io.check_files_existence(self.data_folder, [codes_file, labels_file]) or \
+            os.path.getmtime(os.path.join(self.data_folder, codes_file)) < os.path.getmtime(os.path.join(self.data_folder, targets_file)):
+            # Encode labels in order of appearance.
+            labels, codes = {}, []
+            for target in io.load_string_list_from_txt_file(self.data_folder, targets_file):
+                codes.append(labels.setdefault(target, len(labels)))
+            # Save labels first, codes mark the cache as complete.
+            io.save_string_list_to_txt_file(self.data_folder, labels_file, list(labels.keys()))
+            # Save to a temporary file first, so incomplete codes will be never loaded.
+            tmp_file = os.path.join(self.data_folder, targets_file + '.codes.tmp{}.npy'.format(os.getpid()))
+            np.save(tmp_file, np.array(codes, dtype=np.int32))
+            os.replace(tmp_file, os.path.join(self.data_folder, codes_file))
+
+        codes = np.load(os.path.join(self.data_folder, codes_file))
+        labels = io.load_string_list_from_txt_file(self.data_folder, labels_file)
+        return codes, labels
+
+
+    def __len__(self):
+        """
+        Returns the "size" of the "problem" (total number of samples).
+
+        :return: The size of the problem.
+        """
+        return len(self.target_codes)
+
+
+    def __getitem__(self, index):
+        """
+        Getter method to access the dataset and return a sample.
+
+        :param index: index of the sample to return.
+        :type index: int
+
+        :return: ``DataDict({'inputs','targets'})``
+
+        """
+        # Return data_dict.
+        data_dict = self.create_data_dict(index)
+        data_dict[self.key_inputs] = self.inputs[index]
+        data_dict[self.key_targets] = self.target_labels[self.target_codes[index]]
+        return data_dict
+
+
+    def __getitems__(self, indices):
+        """
+        Getter method returning the whole batch at once.
+
+        :param indices: List of indices of samples.
+
+        :return: ``DataDict({'indices','inputs','targets'})`` containing the batch.
+
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        data_dict = self.create_data_dict(torch.from_numpy(indices))
+        data_dict[self.key_inputs] = [self.inputs[index] for index in indices.tolist()]
+        data_dict[self.key_targets] = [self.target_labels[code] for code in self.target_codes[indices].tolist()]
+        return data_dict
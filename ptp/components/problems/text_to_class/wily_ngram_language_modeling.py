@@ -15,6 +15,9 @@
 __author__ = "Tomasz Kornuta"
 
 import os
+import array
+import numpy as np
+import torch
 
 import ptp.components.utils.io as io
 from ptp.components.problems.problem import Problem
@@ -26,6 +29,13 @@ class WiLYNGramLanguageModeling(Problem):
     N-gram Language Modeling problem.
     By default it is using sentences from the WiLI benchmark _dataset taken from the paper: Thoma, Martin. "The WiLI benchmark dataset for written language identification." arXiv preprint arXiv:1801.07779 (2018). (_arxiv)
 
+    Sentences are stored as a single array of indices of words (along with offsets of sentences and the table of words), \
+    whereas n-grams are represented by their start positions in that array, so inputs and targets are sliced from it on access.
+
+    Optionally, identical n-grams can be collapsed into unique samples, with their numbers of occurrences returned as weights \
+    (divided by the mean number of occurrences, to be used by a weighted loss) and exposed as ``sample_weights`` \
+    (to be used by the ``WeightedRandomSampler``).
+
     .. _dataset: https://zenodo.org/record/841984
     .. _arxiv: https://arxiv.org/abs/1801.07779
     """
@@ -45,6 +55,7 @@ class WiLYNGramLanguageModeling(Problem):
         # Set key mappings.
         self.key_inputs = self.stream_keys["inputs"]
         self.key_targets = self.stream_keys["targets"]
+        self.key_weights = self.stream_keys["weights"]
 
         # Get absolute path.
         self.data_folder = os.path.expanduser(self.config['data_folder'])
@@ -55,13 +66,17 @@ class WiLYNGramLanguageModeling(Problem):
         # Select set.
         if self.config['use_train_data']:
             inputs_file = "x_train.txt"
-            ngrams_file =  "ngrams_train.txt"
+            prefix = "ngrams_train"
         else:
             inputs_file = "x_test.txt"
-            ngrams_file =  "ngrams_test.txt"
+            prefix = "ngrams_test"
+        # Files with table of words, indices of words of all sentences and offsets of sentences.
+        words_file = prefix + "_words.txt"
+        self.token_ids_file = os.path.join(self.data_folder, prefix + "_token_ids.npy")
+        offsets_file = os.path.join(self.data_folder, prefix + "_offsets.npy")
 
-        # Check if we can load ngrams.
-        if not io.check_file_existence(self.data_folder, ngrams_file):
+        # Check if we can load the encoded sentences.
+        if not io.check_files_existence(self.data_folder, [words_file, prefix + "_token_ids.npy", prefix + "_offsets.npy"]):
             # Sadly not, we have to generate them.
             if not io.check_file_existence(self.data_folder, inputs_file):
                 # Even worst - we have to download wily.
@@ -69,43 +84,132 @@ class WiLYNGramLanguageModeling(Problem):
                 zipfile_name = "wili-2018.zip"
                 io.download_extract_zip_file(self.logger, self.data_folder, url, zipfile_name)
 
-
-            # Load file.
-            inputs = io.load_string_list_from_txt_file(self.data_folder, inputs_file)
-
-            self.logger.info("Please wait, generating n-grams...")
-            self.ngrams_sent = []
-            # Now we have to split sentencese into n-grams.
-            for sentence in inputs:
-                # Split sentence into words.
-                words = sentence.split()
-                
-                # Build a list of ngrams.
-                for i in range(len(words) - self.context):
-                    ngram = [words[j] for j in range(i, i+1+self.context)]
-                    self.ngrams_sent.append(' '.join(ngram))
-
-            # Assert that they are any ngrams there!
-            assert len(self.ngrams_sent) > 0, "Number of n-grams generated on the basis of '{}' must be greater than 0!".format(inputs_file)
-            # Done.
-            self.logger.info("Generated {} n-grams, example:\n{}".format(len(self.ngrams_sent), self.ngrams_sent[0]))
-
-            self.logger.info("Saving {} n-grams to file '{}'".format(len(self.ngrams_sent), ngrams_file))
-            # N-grams generated, save them to file.
-            io.save_string_list_to_txt_file(self.data_folder, ngrams_file, self.ngrams_sent)
+            self.logger.info("Please wait, encoding sentences from '{}'...".format(inputs_file))
+            self.words = self.encode_sentences(os.path.join(self.data_folder, inputs_file), self.token_ids_file, offsets_file)
+            io.save_string_list_to_txt_file(self.data_folder, words_file, self.words)
         else:
-            self.logger.info("Please wait, loading n-grams from file '{}'".format(ngrams_file))
-            # Load file.
-            self.ngrams_sent = io.load_string_list_from_txt_file(self.data_folder, ngrams_file)
-
-            # Assert that they are equal in size!
-            assert len(self.ngrams_sent) > 0, "Number of n-grams loaded from {} must be greater than 0!".format(ngrams_file)
-            # Done.
-            self.logger.info("Loaded {} n-grams, example:\n{}".format(len(self.ngrams_sent), self.ngrams_sent[0]))
-        
-        # Split words in n-grams.
-        self.ngrams = [ngram.split() for ngram in self.ngrams_sent]
-        
+            self.logger.info("Please wait, loading encoded sentences from '{}'".format(prefix + "_token_ids.npy"))
+            self.words = io.load_string_list_from_txt_file(self.data_folder, words_file)
+
+        # Map the words into memory and compute start positions of all n-grams.
+        self.token_ids = np.load(self.token_ids_file, mmap_mode='r')
+        self.starts = self.compute_ngram_starts(np.load(offsets_file), self.context)
+
+        # Assert that they are any ngrams there!
+        assert len(self.starts) > 0, "Number of n-grams generated on the basis of '{}' must be greater than 0!".format(inputs_file)
+        # Done.
+        self.logger.info("Generated {} n-grams from {} words (vocabulary of size {}), example:\n{}".format(
+            len(self.starts), len(self.token_ids), len(self.words), ' '.join(self.get_ngram(0))))
+
+        # Collapse identical n-grams - if required.
+        self.deduplicate = self.config['deduplicate']
+        self.sample_weights = None
+        if self.deduplicate:
+            unique_file = os.path.join(self.data_folder, "{}_unique_c{}.npy".format(prefix, self.context))
+            # Use the collapsed n-grams only if they were computed for the current indices of words.
+            if os.path.isfile(unique_file) and os.path.getmtime(unique_file) >= os.path.getmtime(self.token_ids_file):
+                unique = np.load(unique_file)
+            else:
+                self.logger.info("Please wait, collapsing identical n-grams...")
+                unique = np.stack(self.collapse_ngrams(self.token_ids, self.starts, self.context))
+                # Save to a temporary file first, so incomplete array will be never loaded.
+                tmp_file = unique_file[:-len('.npy')] + '.tmp{}.npy'.format(os.getpid())
+                np.save(tmp_file, unique)
+                os.replace(tmp_file, unique_file)
+            self.logger.info("Collapsed {} n-grams into {} unique ones".format(len(self.starts), unique.shape[1]))
+            self.starts, self.counts = unique[0], unique[1]
+            # Weights used by the WeightedRandomSampler.
+            self.sample_weights = self.counts.astype(np.float64)
+            # Weights returned along with samples, normalized by the (fixed) mean number of occurrences, \
+            # so the weighted loss of a minibatch is an unbiased estimate of the loss over all n-grams.
+            self.weights = self.sample_weights / self.sample_weights.mean()
+
+
+    @staticmethod
+    def encode_sentences(inputs_file, token_ids_file, offsets_file):
+        """
+        Encodes sentences (line by line) into a single array of indices of words (int32) and array of offsets \
+        of sentences in it (int64 [NUM_SENTENCES + 1]), saving both to ``.npy`` files.
+
+        :param inputs_file: File with sentences (with path).
+
+        :param token_ids_file: File with indices of words (with path).
+
+        :param offsets_file: File with offsets of sentences (with path).
+
+        :return: Table of words (list of strings).
+        """
+        word_to_ix = {}
+        token_ids = array.array('i')
+        offsets = array.array('q', [0])
+        with open(inputs_file, mode='rt') as txtfile:
+            for sentence in txtfile:
+                for word in sentence.split():
+                    token_ids.append(word_to_ix.setdefault(word, len(word_to_ix)))
+                offsets.append(len(token_ids))
+        np.save(token_ids_file, np.frombuffer(token_ids, dtype=np.int32))
+        np.save(offsets_file, np.frombuffer(offsets, dtype=np.int64))
+        return list(word_to_ix.keys())
+
+    @staticmethod
+    def compute_ngram_starts(offsets, context):
+        """
+        Computes start positions of all n-grams (i.e. context + target) that lie within single sentences.
+
+        :param offsets: Offsets of sentences (array [NUM_SENTENCES + 1]).
+
+        :param context: Size of the context.
+
+        :return: Array of start positions (int64).
+        """
+        # Number of n-grams in every sentence.
+        counts = np.maximum(np.diff(offsets) - context, 0)
+        # Position of an n-gram in its sentence = its index - index of the first n-gram of the sentence.
+        firsts = np.cumsum(counts) - counts
+        positions = np.arange(counts.sum(), dtype=np.int64) - np.repeat(firsts, counts)
+        return np.repeat(offsets[:-1], counts) + positions
+
+    @staticmethod
+    def collapse_ngrams(token_ids, starts, context):
+        """
+        Collapses identical n-grams.
+
+        :param token_ids: Array of indices of words.
+
+        :param starts: Array of start positions of n-grams.
+
+        :param context: Size of the context.
+
+        :return: Tuple (start positions of the first occurrences of unique n-grams (in order of appearance), numbers of their occurrences).
+        """
+        # Matrix of n-grams [NUM_NGRAMS x CONTEXT+1].
+        ngrams = np.asarray(token_ids)[starts[:, None] + np.arange(context + 1)]
+        _, firsts, counts = np.unique(ngrams, axis=0, return_index=True, return_counts=True)
+        order = np.argsort(firsts)
+        return starts[firsts[order]], counts[order].astype(np.int64)
+
+    def get_ngram(self, index):
+        """
+        Returns words of a given n-gram.
+
+        :param index: Index of the n-gram.
+
+        :return: List of words [CONTEXT + 1].
+        """
+        start = self.starts[index]
+        return [self.words[ix] for ix in self.token_ids[start:start+self.context+1].tolist()]
+
+    def __getstate__(self):
+        """
+        Memory-mapped array is not pickled (e.g. when passing the problem to the ``DataLoader`` workers), each process maps the file on its own.
+        """
+        state = self.__dict__.copy()
+        state['token_ids'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.token_ids = np.load(self.token_ids_file, mmap_mode='r')
 
     def output_data_definitions(self):
         """ 
@@ -113,12 +217,15 @@ class WiLYNGramLanguageModeling(Problem):
 
         :return: dictionary containing output data definitions (each of type :py:class:`ptp.utils.DataDefinition`).
         """
-        return {
+        d = {
             self.key_indices: DataDefinition([-1, 1], [list, int], "Batch of sample indices [BATCH_SIZE] x [1]"),
             #self.key_inputs: DataDefinition([-1, self.context, 1], [list, list, str], "Batch of sentences, each being a context consisint of several words [BATCH_SIZE] x [CONTEXT_SIZE] x [WORD]"),
             self.key_inputs: DataDefinition([-1, 1], [list, str], "Batch of sentences, each being a context consisint of several words [BATCH_SIZE] x [string CONTEXT_SIZE * WORD]"),
             self.key_targets: DataDefinition([-1, 1], [list, str], "Batch of targets, each being a single word [BATCH_SIZE] x [WORD]")
             }
+        if self.deduplicate:
+            d[self.key_weights] = DataDefinition([-1], [torch.Tensor], "Batch of weights, i.e. numbers of occurrences of (collapsed) n-grams divided by their mean [BATCH_SIZE]")
+        return d
 
 
     def __len__(self):
@@ -127,7 +234,7 @@ class WiLYNGramLanguageModeling(Problem):
 
         :return: The size of the problem.
         """
-        return len(self.ngrams)
+        return len(self.starts)
 
 
     def __getitem__(self, index):
@@ -142,7 +249,30 @@ class WiLYNGramLanguageModeling(Problem):
         """
         # Return data_dict.
         data_dict = self.create_data_dict(index)
-        data_dict[self.key_inputs] = ' '.join(self.ngrams[index][:self.context])
-        data_dict[self.key_targets] = self.ngrams[index][-1] # Last word
+        ngram = self.get_ngram(index)
+        data_dict[self.key_inputs] = ' '.join(ngram[:self.context])
+        data_dict[self.key_targets] = ngram[-1] # Last word
+        if self.deduplicate:
+            data_dict[self.key_weights] = float(self.weights[index])
         #print("problem: context = {} target = {}".format(data_dict[self.key_inputs], data_dict[self.key_targets]))
         return data_dict
+
+
+    def __getitems__(self, indices):
+        """
+        Getter method returning the whole batch at once, gathering all n-grams with a single fancy indexing.
+
+        :param indices: List of indices of samples.
+
+        :return: ``DataDict({'indices','inputs','targets'})`` containing the batch.
+
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        data_dict = self.create_data_dict(torch.from_numpy(indices))
+        # Matrix of words of n-grams [BATCH_SIZE x CONTEXT+1].
+        ngrams = self.token_ids[self.starts[indices][:, None] + np.arange(self.context + 1)].tolist()
+        data_dict[self.key_inputs] = [' '.join(self.words[ix] for ix in ngram[:self.context]) for ngram in ngrams]
+        data_dict[self.key_targets] = [self.words[ngram[-1]] for ngram in ngrams]
+        if self.deduplicate:
+            data_dict[self.key_weights] = torch.from_numpy(self.weights[indices])
+        return data_dict
@@ -15,12 +15,14 @@
 __author__ = "Tomasz Kornuta"
 
 import os
-
-from nltk.tokenize import WhitespaceTokenizer
+import numpy as np
+import torch
 
 import ptp.components.utils.io as io
+import ptp.components.utils.word_mappings as wm
 from ptp.configuration import ConfigurationError
 from ptp.components.problems.problem import Problem
+from ptp.data_types.data_dict import DataDict
 from ptp.data_types.data_definition import DataDefinition
 
 
@@ -28,9 +30,11 @@ class WikiTextLanguageModeling(Problem):
     """
     Language modeling problem using WikiText-2 (_dataset2) / WikiText-103 (_dataset103) datasets, featured at the Salesforce _website.
 
-    Problem downloads the files, loads the file associated with a given subset (train/valid/test), concatenates all sencentes and tokenizes them using NLTK's WhitespaceTokenizer.
+    Problem downloads the files, builds the vocabulary (word mappings) from all subsets and encodes the file associated with a given subset (train/valid/test) \
+    into an array of token indices (sentences are tokenized by whitespaces and separated by <eos> tokens), stored in a memory-mapped ``.npy`` file.
     
-    Resulting tokens are then passed to samples (source/target) as list of tokens of a given length (set by the user in configuration file).
+    Resulting tokens are then passed to samples (source/target) as list of tokens of a given length (set by the user in configuration file) \
+    or, when ``output_indices`` is set, as tensors of their indices.
 
     Associated paper: Stephen Merity, Caiming Xiong, James Bradbury, and Richard Socher. Pointer Sentinel Mixture Models (2016) (_arxiv)
 
@@ -41,10 +45,10 @@ class WikiTextLanguageModeling(Problem):
     """
     def __init__(self, name, config):
         """
-        The init method downloads the required files, loads the file associated with a given subset (train/valid/test), 
-        concatenates all sencentes and tokenizes them using NLTK's WhitespaceTokenizer.
+        The init method downloads the required files, builds the vocabulary and encodes the file associated with a given subset (train/valid/test) \
+        into an array of token indices.
 
-        It also stores the intermediate results, so for example, it file with tokenized set is found, it simply loads it.
+        It also stores the intermediate results, so for example, if file with indices of tokens is found, it simply maps it into memory.
 
         :param name: Name of the component.
 
@@ -72,14 +76,16 @@ class WikiTextLanguageModeling(Problem):
             raise ConfigurationError("Problem supports three 'subset' options: 'train', 'valid', 'test' ")
         subset = self.config['subset']
 
-        # Check if file with tokenized words exists.
-        filename_tokenized_words = "wiki."+self.config['subset']+".tokenized_words"
-
-        if not io.check_files_existence(self.data_folder, filename_tokenized_words):
-            # If not, we must generate (and save it) using source files.
+        # Names of files used by this problem.
+        filenames = ["wiki.train.tokens", "wiki.valid.tokens", "wiki.test.tokens"]
+        self.word_mappings_file = self.config['word_mappings_file']
+        filename_token_ids = "wiki."+subset+".token_ids.npy"
+        self.token_ids_file = os.path.join(self.data_folder, filename_token_ids)
 
-            # Names of files used by this problem.
-            filenames = ["wiki.train.tokens", "wiki.valid.tokens", "wiki.test.tokens"]
+        # Check if files with word mappings and (up to date) indices of tokens exist.
+        if not io.check_files_existence(self.data_folder, [self.word_mappings_file, filename_token_ids]) or \
+            os.path.getmtime(self.token_ids_file) < os.path.getmtime(os.path.join(self.data_folder, self.word_mappings_file)):
+            # If not, we must generate (and save) them using source files.
 
             # Initialize dataset if files do not exist.
             if not io.check_files_existence(self.data_folder, filenames):
@@ -99,34 +105,192 @@ class WikiTextLanguageModeling(Problem):
             else:
                 self.logger.info("Files {} found in folder '{}'".format(filenames, self.data_folder))
 
+            # Generate word mappings shared by all subsets - if required.
+            if not io.check_file_existence(self.data_folder, self.word_mappings_file):
+                word_to_ix = self.generate_word_mappings([os.path.join(self.data_folder, f) for f in filenames])
+                wm.save_word_mappings_to_csv_file(self.logger, self.data_folder, self.word_mappings_file, word_to_ix)
+            self.load_word_mappings()
 
-            # Load the whole sentences.
-            sentences = io.load_string_list_from_txt_file(self.data_folder, "wiki."+subset+".tokens")
-            self.logger.info("Loaded {} sentences from the 'wiki.{}.tokens' subset".format(len(sentences), subset))
-
-            # Generate text full of tokens.
-            self.logger.info("Please wait, using NLTK to tokenize the loaded sentences...")
-            # Create a single text by replacing newlines with <eos> tokens.
-            text = " <eos> ".join(sentences)
-            # Tokenize.
-            tokenizer = WhitespaceTokenizer()
-            self.tokens = tokenizer.tokenize(text)
-            # Save fo file.
-            io.save_string_list_to_txt_file(self.data_folder, filename_tokenized_words, self.tokens)
-            self.logger.info("Created text consisting of {} tokens and saved it to '{}'".format(len(self.tokens), filename_tokenized_words))
+            # Encode the subset.
+            self.logger.info("Please wait, encoding the sentences from the 'wiki.{}.tokens' subset...".format(subset))
+            self.encode_tokens(os.path.join(self.data_folder, "wiki."+subset+".tokens"), self.token_ids_file)
         else:
-            # Ok, file with tokens exists, load it.
-            self.tokens = io.load_string_list_from_txt_file(self.data_folder, filename_tokenized_words)
-            self.logger.info("Load text consisting of {} tokens from '{}'".format(len(self.tokens), filename_tokenized_words))
+            self.load_word_mappings()
 
         # Get the required sample length.
         self.sentence_length = self.config['sentence_length']
+
+        # Get batching mode.
+        self.batching = self.config['batching']
+        if self.batching not in ['sliding', 'contiguous']:
+            raise ConfigurationError("Problem supports two 'batching' options: 'sliding', 'contiguous' ")
+        # Consecutive batches contain consecutive windows of the lanes, so they cannot be shuffled.
+        self.sequential_batches = (self.batching == 'contiguous')
+        if self.sequential_batches:
+            self.batch_size = self.config['batch_size']
+            # Shift between consecutive windows (non-overlapping by default).
+            self.bptt_stride = self.config['bptt_stride'] if self.config['bptt_stride'] > 0 else self.sentence_length
+            # Hidden state carried over from the previous window has already consumed the overlapping tokens.
+            if self.bptt_stride < self.sentence_length:
+                raise ConfigurationError("In contiguous batching mode 'bptt_stride' ({}) cannot be smaller than 'sentence_length' ({}), as overlapping windows would be processed twice by the carried over hidden state".format(
+                    self.bptt_stride, self.sentence_length))
+
+        # Map indices of tokens into memory.
+        self.map_token_ids()
+        self.logger.info("Loaded text consisting of {} tokens from '{}'".format(len(self.token_ids), filename_token_ids))
+
+        # Export word mappings to globals - if required.
+        if self.config["export_word_mappings_to_globals"]:
+            self.globals["word_mappings"] = self.word_to_ix
+            self.globals["vocabulary_size"] = len(self.word_to_ix)
+
+        # Check whether the samples should contain indices instead of words.
+        self.output_indices = self.config["output_indices"]
+
         # Calculate the size of dataset.
-        self.dataset_length = len(self.tokens) - self.sentence_length - 1 # as target is "shifted" by 1.
+        if self.sequential_batches:
+            # Number of windows in every lane times number of lanes.
+            num_windows = max(0, (self.lanes.shape[1] - self.sentence_length - 1) // self.bptt_stride + 1)
+            self.dataset_length = num_windows * self.batch_size
+            self.logger.info("Split text into {} contiguous lanes of {} tokens, each providing {} windows (stride {})".format(
+                self.batch_size, self.lanes.shape[1], num_windows, self.bptt_stride))
+        else:
+            self.dataset_length = len(self.token_ids) - self.sentence_length - 1 # as target is "shifted" by 1.
 
         # Display exemplary sample.
-        self.logger.info("Exemplary sample:\n  source: {}\n  target: {}".format(self.tokens[0:self.sentence_length], self.tokens[1:self.sentence_length+1]))
-        
+        self.logger.info("Exemplary sample:\n  source: {}\n  target: {}".format(
+            self.to_words(self.get_window(0)[:-1]), self.to_words(self.get_window(0)[1:])))
+
+
+    def load_word_mappings(self):
+        """
+        Loads (word:index) mappings from file, making sure that the <eos> token is present \
+        (e.g. in mappings generated by other components), and creates the reverse (index:word) mapping.
+
+        When the <eos> token is missing, it is added and the extended mappings are saved back to the file, \
+        so the components sharing it (e.g. embeddings) use the same vocabulary.
+        """
+        self.word_to_ix = wm.load_word_mappings_from_csv_file(self.logger, self.data_folder, self.word_mappings_file)
+        if '<eos>' not in self.word_to_ix:
+            self.word_to_ix['<eos>'] = len(self.word_to_ix)
+            self.logger.warning("Adding missing <eos> token to word mappings in '{}'".format(self.word_mappings_file))
+            wm.save_word_mappings_to_csv_file(self.logger, self.data_folder, self.word_mappings_file, self.word_to_ix)
+        self.ix_to_word = [None] * len(self.word_to_ix)
+        for word, ix in self.word_to_ix.items():
+            self.ix_to_word[ix] = word
+
+    @staticmethod
+    def tokenize(lines):
+        """
+        Tokenizes lines (sentences) by whitespaces, separating them by <eos> tokens (without joining them into a single text).
+
+        :param lines: Iterable of lines (e.g. file object).
+
+        :return: Generator of lists of tokens (one per line).
+        """
+        for i, line in enumerate(lines):
+            if i > 0:
+                yield ['<eos>'] + line.split()
+            else:
+                yield line.split()
+
+    def generate_word_mappings(self, source_files):
+        """
+        Generates (word:index) mappings from all tokens in the source files, streaming them line by line.
+        Index 0 is reserved for <PAD>, others are assigned in order of appearance (as in :py:func:`ptp.components.utils.word_mappings.generate_word_mappings_from_source_files`).
+
+        :param source_files: List of source files (with paths).
+
+        :return: Dictionary with (word:index) mappings.
+        """
+        word_to_ix = {'<PAD>': 0}
+        for filename in source_files:
+            with open(filename, mode='rt') as txtfile:
+                for line in txtfile:
+                    for word in line.split():
+                        if word not in word_to_ix:
+                            word_to_ix[word] = len(word_to_ix)
+        if '<eos>' not in word_to_ix:
+            word_to_ix['<eos>'] = len(word_to_ix)
+        self.logger.info("Generated mappings of size {}".format(len(word_to_ix)))
+        return word_to_ix
+
+    def encode_tokens(self, source_file, token_ids_file):
+        """
+        Encodes tokens from the source file into a (int32) array of their indices, written to a ``.npy`` file.
+        The file is processed in two passes (counting and encoding), so neither the text nor the list of tokens is kept in memory.
+
+        :param source_file: Source file (with path).
+
+        :param token_ids_file: Resulting file (with path).
+        """
+        # Count the tokens.
+        with open(source_file, mode='rt') as txtfile:
+            num_tokens = sum(len(tokens) for tokens in self.tokenize(txtfile))
+
+        # Encode them directly into the memory-mapped array.
+        tmp_file = token_ids_file + '.tmp{}.npy'.format(os.getpid())
+        token_ids = np.lib.format.open_memmap(tmp_file, mode='w+', dtype=np.int32, shape=(num_tokens,))
+        pos = 0
+        with open(source_file, mode='rt') as txtfile:
+            for tokens in self.tokenize(txtfile):
+                token_ids[pos:pos+len(tokens)] = [self.word_to_ix[token] for token in tokens]
+                pos += len(tokens)
+        token_ids.flush()
+        del token_ids
+        os.replace(tmp_file, token_ids_file)
+        self.logger.info("Encoded text consisting of {} tokens and saved it to '{}'".format(num_tokens, token_ids_file))
+
+    def to_words(self, token_ids):
+        """
+        Changes indices of tokens into words.
+
+        :param token_ids: Array of indices.
+
+        :return: List of words.
+        """
+        return [self.ix_to_word[ix] for ix in token_ids.tolist()]
+
+    def map_token_ids(self):
+        """
+        Maps the array with indices of tokens into memory and, in contiguous batching mode, \
+        splits it into ``batch_size`` contiguous lanes (a view [BATCH_SIZE x LANE_LENGTH], remaining tokens are dropped).
+        """
+        self.token_ids = np.load(self.token_ids_file, mmap_mode='r')
+        if self.sequential_batches:
+            lane_length = len(self.token_ids) // self.batch_size
+            self.lanes = self.token_ids[:lane_length * self.batch_size].reshape(self.batch_size, lane_length)
+
+    def get_window(self, index):
+        """
+        Returns indices of tokens of a given sample, i.e. its source along with the last target token.
+
+        In contiguous batching mode sample ``window * batch_size + lane`` is the window of a given lane, \
+        so consecutive batches contain consecutive windows of every lane.
+
+        :param index: Index of the sample.
+
+        :return: Array of indices [SENTENCE_LENGTH + 1].
+        """
+        if self.sequential_batches:
+            window, lane = divmod(index, self.batch_size)
+            start = window * self.bptt_stride
+            return self.lanes[lane, start:start+self.sentence_length+1]
+        else:
+            return self.token_ids[index:index+self.sentence_length+1]
+
+    def __getstate__(self):
+        """
+        Memory-mapped array is not pickled (e.g. when passing the problem to the ``DataLoader`` workers), each process maps the file on its own.
+        """
+        state = self.__dict__.copy()
+        state['token_ids'] = None
+        state.pop('lanes', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.map_token_ids()
 
     def output_data_definitions(self):
         """ 
@@ -134,11 +298,18 @@ class WikiTextLanguageModeling(Problem):
 
         :return: dictionary containing output data definitions (each of type :py:class:`ptp.utils.DataDefinition`).
         """
-        return {
-            self.key_indices: DataDefinition([-1, 1], [list, int], "Batch of sample indices [BATCH_SIZE] x [1]"),
-            self.key_sources: DataDefinition([-1, self.sentence_length, 1], [list, list, str], "Batch of input sentences, each consisting of several words [BATCH_SIZE] x [SENTENCE_LENGTH] x [string]"),
-            self.key_targets: DataDefinition([-1, self.sentence_length, 1], [list, list, str], "Batch of target sentences, each consisting of several words [BATCH_SIZE] x [SENTENCE_LENGTH] x [string]")
-            }
+        if self.output_indices:
+            return {
+                self.key_indices: DataDefinition([-1, 1], [list, int], "Batch of sample indices [BATCH_SIZE] x [1]"),
+                self.key_sources: DataDefinition([-1, self.sentence_length], [torch.Tensor], "Batch of input sentences, each consisting of indices of several words [BATCH_SIZE x SENTENCE_LENGTH]"),
+                self.key_targets: DataDefinition([-1, self.sentence_length], [torch.Tensor], "Batch of target sentences, each consisting of indices of several words [BATCH_SIZE x SENTENCE_LENGTH]")
+                }
+        else:
+            return {
+                self.key_indices: DataDefinition([-1, 1], [list, int], "Batch of sample indices [BATCH_SIZE] x [1]"),
+                self.key_sources: DataDefinition([-1, self.sentence_length, 1], [list, list, str], "Batch of input sentences, each consisting of several words [BATCH_SIZE] x [SENTENCE_LENGTH] x [string]"),
+                self.key_targets: DataDefinition([-1, self.sentence_length, 1], [list, list, str], "Batch of target sentences, each consisting of several words [BATCH_SIZE] x [SENTENCE_LENGTH] x [string]")
+                }
 
 
     def __len__(self):
@@ -162,11 +333,52 @@ class WikiTextLanguageModeling(Problem):
         """
         # Return data_dict.
         data_dict = self.create_data_dict(index)
-        data_dict[self.key_sources] = self.tokens[index:index+self.sentence_length]
-        data_dict[self.key_targets] = self.tokens[index+1:index+self.sentence_length+1] # target is "shifted" by 1.
+        # Get source and target (that is "shifted" by 1) at once.
+        token_ids = self.get_window(index)
+        if self.output_indices:
+            token_ids = torch.from_numpy(token_ids.astype(np.int64))
+            data_dict[self.key_sources] = token_ids[:-1]
+            data_dict[self.key_targets] = token_ids[1:]
+        else:
+            words = self.to_words(token_ids)
+            data_dict[self.key_sources] = words[:-1]
+            data_dict[self.key_targets] = words[1:]
         #print("problem: index = {} source = {} target = {}".format(index, data_dict[self.key_sources], data_dict[self.key_targets]))
         return data_dict
 
+    def __getitems__(self, indices):
+        """
+        Getter method returning the whole batch at once, gathering all windows with a single fancy indexing.
+
+        :param indices: List of indices of samples.
+
+        :return: ``DataDict({'indices', sources','targets'})`` containing the batch.
+
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        data_dict = self.create_data_dict(indices.tolist())
+        offsets = np.arange(self.sentence_length + 1)
+        if self.sequential_batches:
+            windows, lanes = np.divmod(indices, self.batch_size)
+            if len(indices) == self.batch_size and (lanes == np.arange(self.batch_size)).all() and (windows == windows[0]).all():
+                # The whole window of all lanes - simply a (strided) view of lanes.
+                start = windows[0] * self.bptt_stride
+                token_ids = self.lanes[:, start:start+self.sentence_length+1]
+            else:
+                # Matrix of windows [BATCH_SIZE x SENTENCE_LENGTH+1].
+                token_ids = self.lanes[lanes[:, None], windows[:, None] * self.bptt_stride + offsets]
+        else:
+            token_ids = self.token_ids[indices[:, None] + offsets]
+        if self.output_indices:
+            token_ids = torch.from_numpy(token_ids.astype(np.int64))
+            data_dict[self.key_sources] = token_ids[:, :-1]
+            data_dict[self.key_targets] = token_ids[:, 1:]
+        else:
+            words = [self.to_words(window) for window in token_ids]
+            data_dict[self.key_sources] = [window[:-1] for window in words]
+            data_dict[self.key_targets] = [window[1:] for window in words]
+        return data_dict
+
     def collate_fn(self, batch):
         """
         Generates a batch of samples from a list of individuals samples retrieved by :py:func:`__getitem__`.
@@ -177,10 +389,17 @@ class WikiTextLanguageModeling(Problem):
         :return: DataDict containing the created batch.
 
         """
+        # Batch was already created by __getitems__.
+        if isinstance(batch, DataDict):
+            return batch
         # Collate indices.
         data_dict = self.create_data_dict([sample[self.key_indices] for sample in batch])
         # Collate sources.
-        data_dict[self.key_sources] = [sample[self.key_sources] for sample in batch]
-        data_dict[self.key_targets] = [sample[self.key_targets] for sample in batch]
+        if self.output_indices:
+            data_dict[self.key_sources] = torch.stack([sample[self.key_sources] for sample in batch])
+            data_dict[self.key_targets] = torch.stack([sample[self.key_targets] for sample in batch])
+        else:
+            data_dict[self.key_sources] = [sample[self.key_sources] for sample in batch]
+            data_dict[self.key_targets] = [sample[self.key_targets] for sample in batch]
         return data_dict
 
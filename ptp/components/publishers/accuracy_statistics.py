@@ -17,8 +17,6 @@
 __author__ = "Tomasz Kornuta"
 
 import torch
-import math
-import numpy as np
 
 from ptp.components.component import Component
 from ptp.data_types.data_definition import DataDefinition
@@ -99,48 +97,40 @@ class AccuracyStatistics(Component):
         """
         Calculates accuracy equal to mean number of correct classification in a given batch.
 
+        .. note::
+            Computations are done in the context (device) of the predictions, so no synchronization with the host is required.
+
         :param data_dict: DataDict containing the targets.
         :type data_dict: DataDict
 
-        :return: Accuracy.
+        :return: Accuracy (scalar tensor).
 
         """
         # Get targets.
-        targets = data_dict[self.key_targets].data.cpu().numpy()
+        targets = data_dict[self.key_targets]
 
         if self.use_prediction_distributions:
             # Get indices of the max log-probability.
-            preds = data_dict[self.key_predictions].max(1)[1].data.cpu().numpy()
+            preds = data_dict[self.key_predictions].max(1)[1]
         else: 
-            preds = data_dict[self.key_predictions].data.cpu().numpy()
+            preds = data_dict[self.key_predictions]
 
         # Calculate the correct predictinos.
-        correct = np.equal(preds, targets)
-
-        #print(" Target: {}\n Prediction: {}\n Correct: {}\n".format(targets, preds, correct))
+        correct = preds.detach().eq(targets.to(preds.device)).float()
 
         if self.use_masking:
             # Get masks from inputs.
-            masks = data_dict[self.key_masks].data.cpu().numpy()
+            masks = data_dict[self.key_masks].to(preds.device).float()
             correct = correct * masks
-            batch_size = masks.sum()       
+            batch_size = masks.sum()
         else:
-            batch_size = preds.shape[0]       
-        
-        #print(" Mask: {}\n Masked Correct: {}\n".format(masks, correct))
+            batch_size = torch.tensor(float(preds.shape[0]), device=preds.device)
 
         # Simply sum the correct values.
         num_correct = correct.sum()
 
-        #print(" num_correct: {}\n batch_size: {}\n".format(num_correct, batch_size))
-
-        # Normalize by batch size.
-        if batch_size > 0:
-            accuracy = num_correct / batch_size
-        else:
-            accuracy = 0
-
-        return accuracy
+        # Normalize by batch size (accuracy is 0 for empty batches).
+        return torch.where(batch_size > 0, num_correct / batch_size, torch.zeros_like(num_correct))
 
 
     def add_statistics(self, stat_col):
@@ -183,25 +173,15 @@ class AccuracyStatistics(Component):
         :param stat_agg: ``StatisticsAggregator``
 
         """
-        accuracies = stat_col[self.key_accuracy]
-
-        # Check if batch size was collected.
-        if "batch_size" in stat_col.keys():
-            batch_sizes = stat_col['batch_size']
+        # Streaming statistics are weighted by batch sizes (if collected).
+        accuracies = stat_col.get_stream(self.key_accuracy)
 
-            # Calculate weighted precision.
-            accuracies_avg = np.average(accuracies, weights=batch_sizes)
-            accuracies_var = np.average((accuracies-accuracies_avg)**2, weights=batch_sizes)
+        stat_agg[self.key_accuracy] = accuracies.mean
+        stat_agg[self.key_accuracy+'_min'] = accuracies.min
+        stat_agg[self.key_accuracy+'_max'] = accuracies.max
+        stat_agg[self.key_accuracy+'_std'] = accuracies.std()
 
-            stat_agg[self.key_accuracy] = accuracies_avg
-            stat_agg[self.key_accuracy+'_min'] = np.min(accuracies)
-            stat_agg[self.key_accuracy+'_max'] = np.max(accuracies)
-            stat_agg[self.key_accuracy+'_std'] = math.sqrt(accuracies_var)
-        else:
-            # Else: use simple mean.
-            stat_agg[self.key_accuracy] = np.mean(accuracies)
-            stat_agg[self.key_accuracy+'_min'] = np.min(accuracies)
-            stat_agg[self.key_accuracy+'_max'] = np.max(accuracies)
-            stat_agg[self.key_accuracy+'_std'] = np.std(accuracies)
-            # But inform user about that!
+        # Check if batch size was collected.
+        if "batch_size" not in stat_col.keys():
+            # Inform user that simple mean was used.
             self.logger.warning("Aggregated statistics might contain errors due to the lack of information about sizes of aggregated batches")
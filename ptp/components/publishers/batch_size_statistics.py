@@ -105,4 +105,4 @@ class BatchSizeStatistics(Component):
         :param stat_agg: ``StatisticsAggregator``
 
         """
-        stat_agg['samples_aggregated'] = sum(stat_col['batch_size'])
+        stat_agg['samples_aggregated'] = int(stat_col.get_stream('batch_size').total)
@@ -17,19 +17,19 @@
 __author__ = "Tomasz Kornuta"
 
 import torch
-import math
-import numpy as np
-from nltk.translate.bleu_score import sentence_bleu
 
 from ptp.components.component import Component
 from ptp.data_types.data_definition import DataDefinition
+from ptp.components.utils.bleu import bleu_counts, bleu_from_counts
 
 
 class BLEUStatistics(Component):
     """
     Class collecting statistics: BLEU (Bilingual Evaluation Understudy Score).
 
-    It accepts targets and predictions represented as indices of words and uses the provided word mappings to change those into words used finally for calculation of BLEU similarity.
+    It accepts targets and predictions represented as indices of words, skips the indices missing in the provided word mappings \
+    and calculates BLEU directly on the indices (matching NLTK without smoothing): both the average of sentence BLEUs \
+    of every batch and the exact corpus BLEU of all the collected batches.
 
     """
 
@@ -62,6 +62,11 @@ class BLEUStatistics(Component):
         word_to_ix = self.globals["word_mappings"]
         # Construct reverse mapping for faster processing.
         self.ix_to_word = dict((v,k) for k,v in word_to_ix.items())
+        # Mask of indices of known words.
+        self.valid_indices = torch.zeros([max(self.ix_to_word.keys(), default=-1) + 1], dtype=torch.bool)
+        for index in self.ix_to_word.keys():
+            if index >= 0:
+                self.valid_indices[index] = True
 
         # Get masking flag.
         self.weights = self.config["weights"]
@@ -70,6 +75,9 @@ class BLEUStatistics(Component):
         # Get statistics key mappings.
         self.key_bleu = self.statistics_keys["bleu"]
 
+        # Key of the accumulator of statistics required for calculation of corpus BLEU.
+        self.key_corpus_counts = self.name + "_corpus_counts"
+
 
     def input_data_definitions(self):
         """ 
@@ -108,65 +116,47 @@ class BLEUStatistics(Component):
         pass
 
 
-    def calculate_BLEU(self, data_dict):
+    def mask_known_indices(self, indices):
         """
-        Calculates BLEU for predictions of a given batch.
+        Returns mask indicating which indices are present in the word mappings.
+        """
+        valid_indices = self.valid_indices.to(indices.device)
+        in_range = (indices >= 0) & (indices < len(valid_indices))
+        return in_range & valid_indices[indices.clamp(0, max(len(valid_indices) - 1, 0))]
 
-        :param data_dict: DataDict containing the targets and predictions (and optionally masks).
-        :type data_dict: DataDict
+    def calculate_BLEU_counts(self, data_dict):
+        """
+        Calculates statistics required by BLEU (numbers of clipped n-gram matches and of n-grams in predictions, \
+        lengths of predictions and targets) for every sample of a given batch, in the context (device) of the predictions.
 
-        :return: Accuracy.
+        :param data_dict: DataDict containing the targets and predictions.
+        :type data_dict: DataDict
 
+        :return: Tuple (numerators, denominators, prediction lengths, target lengths).
         """
-        # Get targets.
-        targets = data_dict[self.key_targets].data.cpu().numpy().tolist()
-
         if self.use_prediction_distributions:
             # Get indices of the max log-probability.
-            preds = data_dict[self.key_predictions].max(-1)[1].data.cpu().numpy().tolist()
+            preds = data_dict[self.key_predictions].max(-1)[1].detach()
         else: 
-            preds = data_dict[self.key_predictions].data.cpu().numpy().tolist()
+            preds = data_dict[self.key_predictions].detach().long()
+        targets = data_dict[self.key_targets].detach().long().to(preds.device)
 
-        #if self.use_masking:
-        #    # Get masks from inputs.
-        #    masks = data_dict[self.key_masks].data.cpu().numpy().tolist()
-        #else:
-        #    batch_size = preds.shape[0]       
-        
-        # Calculate the correct predictinos.
-        scores = []
-
-        #print("targets ({}): {}\n".format(len(targets), targets[0]))
-        #print("preds ({}): {}\n".format(len(preds), preds[0]))
-
-        for target_indices, pred_indices in zip(targets, preds):
-            # Change target indices to words.
-            target_words = []
-            for t_ind in target_indices:
-                if t_ind in self.ix_to_word.keys():
-                    target_words.append(self.ix_to_word[t_ind])
-            # Change prediction indices to words.
-            pred_words = []
-            for p_ind in pred_indices:
-                if p_ind in self.ix_to_word.keys():
-                    pred_words.append(self.ix_to_word[p_ind])
-            # Calculate BLEU.
-            scores.append(sentence_bleu([target_words], pred_words, self.weights))
-            #print("TARGET: {}\n".format(target_words))
-            #print("PREDICTION: {}\n".format(pred_words))
-            #print("BLEU: {}\n".format(scores[-1]))
-
-            
-        # Get batch size.
-        batch_size = len(targets)
+        # Valid indices are smaller than the size of the mask of known indices, so it is used as the base for hashing of n-grams.
+        return bleu_counts(preds, targets, len(self.weights), self.mask_known_indices(preds), self.mask_known_indices(targets), len(self.valid_indices))
 
-        # Normalize by batch size.
-        if batch_size > 0:
-            score = sum(scores) / batch_size
-        else:
-            score = 0
+    def calculate_BLEU(self, data_dict):
+        """
+        Calculates BLEU for predictions of a given batch.
+
+        :param data_dict: DataDict containing the targets and predictions (and optionally masks).
+        :type data_dict: DataDict
 
-        return score
+        :return: Average of sentence BLEUs (scalar tensor).
+
+        """
+        scores = bleu_from_counts(*self.calculate_BLEU_counts(data_dict), self.weights)
+        # Normalize by batch size.
+        return scores.mean() if scores.numel() > 0 else torch.zeros([], dtype=torch.double)
 
 
     def add_statistics(self, stat_col):
@@ -177,6 +167,7 @@ class BLEUStatistics(Component):
 
         """
         stat_col.add_statistics(self.key_bleu, '{:6.4f}')
+        stat_col.add_accumulator(self.key_corpus_counts)
 
     def collect_statistics(self, stat_col, data_dict):
         """
@@ -185,7 +176,15 @@ class BLEUStatistics(Component):
         :param stat_col: ``StatisticsCollector``.
 
         """
-        stat_col[self.key_bleu] = self.calculate_BLEU(data_dict)
+        numerators, denominators, pred_lengths, target_lengths = self.calculate_BLEU_counts(data_dict)
+
+        # Average of sentence BLEUs.
+        scores = bleu_from_counts(numerators, denominators, pred_lengths, target_lengths, self.weights)
+        stat_col[self.key_bleu] = scores.mean() if scores.numel() > 0 else torch.zeros([], dtype=torch.double)
+
+        # Accumulate the statistics of the whole corpus.
+        stat_col.accumulate(self.key_corpus_counts, torch.cat([
+            numerators.sum(0), denominators.sum(0), pred_lengths.sum().view(1), target_lengths.sum().view(1)]))
 
     def add_aggregators(self, stat_agg):
         """
@@ -198,6 +197,7 @@ class BLEUStatistics(Component):
         #stat_agg.add_aggregator(self.key_bleu+'_min', '{:7.5f}')
         #stat_agg.add_aggregator(self.key_bleu+'_max', '{:7.5f}')
         stat_agg.add_aggregator(self.key_bleu+'_std', '{:7.5f}')
+        stat_agg.add_aggregator(self.key_bleu+'_corpus', '{:7.5f}')
 
 
     def aggregate_statistics(self, stat_col, stat_agg):
@@ -209,25 +209,25 @@ class BLEUStatistics(Component):
         :param stat_agg: ``StatisticsAggregator``
 
         """
-        scores = stat_col[self.key_bleu]
-
-        # Check if batch size was collected.
-        if "batch_size" in stat_col.keys():
-            batch_sizes = stat_col['batch_size']
+        # Streaming statistics are weighted by batch sizes (if collected).
+        scores = stat_col.get_stream(self.key_bleu)
 
-            # Calculate weighted precision.
-            scores_avg = np.average(scores, weights=batch_sizes)
-            scores_var = np.average((scores-scores_avg)**2, weights=batch_sizes)
+        stat_agg[self.key_bleu] = scores.mean
+        #stat_agg[self.key_bleu+'_min'] = scores.min
+        #stat_agg[self.key_bleu+'_max'] = scores.max
+        stat_agg[self.key_bleu+'_std'] = scores.std()
 
-            stat_agg[self.key_bleu] = scores_avg
-            #stat_agg[self.key_bleu+'_min'] = np.min(scores)
-            #stat_agg[self.key_bleu+'_max'] = np.max(scores)
-            stat_agg[self.key_bleu+'_std'] = math.sqrt(scores_var)
+        # Exact corpus BLEU.
+        counts = stat_col.get_accumulator(self.key_corpus_counts)
+        if counts is None:
+            stat_agg[self.key_bleu+'_corpus'] = 0.0
         else:
-            # Else: use simple mean.
-            stat_agg[self.key_bleu] = np.mean(scores)
-            #stat_agg[self.key_bleu+'_min'] = np.min(scores)
-            #stat_agg[self.key_bleu+'_max'] = np.max(scores)
-            stat_agg[self.key_bleu+'_std'] = np.std(scores)
-            # But inform user about that!
+            counts = torch.from_numpy(counts)
+            max_n = len(self.weights)
+            stat_agg[self.key_bleu+'_corpus'] = float(bleu_from_counts(
+                counts[:max_n], counts[max_n:2*max_n], counts[2*max_n], counts[2*max_n+1], self.weights))
+
+        # Check if batch size was collected.
+        if "batch_size" not in stat_col.keys():
+            # Inform user that simple mean was used.
             self.logger.warning("Aggregated statistics might contain errors due to the lack of information about sizes of aggregated batches")
@@ -17,8 +17,8 @@
 __author__ = "Tomasz Kornuta"
 
 import torch
+import weakref
 import numpy as np
-import math
 
 from ptp.components.component import Component
 from ptp.data_types.data_definition import DataDefinition
@@ -78,6 +78,18 @@ class PrecisionRecallStatistics(Component):
             self.labels = list(range(self.num_classes))
             self.index_mappings = {i: i for i in range(self.num_classes)}
 
+        # Precompute the array remapping indices to classes (-1 for indices that are not mapped).
+        self.index_remap = torch.full([max(self.index_mappings.keys(), default=-1) + 1], -1, dtype=torch.long)
+        for index, i in self.index_mappings.items():
+            if index >= 0:
+                self.index_remap[index] = i
+
+        # Key of the accumulator of the confusion matrix.
+        self.key_confusion_matrix = self.name + "_confusion_matrix"
+        # Confusion matrix of the last batch, along with a weak reference to the batch it was calculated for \
+        # (so the batch is not kept alive between logging intervals).
+        self.last_confusion_matrix = (None, None)
+
         # Check display options.
         self.show_confusion_matrix = self.config["show_confusion_matrix"]
         self.show_class_scores = self.config["show_class_scores"]
@@ -111,122 +123,127 @@ class PrecisionRecallStatistics(Component):
 
     def __call__(self, data_dict):
         """
-        Calculates precission recall statistics.
+        At logging interval calculates the confusion matrix for the batch and logs the precission recall statistics.
 
         :param data_dict: DataDict containing the targets.
         :type data_dict: DataDict
 
         """
         # Use worker interval.
-        if self.app_state.episode % self.app_state.args.logging_interval == 0:
-
-            # Calculate all four statistics.
-            confusion_matrix, precision, recall, f1score, support = self.calculate_statistics(data_dict)
-
-            if self.show_confusion_matrix:
-                self.logger.info("Confusion matrix:\n{}".format(confusion_matrix))
-
-            # Calculate weighted averages.
-            support_sum = sum(support)
-            precision_avg = sum([pi*si / support_sum if support_sum > 0 else 0.0 for (pi,si) in zip(precision,support)])
-            recall_avg = sum([ri*si / support_sum if support_sum > 0 else 0.0 for (ri,si) in zip(recall,support)])
-            f1score_avg = sum([fi*si / support_sum if support_sum > 0 else 0.0 for (fi,si) in zip(f1score,support)])
-
-            # Log class scores.
-            if self.show_class_scores:
-                log_str = "\n| Precision | Recall | F1Score | Support | Label\n"
-                log_str+= "|-----------|--------|---------|---------|-------\n"
-                for i in range(self.num_classes):
-                    log_str += "|    {:05.4f} | {:05.4f} |  {:05.4f} |   {:5d} | {}\n".format(
-                        precision[i], recall[i], f1score[i], support[i], self.labels[i])
-                log_str+= "|-----------|--------|---------|---------|-------\n"
-                log_str += "|    {:05.4f} | {:05.4f} |  {:05.4f} |   {:5d} | Weighted Avg\n".format(
-                        precision_avg, recall_avg, f1score_avg, support_sum)
-                self.logger.info(log_str)
-
-
-    def calculate_statistics(self, data_dict):
+        if self.is_logging_episode():
+            # Calculate the confusion matrix once per batch (it will be reused by collect_statistics).
+            confusion_matrix = self.calculate_confusion_matrix(data_dict)
+            self.last_confusion_matrix = (weakref.ref(data_dict), confusion_matrix)
+            self.log_statistics(confusion_matrix.cpu().numpy())
+
+    def log_statistics(self, confusion_matrix):
         """
-        Calculates confusion_matrix, precission, recall, f1score and support statistics.
+        Logs the confusion matrix and/or scores of classes (depending on the display options).
 
-        :param data_dict: DataDict containing the targets.
-        :type data_dict: DataDict
+        :param confusion_matrix: Confusion matrix (numpy array).
 
-        :return: Calculated statistics.
         """
-        targets = data_dict[self.key_targets].data.cpu().numpy()
-        #print("Targets :", targets)
+        if self.show_confusion_matrix:
+            self.logger.info("Confusion matrix:\n{}".format(confusion_matrix))
+
+        # Log class scores.
+        if self.show_class_scores:
+            precision, recall, f1score, support = self.calculate_statistics(confusion_matrix)
+            precision_avg, recall_avg, f1score_avg = self.weighted_average(precision, recall, f1score, support)
+            log_str = "\n| Precision | Recall | F1Score | Support | Label\n"
+            log_str+= "|-----------|--------|---------|---------|-------\n"
+            for i in range(self.num_classes):
+                log_str += "|    {:05.4f} | {:05.4f} |  {:05.4f} |   {:5d} | {}\n".format(
+                    precision[i], recall[i], f1score[i], int(support[i]), self.labels[i])
+            log_str+= "|-----------|--------|---------|---------|-------\n"
+            log_str += "|    {:05.4f} | {:05.4f} |  {:05.4f} |   {:5d} | Weighted Avg\n".format(
+                    precision_avg, recall_avg, f1score_avg, int(support.sum()))
+            self.logger.info(log_str)
+
+    def calculate_confusion_matrix(self, data_dict):
+        """
+        Calculates the confusion matrix (in the context/device of the predictions), using SciKit learn order: \
+        rows - target (actual) classes, columns - predicted classes.
+
+        Indices are remapped to classes with a precomputed array and the matrix is created with a single ``bincount`` \
+        over ``target * num_classes + prediction``. Samples with indices that are not mapped (or masked out) are skipped.
+
+        :param data_dict: DataDict containing the targets and predictions (and optionally masks).
+        :type data_dict: DataDict
 
+        :return: Confusion matrix (int64 tensor [NUM_CLASSES x NUM_CLASSES]).
+        """
         if self.use_prediction_distributions:
             # Get indices of the max log-probability.
-            preds = data_dict[self.key_predictions].max(1)[1].data.cpu().numpy()
+            preds = data_dict[self.key_predictions].max(1)[1].detach()
         else: 
-            preds = data_dict[self.key_predictions].data.cpu().numpy()
-        #print("Predictions :", preds)
+            preds = data_dict[self.key_predictions].detach().long()
+        targets = data_dict[self.key_targets].detach().long().to(preds.device)
+        index_remap = self.index_remap.to(preds.device)
+
+        # Remap indices to classes.
+        valid = (targets >= 0) & (targets < len(index_remap)) & (preds >= 0) & (preds < len(index_remap))
+        targets = index_remap[targets.clamp(0, len(index_remap) - 1)]
+        preds = index_remap[preds.clamp(0, len(index_remap) - 1)]
+        valid = valid & (targets >= 0) & (preds >= 0)
 
         if self.use_masking:
-            # Get masks from inputs.
-            masks = data_dict[self.key_masks].data.cpu().numpy()
-        else:
-            # Create vector full of ones.
-            masks = np.ones(targets.shape[0])
-
-        # Create the confusion matrix, use SciKit learn order:
-        # Column - predicted class
-        #print(self.index_mappings)
-        # Row - target (actual) class
-        confusion_matrix = np.zeros([self.num_classes, self.num_classes], dtype=int)
-        for i, (target, pred) in enumerate(zip(targets, preds)):
-            #print("T: ",target)
-            #print("P: ",pred)
-            # If both indices are ok.
-            if target in self.index_mappings.keys() and pred in self.index_mappings.keys():
-                #print(self.index_mappings[target])
-                #print(self.index_mappings[pred])
-                confusion_matrix[self.index_mappings[target]][self.index_mappings[pred]] += 1 * masks[i]
+            # Skip the masked samples (instead of weighting them, so the matrix always contains counts).
+            valid = valid & data_dict[self.key_masks].detach().to(preds.device).bool()
+
+        bins = targets[valid] * self.num_classes + preds[valid]
+        confusion_matrix = torch.bincount(bins, minlength=self.num_classes * self.num_classes)
+        return confusion_matrix.view(self.num_classes, self.num_classes)
+
+    def calculate_statistics(self, confusion_matrix):
+        """
+        Calculates precission, recall, f1score and support statistics of every class from the confusion matrix.
+
+        :param confusion_matrix: Confusion matrix (numpy array or tensor).
+
+        :return: Calculated statistics (precission, recall, f1score, support), of the same type as confusion matrix.
+        """
+        lib = torch if isinstance(confusion_matrix, torch.Tensor) else np
+        confusion_matrix = confusion_matrix.double() if lib is torch else confusion_matrix.astype(np.float64)
 
         # Calculate true positive (TP), eqv. with hit.
-        tp = np.zeros([self.num_classes], dtype=int)
-        for i in range(self.num_classes):
-            tp[i] = confusion_matrix[i][i]
-        #print("TP = ",tp)        
-
-        # Calculate false positive (FP) eqv. with false alarm, Type I error
-        # Predictions that incorrectly labelled as belonging to a given class.
-        # Sum wrong predictions along the column.
-        fp = np.sum(confusion_matrix, axis=0) - tp
-        #print("FP = ",fp)
-
-        # Calculate false negative (FN), eqv. with miss, Type II error
-        # The target belonged to a given class, but it wasn't correctly labeled.
-        # Sum wrong predictions along the row.
-        fn = np.sum(confusion_matrix, axis=1) - tp
-        #print("FN = ",fn)        
+        tp = lib.diagonal(confusion_matrix)
+        # Predictions that incorrectly labelled as belonging to a given class: TP + false positive (FP).
+        predicted = confusion_matrix.sum(0)
+        # The targets belonging to a given class: TP + false negative (FN).
+        support = confusion_matrix.sum(1)
 
         # Precision is the fraction of events where we correctly declared i
         # out of all instances where the algorithm declared i.
-        precision = [float(tpi) / float(tpi+fpi) if (tpi+fpi) > 0 else 0.0 for (tpi,fpi) in zip(tp,fp)]
+        precision = lib.where(predicted > 0, tp / lib.where(predicted > 0, predicted, lib.ones_like(predicted)), lib.zeros_like(tp))
 
         # Recall is the fraction of events where we correctly declared i 
         # out of all of the cases where the true of state of the world is i.
-        recall = [float(tpi) / float(tpi+fni) if (tpi+fni) > 0 else 0.0 for (tpi,fni) in zip(tp,fn)]
+        recall = lib.where(support > 0, tp / lib.where(support > 0, support, lib.ones_like(support)), lib.zeros_like(tp))
 
         # Calcualte f1-score.
-        f1score = [ 2 * pi * ri / float(pi+ri) if (pi+ri) > 0 else 0.0 for (pi,ri) in zip(precision,recall)]
+        pr_sum = precision + recall
+        f1score = lib.where(pr_sum > 0, 2 * precision * recall / lib.where(pr_sum > 0, pr_sum, lib.ones_like(pr_sum)), lib.zeros_like(tp))
 
-        # Get support.
-        support = np.sum(confusion_matrix, axis=1)
+        return precision, recall, f1score, support
 
-        #print('precision: {}'.format(precision))
-        #print('recall: {}'.format(recall))
-        #print('f1score: {}'.format(f1score))
-        #print('support: {}'.format(support))
+    def weighted_average(self, precision, recall, f1score, support):
+        """
+        Calculates averages of the scores weighted by support of classes.
 
-        return confusion_matrix, precision, recall, f1score, support
+        :return: Tuple (precission, recall, f1score).
+        """
+        support_sum = support.sum()
+        if isinstance(support_sum, torch.Tensor):
+            support_sum = support_sum.clamp(min=1)
+        else:
+            support_sum = max(support_sum, 1)
+        return tuple((score * support).sum() / support_sum for score in [precision, recall, f1score])
 
     def add_statistics(self, stat_col):
         """
-        Adds 'accuracy' statistics to ``StatisticsCollector``.
+        Adds 'precision', 'recall' and 'f1score' statistics along with the accumulator of the confusion matrix \
+        to ``StatisticsCollector``.
 
         :param stat_col: ``StatisticsCollector``.
 
@@ -234,28 +251,32 @@ class PrecisionRecallStatistics(Component):
         stat_col.add_statistics(self.key_precision, '{:05.4f}')
         stat_col.add_statistics(self.key_recall, '{:05.4f}')
         stat_col.add_statistics(self.key_f1score, '{:05.4f}')
+        stat_col.add_accumulator(self.key_confusion_matrix)
 
     def collect_statistics(self, stat_col, data_dict):
         """
-        Collects statistics (batch_size) for given episode.
+        Collects statistics (weighted precision, recall and f1score) for given episode and accumulates the confusion matrix.
 
         :param stat_col: ``StatisticsCollector``.
 
         """
-        # Calculate all four statistics.
-        _, precision, recall, f1score, support = self.calculate_statistics(data_dict)
+        # Reuse the confusion matrix calculated for that batch.
+        if self.last_confusion_matrix[0] is not None and self.last_confusion_matrix[0]() is data_dict:
+            confusion_matrix = self.last_confusion_matrix[1]
+        else:
+            confusion_matrix = self.calculate_confusion_matrix(data_dict)
 
-        # Calculate weighted averages.
-        support_sum = sum(support)
-        precision_avg = sum([pi*si / support_sum if support_sum > 0 else 0.0 for (pi,si) in zip(precision,support)])
-        recall_avg = sum([ri*si / support_sum if support_sum > 0 else 0.0 for (ri,si) in zip(recall,support)])
-        f1score_avg = sum([fi*si / support_sum if support_sum > 0 else 0.0 for (fi,si) in zip(f1score,support)])
+        # Calculate weighted averages (on device).
+        precision_avg, recall_avg, f1score_avg = self.weighted_average(*self.calculate_statistics(confusion_matrix))
 
         # Export to statistics.
         stat_col[self.key_precision] = precision_avg
         stat_col[self.key_recall] = recall_avg
         stat_col[self.key_f1score] = f1score_avg
 
+        # Accumulate the confusion matrix over the whole epoch.
+        stat_col.accumulate(self.key_confusion_matrix, confusion_matrix)
+
     def add_aggregators(self, stat_agg):
         """
         Adds aggregator summing samples from all collected batches.
@@ -269,55 +290,44 @@ class PrecisionRecallStatistics(Component):
         stat_agg.add_aggregator(self.key_recall+'_std', '{:05.4f}')
         stat_agg.add_aggregator(self.key_f1score, '{:05.4f}') 
         stat_agg.add_aggregator(self.key_f1score+'_std', '{:05.4f}')
+        # Exact macro and micro averages.
+        for key in [self.key_precision, self.key_recall, self.key_f1score]:
+            stat_agg.add_aggregator(key+'_macro', '{:05.4f}')
+            stat_agg.add_aggregator(key+'_micro', '{:05.4f}')
 
 
     def aggregate_statistics(self, stat_col, stat_agg):
         """
         Aggregates samples from all collected batches.
 
+        .. note::
+            Precision, recall and f1score (weighted by support, macro and micro averages) are calculated \
+            exactly from the confusion matrix accumulated over all batches, whereas standard deviations \
+            describe the dispersion of the per-batch scores.
+
         :param stat_col: ``StatisticsCollector``
 
         :param stat_agg: ``StatisticsAggregator``
 
         """
-        precisions = stat_col[self.key_precision]
-        recalls = stat_col[self.key_recall]
-        f1scores = stat_col[self.key_f1score]
-
-        # Check if batch size was collected.
-        if "batch_size" in stat_col.keys():
-            batch_sizes = stat_col['batch_size']
-
-            # Calculate weighted precision.
-            precisions_avg = np.average(precisions, weights=batch_sizes)
-            precisions_var = np.average((precisions-precisions_avg)**2, weights=batch_sizes)
-            
-            stat_agg[self.key_precision] = precisions_avg
-            stat_agg[self.key_precision+'_std'] = math.sqrt(precisions_var)
-
-            # Calculate weighted recall.
-            recalls_avg = np.average(recalls, weights=batch_sizes)
-            recalls_var = np.average((recalls-recalls_avg)**2, weights=batch_sizes)
-
-            stat_agg[self.key_recall] = recalls_avg
-            stat_agg[self.key_recall+'_std'] = math.sqrt(recalls_var)
-
-            # Calculate weighted f1 score.
-            f1scores_avg = np.average(f1scores, weights=batch_sizes)
-            f1scores_var = np.average((f1scores-f1scores_avg)**2, weights=batch_sizes)
-
-            stat_agg[self.key_f1score] = f1scores_avg
-            stat_agg[self.key_f1score+'_std'] = math.sqrt(f1scores_var)
-
-        else:
-            # Else: use simple mean.
-            stat_agg[self.key_precision] = np.mean(precisions)
-            stat_agg[self.key_precision+'_std'] = 0.0 if len(precisions) <= 1 else np.std(precisions)
-
-            stat_agg[self.key_recall] = np.mean(recalls)
-            stat_agg[self.key_recall+'_std'] = 0.0 if len(recalls) <= 1 else np.std(recalls)
-
-            stat_agg[self.key_f1score] = np.mean(f1scores)
-            stat_agg[self.key_f1score+'_std'] = 0.0 if len(f1scores) <= 1 else np.std(f1scores)
-            # But inform user about that!
-            self.logger.warning("Aggregated statistics might contain errors due to the lack of information about sizes of aggregated batches")
+        confusion_matrix = stat_col.get_accumulator(self.key_confusion_matrix)
+        if confusion_matrix is None:
+            confusion_matrix = np.zeros([self.num_classes, self.num_classes])
+        precision, recall, f1score, support = self.calculate_statistics(confusion_matrix)
+
+        # Weighted averages.
+        weighted = self.weighted_average(precision, recall, f1score, support)
+        # Macro averages.
+        macro = [score.mean() for score in [precision, recall, f1score]]
+        # Micro averages - for single-label classification all three are equal.
+        total = confusion_matrix.sum()
+        micro = np.trace(confusion_matrix) / total if total > 0 else 0.0
+
+        for key, weighted_score, macro_score in zip([self.key_precision, self.key_recall, self.key_f1score], weighted, macro):
+            stat_agg[key] = float(weighted_score)
+            stat_agg[key+'_std'] = stat_col.get_stream(key).std()
+            stat_agg[key+'_macro'] = float(macro_score)
+            stat_agg[key+'_micro'] = float(micro)
+
+        # Log the scores of the whole set.
+        self.log_statistics(confusion_matrix)
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import sys
+import torch
+
+
+def compact_sequences(sequences, valid):
+    """
+    Removes invalid elements (e.g. padding or indices of unknown words) from the sequences, \
+    moving the valid ones to the front of every row.
+
+    :param sequences: Tensor of indices [BATCH_SIZE x SEQ_LENGTH].
+
+    :param valid: Boolean tensor indicating valid elements [BATCH_SIZE x SEQ_LENGTH].
+
+    :return: Tuple (compacted sequences [BATCH_SIZE x SEQ_LENGTH], lengths [BATCH_SIZE]).
+    """
+    # Stable sort keeps the order of the valid elements.
+    order = torch.sort((~valid).int(), dim=1, stable=True)[1]
+    return sequences.gather(1, order), valid.sum(1)
+
+
+def ngram_keys(sequences, lengths, n, base):
+    """
+    Returns keys identifying n-grams (along with the rows they come from) of the sequences.
+
+    When possible, every n-gram (along with its row) is hashed into a single integer ``row * base^n + code``, \
+    where ``code`` is the n-gram treated as a number in base ``base``. Otherwise (i.e. when such a key could overflow) \
+    n-grams are represented as rows of a [NUM_NGRAMS x (n+1)] tensor.
+
+    :param sequences: Tensor of (compacted) indices [BATCH_SIZE x SEQ_LENGTH].
+
+    :param lengths: Lengths of the sequences [BATCH_SIZE].
+
+    :param n: Order of n-grams.
+
+    :param base: Base used for hashing (greater than all indices).
+
+    :return: Tuple (keys, rows of keys).
+    """
+    batch_size, seq_length = sequences.shape
+    device = sequences.device
+    hashable = batch_size * base ** n < 2 ** 62
+
+    if seq_length < n:
+        empty = torch.zeros([0] if hashable else [0, n + 1], dtype=torch.long, device=device)
+        return empty, torch.zeros([0], dtype=torch.long, device=device)
+
+    # All windows [BATCH_SIZE x NUM_WINDOWS x n] and the ones that fit into the sequences.
+    windows = sequences.unfold(1, n, 1)
+    positions = torch.arange(windows.shape[1], device=device)
+    valid = (positions.unsqueeze(0) + n) <= lengths.unsqueeze(1)
+    rows = torch.arange(batch_size, device=device).unsqueeze(1).expand_as(valid)[valid]
+    windows = windows[valid]
+
+    if hashable:
+        multipliers = base ** torch.arange(n - 1, -1, -1, device=device)
+        keys = rows * base ** n + (windows * multipliers).sum(1)
+    else:
+        keys = torch.cat([rows.unsqueeze(1), windows], dim=1)
+    return keys, rows
+
+
+def bleu_counts(hypotheses, references, max_n, hypotheses_valid=None, references_valid=None, base=None):
+    """
+    Calculates statistics required by BLEU for a batch of hypotheses, each having a single reference: \
+    numbers of clipped n-gram matches and of n-grams in hypotheses (for orders 1..max_n), along with \
+    lengths of hypotheses and references.
+
+    :param hypotheses: Tensor of indices [BATCH_SIZE x HYP_LENGTH].
+
+    :param references: Tensor of indices [BATCH_SIZE x REF_LENGTH].
+
+    :param max_n: Maximum order of n-grams.
+
+    :param hypotheses_valid: Boolean tensor indicating the valid elements of hypotheses (DEFAULT: None, means all are valid)
+
+    :param references_valid: Boolean tensor indicating the valid elements of references (DEFAULT: None, means all are valid)
+
+    :param base: Base used for hashing of n-grams, greater than all valid indices, e.g. size of the vocabulary \
+    (DEFAULT: None, means it will be computed from the indices, what requires copying their maximum to the host)
+
+    :return: Tuple (numerators [BATCH_SIZE x max_n], denominators [BATCH_SIZE x max_n], \
+    hypotheses lengths [BATCH_SIZE], references lengths [BATCH_SIZE]), all being double tensors.
+    """
+    hypotheses = hypotheses.long()
+    references = references.long().to(hypotheses.device)
+    batch_size = hypotheses.shape[0]
+    device = hypotheses.device
+
+    if hypotheses_valid is None:
+        hypotheses_valid = torch.ones_like(hypotheses, dtype=torch.bool)
+    if references_valid is None:
+        references_valid = torch.ones_like(references, dtype=torch.bool)
+    hypotheses, hyp_lengths = compact_sequences(hypotheses, hypotheses_valid)
+    references, ref_lengths = compact_sequences(references, references_valid.to(device))
+
+    # Base used for hashing.
+    if base is None:
+        base = 1 + max(int(hypotheses.max()) if hypotheses.numel() > 0 else 0, int(references.max()) if references.numel() > 0 else 0)
+    base = max(base, 1)
+
+    numerators = torch.zeros([batch_size, max_n], dtype=torch.double, device=device)
+    for n in range(1, max_n + 1):
+        hyp_keys, _ = ngram_keys(hypotheses, hyp_lengths, n, base)
+        ref_keys, _ = ngram_keys(references, ref_lengths, n, base)
+        # Count n-grams occurring in hypotheses and references of a given row.
+        unique_keys, inverse = torch.unique(torch.cat([hyp_keys, ref_keys]), dim=0 if hyp_keys.dim() > 1 else None, return_inverse=True)
+        num_unique = unique_keys.shape[0]
+        hyp_counts = torch.bincount(inverse[:hyp_keys.shape[0]], minlength=num_unique)
+        ref_counts = torch.bincount(inverse[hyp_keys.shape[0]:], minlength=num_unique)
+        # Clip the counts.
+        clipped = torch.min(hyp_counts, ref_counts).double()
+        unique_rows = unique_keys // base ** n if unique_keys.dim() == 1 else unique_keys[:, 0]
+        numerators[:, n - 1] = torch.bincount(unique_rows, weights=clipped, minlength=batch_size)[:batch_size]
+
+    # Number of n-grams in hypotheses (at least 1).
+    orders = torch.arange(1, max_n + 1, device=device)
+    denominators = (hyp_lengths.unsqueeze(1) - orders.unsqueeze(0) + 1).clamp(min=1).double()
+
+    return numerators, denominators, hyp_lengths.double(), ref_lengths.double()
+
+
+def bleu_from_counts(numerators, denominators, hyp_lengths, ref_lengths, weights):
+    """
+    Calculates BLEU from the statistics returned by :py:func:`bleu_counts`, following NLTK (no smoothing). \
+    Pass the statistics of the individual sentences to get the sentence BLEUs or their sums to get the corpus BLEU.
+
+    :param numerators: Numbers of clipped n-gram matches [... x max_n].
+
+    :param denominators: Numbers of n-grams in hypotheses [... x max_n].
+
+    :param hyp_lengths: Lengths of hypotheses [...].
+
+    :param ref_lengths: Lengths of references [...].
+
+    :param weights: Weights of n-gram orders (list of max_n floats).
+
+    :return: BLEU scores [...].
+    """
+    weights = torch.tensor(weights, dtype=torch.double, device=numerators.device)
+    # Precisions with zero matches are replaced by the smallest positive float.
+    precisions = torch.where(numerators > 0, numerators / denominators, torch.full_like(numerators, sys.float_info.min))
+    score = torch.exp((weights * torch.log(precisions)).sum(-1))
+
+    # Brevity penalty.
+    brevity_penalty = torch.exp(1 - ref_lengths / hyp_lengths.clamp(min=1))
+    brevity_penalty = torch.where(hyp_lengths > ref_lengths, torch.ones_like(brevity_penalty), brevity_penalty)
+    brevity_penalty = torch.where(hyp_lengths == 0, torch.zeros_like(brevity_penalty), brevity_penalty)
+
+    # No unigram matches - BLEU is 0.
+    return torch.where(numerators[..., 0] > 0, brevity_penalty * score, torch.zeros_like(score))
@@ -0,0 +1,150 @@
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import math
+import torch
+import torch.nn.functional as F
+
+
+class BatchImageAugmentation(object):
+    """
+    Augmentation of a whole batch of images (tensor [BATCH_SIZE x DEPTH x HEIGHT x WIDTH]), applied after collation.
+
+    Draws a random affine transformation (rotation, translation and scaling, with semantics of \
+    ``torchvision.transforms.RandomAffine``) for every sample and applies all of them with a single \
+    ``affine_grid``/``grid_sample`` call, followed by a (masked) random horizontal flip and (optional) normalization.
+
+    """
+
+    def __init__(self, rotate=(0, 0), translate=(0, 0), scale=(1, 1), flip=0.0, mean=None, std=None):
+        """
+        Initializes the augmentation.
+
+        :param rotate: Range of rotation angles (in degrees, clockwise, as in ``RandomAffine``) (DEFAULT: (0, 0))
+
+        :param translate: Maximal horizontal and vertical translations, as fractions of image width and height (DEFAULT: (0, 0))
+
+        :param scale: Range of scaling factors (DEFAULT: (1, 1))
+
+        :param flip: Probability of horizontal flip (DEFAULT: 0.0)
+        :type flip: float
+
+        :param mean: Means of channels used for normalization (DEFAULT: None, means no normalization)
+
+        :param std: Standard deviations of channels used for normalization (DEFAULT: None)
+
+        """
+        self.rotate = [float(v) for v in rotate]
+        self.translate = [float(v) for v in translate]
+        self.scale = [float(v) for v in scale]
+        self.flip = float(flip)
+        self.mean = mean
+        self.std = std
+
+    @classmethod
+    def from_config(cls, config, mean=None, std=None):
+        """
+        Creates the augmentation from a configuration section (with ``rotate``, ``translate``, ``scale`` and ``flip`` keys).
+
+        :param config: Configuration section (:py:class:`ptp.configuration.ConfigInterface` or dict).
+
+        :param mean: Means of channels used for normalization (DEFAULT: None, means no normalization)
+
+        :param std: Standard deviations of channels used for normalization (DEFAULT: None)
+
+        :return: :py:class:`BatchImageAugmentation` or None if it is not enabled.
+
+        """
+        if config is None or config["enabled"] not in [True, 'True']:
+            return None
+        return cls(config["rotate"], config["translate"], config["scale"], config["flip"], mean, std)
+
+    def affine_matrices(self, batch_size, height, width, device=None):
+        """
+        Draws random affine transformations, returning matrices mapping (normalized) coordinates of output \
+        pixels to coordinates in the input images, as expected by ``affine_grid``.
+
+        :return: Tensor [BATCH_SIZE x 2 x 3].
+
+        """
+        def uniform(low, high):
+            return torch.empty(batch_size, device=device).uniform_(low, high)
+
+        angle = uniform(*self.rotate)
+        scale = uniform(*self.scale)
+        dx = uniform(-self.translate[0], self.translate[0]) * width
+        dy = uniform(-self.translate[1], self.translate[1]) * height
+        return self.inverse_affine_matrices(angle, torch.stack([dx, dy], 1), scale, height, width)
+
+    @staticmethod
+    def inverse_affine_matrices(angle, translation, scale, height, width):
+        """
+        Computes matrices mapping (normalized) coordinates of output pixels to coordinates in the input images \
+        for given transformations (rotation around the center of image, followed by translation), as expected by ``affine_grid``.
+
+        :param angle: Tensor of rotation angles (in degrees, clockwise, as in ``torchvision.transforms.functional.affine``) [BATCH_SIZE].
+
+        :param translation: Tensor of horizontal and vertical translations (in pixels) [BATCH_SIZE x 2].
+
+        :param scale: Tensor of scaling factors [BATCH_SIZE].
+
+        :param height: Height of images.
+
+        :param width: Width of images.
+
+        :return: Tensor [BATCH_SIZE x 2 x 3].
+
+        """
+        angle = angle * (math.pi / 180)
+        # Inverse of the (forward, clockwise) rotation & scaling in pixel coordinates (y axis pointing down).
+        cos = torch.cos(angle) / scale
+        sin = torch.sin(angle) / scale
+        inverse = torch.stack([torch.stack([cos, sin], 1), torch.stack([-sin, cos], 1)], 1)
+
+        # Switch to normalized coordinates: D^-1 M^-1 D.
+        half = torch.tensor([width / 2, height / 2], device=angle.device)
+        linear = inverse * half.view(1, 1, 2) / half.view(1, 2, 1)
+        # Translation: -D^-1 M^-1 t.
+        offset = -torch.bmm(inverse, translation.unsqueeze(2)).squeeze(2) / half
+        return torch.cat([linear, offset.unsqueeze(2)], 2)
+
+    def __call__(self, images):
+        """
+        Augments the batch of images.
+
+        :param images: Tensor [BATCH_SIZE x DEPTH x HEIGHT x WIDTH].
+
+        :return: Augmented (and normalized) images.
+
+        """
+        batch_size, depth, height, width = images.shape
+        images = images.float()
+
+        # Skip the identity transformation (e.g. when used for normalization only).
+        if self.rotate != [0, 0] or self.translate != [0, 0] or self.scale != [1, 1]:
+            theta = self.affine_matrices(batch_size, height, width, images.device)
+            grid = F.affine_grid(theta, [batch_size, depth, height, width], align_corners=False)
+            images = F.grid_sample(images, grid, mode='bilinear', padding_mode='zeros', align_corners=False)
+
+        if self.flip > 0:
+            flip = torch.rand(batch_size, device=images.device) < self.flip
+            images = torch.where(flip.view(-1, 1, 1, 1), images.flip(-1), images)
+
+        if self.mean is not None:
+            mean = torch.tensor(self.mean, dtype=images.dtype, device=images.device).view(1, -1, 1, 1)
+            std = torch.tensor(self.std, dtype=images.dtype, device=images.device).view(1, -1, 1, 1)
+            images = (images - mean) / std
+        return images
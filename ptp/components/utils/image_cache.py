@@ -0,0 +1,197 @@
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import os
+import json
+import tqdm
+import numpy as np
+from PIL import Image
+
+
+class ImageCache(object):
+    """
+    Store of decoded and resized images, kept in memory-mapped files in the cache folder:
+
+        - ``images_<H>x<W>.npy`` - uint8 array [NUM_IMAGES x H x W x 3] with resized (RGB) images,
+        - ``images_<H>x<W>_meta.npy`` - float64 array [NUM_IMAGES x 4] with flags indicating whether \
+        the row was filled, original heights and widths of images and modification times of the source files,
+        - ``images_<H>x<W>.json`` - index with ids of images (names of files without extension).
+
+    Every image is decoded once (for a given size): rows are filled lazily, on first access (also by \
+    the ``DataLoader`` worker processes, as the files are mapped in shared mode), or all at once with :py:func:`build`. \
+    Rows of images which source files were modified are refilled.
+
+    """
+
+    def __init__(self, cache_folder, image_folder, height, width, extension='.jpg', logger=None):
+        """
+        Opens (or creates) the cache for images from a given folder.
+
+        :param cache_folder: Folder where the cache files will be stored.
+        :type cache_folder: str
+
+        :param image_folder: Folder containing the source images.
+        :type image_folder: str
+
+        :param height: Height of the resized images.
+        :type height: int
+
+        :param width: Width of the resized images.
+        :type width: int
+
+        :param extension: Extension of the source images (DEFAULT: '.jpg')
+        :type extension: str
+
+        :param logger: Logger (DEFAULT: None)
+
+        """
+        self.image_folder = image_folder
+        self.height = height
+        self.width = width
+        self.extension = extension
+
+        os.makedirs(cache_folder, exist_ok=True)
+        name = 'images_{}x{}'.format(height, width)
+        self.images_file = os.path.join(cache_folder, name + '.npy')
+        self.meta_file = os.path.join(cache_folder, name + '_meta.npy')
+        self.index_file = os.path.join(cache_folder, name + '.json')
+
+        # Get ids of all images in the folder.
+        self.ids = sorted(f[:-len(extension)] for f in os.listdir(image_folder) if f.endswith(extension))
+        self.rows = {image_id: row for row, image_id in enumerate(self.ids)}
+
+        if self.is_index_valid():
+            invalidated = self.invalidate_modified()
+            if logger is not None:
+                logger.info("Opened image cache '{}' ({} of {} images must be refilled)".format(self.images_file, invalidated, len(self.ids)))
+        else:
+            self.create()
+            if logger is not None:
+                logger.info("Created image cache '{}' for {} images".format(self.images_file, len(self.ids)))
+
+        # Memory-mapped arrays are opened lazily (in every process).
+        self.images = None
+        self.meta = None
+
+    def is_index_valid(self):
+        """
+        Checks whether the cache files exist and were created for the same images.
+        """
+        if not all(os.path.isfile(f) for f in [self.images_file, self.meta_file, self.index_file]):
+            return False
+        with open(self.index_file) as f:
+            index = json.load(f)
+        return index.get('ids') == self.ids and index.get('height') == self.height and index.get('width') == self.width
+
+    def create(self):
+        """
+        Creates empty cache files.
+        """
+        images = np.lib.format.open_memmap(self.images_file, mode='w+', dtype=np.uint8,
+            shape=(len(self.ids), self.height, self.width, 3))
+        del images
+        meta = np.lib.format.open_memmap(self.meta_file, mode='w+', dtype=np.float64, shape=(len(self.ids), 4))
+        meta[:] = 0
+        del meta
+        # Index is written last - it marks the cache as complete.
+        with open(self.index_file, 'w') as f:
+            json.dump({'ids': self.ids, 'height': self.height, 'width': self.width}, f)
+
+    def invalidate_modified(self):
+        """
+        Marks rows of images which source files were modified as not filled.
+
+        :return: Number of rows that are not filled.
+        """
+        meta = np.load(self.meta_file, mmap_mode='r+')
+        mtimes = np.array([os.path.getmtime(self.source_file(image_id)) for image_id in self.ids], dtype=np.float64)
+        meta[meta[:, 3] != mtimes, 0] = 0
+        invalidated = int((meta[:, 0] == 0).sum())
+        meta.flush()
+        del meta
+        return invalidated
+
+    def source_file(self, image_id):
+        """
+        Returns the name of the source file (with path) of a given image.
+        """
+        return os.path.join(self.image_folder, image_id + self.extension)
+
+    def open(self):
+        """
+        Maps the cache files into memory.
+        """
+        self.images = np.load(self.images_file, mmap_mode='r+')
+        self.meta = np.load(self.meta_file, mmap_mode='r+')
+
+    def __getstate__(self):
+        """
+        Memory-mapped arrays are not pickled (e.g. when passing the problem to the ``DataLoader`` workers).
+        """
+        state = self.__dict__.copy()
+        state['images'] = None
+        state['meta'] = None
+        return state
+
+    def __contains__(self, image_id):
+        return image_id in self.rows
+
+    def __len__(self):
+        return len(self.ids)
+
+    def fill(self, row):
+        """
+        Decodes and resizes the image, storing it in a given row.
+        """
+        image_id = self.ids[row]
+        source_file = self.source_file(image_id)
+        mtime = os.path.getmtime(source_file)
+        img = Image.open(source_file).convert('RGB')
+        width, height = img.size
+        # Same (bilinear) interpolation as the one used by the transforms.Resize.
+        img = img.resize((self.width, self.height), Image.BILINEAR)
+        self.images[row] = np.asarray(img, dtype=np.uint8)
+        self.meta[row, 1:] = [height, width, mtime]
+        # Flag is set at the end, when the row is complete.
+        self.meta[row, 0] = 1
+
+    def get(self, image_id):
+        """
+        Returns the resized image along with the original size of the image.
+
+        :param image_id: Id of the image (name of the file without extension).
+        :type image_id: str
+
+        :return: Tuple (uint8 array [H x W x 3], (original height, original width)).
+        """
+        if self.images is None:
+            self.open()
+        row = self.rows[image_id]
+        if self.meta[row, 0] == 0:
+            self.fill(row)
+        return self.images[row], (int(self.meta[row, 1]), int(self.meta[row, 2]))
+
+    def build(self):
+        """
+        Fills all the rows that are not filled yet.
+        """
+        if self.images is None:
+            self.open()
+        rows = np.nonzero(self.meta[:, 0] == 0)[0]
+        for row in tqdm.tqdm(rows):
+            self.fill(row)
+        self.images.flush()
+        self.meta.flush()
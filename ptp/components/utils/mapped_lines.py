@@ -0,0 +1,125 @@
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import os
+import mmap
+import numpy as np
+
+
+class MappedLines(object):
+    """
+    Read-only sequence of lines of a (utf-8) text file, accessed through ``mmap``.
+
+    Offsets of lines are computed once and cached next to the file (``<filename>.index.npy``, int64 array \
+    [NUM_LINES + 1]), so the content of the file is neither loaded nor kept in memory of the process(es). \
+    Lines are returned without the end of line characters (as by :py:func:`ptp.components.utils.io.load_string_list_from_txt_file`).
+
+    """
+
+    def __init__(self, folder, filename):
+        """
+        Opens the file, building the index of lines if not present (or outdated).
+
+        :param folder: Relative path to to folder.
+        :type folder: str
+
+        :param filename: Name of the file.
+        :type filename: str
+
+        """
+        self.filename = os.path.join(os.path.expanduser(folder), filename)
+        self.index_file = self.filename + '.index.npy'
+
+        if not os.path.isfile(self.index_file) or os.path.getmtime(self.index_file) < os.path.getmtime(self.filename):
+            self.build_index()
+        self.offsets = np.load(self.index_file)
+
+        # File is mapped lazily (in every process).
+        self.file = None
+        self.mm = None
+
+    def build_index(self):
+        """
+        Finds offsets of all lines and saves them to the index file.
+        """
+        size = os.path.getsize(self.filename)
+        if size == 0:
+            offsets = np.zeros(1, dtype=np.int64)
+        else:
+            with open(self.filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                data = np.frombuffer(mm, dtype=np.uint8)
+                # Lines end with '\n', '\r\n' or '\r' (universal newlines, as when reading file in text mode).
+                breaks = data == ord('\r')
+                breaks[:-1] &= data[1:] != ord('\n')
+                breaks |= data == ord('\n')
+                # Lines start after every end of line.
+                ends = np.flatnonzero(breaks) + 1
+                del data, breaks
+                # Add start of the first line and end of the last line (if not terminated).
+                offsets = np.concatenate([[0], ends, [size] if ends[-1:].tolist() != [size] else []]).astype(np.int64)
+                del ends
+        # Save to a temporary file first, so incomplete index will be never loaded.
+        tmp_file = self.filename + '.index.tmp{}.npy'.format(os.getpid())
+        np.save(tmp_file, offsets)
+        os.replace(tmp_file, self.index_file)
+
+    def open(self):
+        """
+        Maps the file into memory.
+        """
+        self.file = open(self.filename, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] > 0 else b''
+
+    def __getstate__(self):
+        """
+        Mapped file is not pickled (e.g. when passing the problem to the ``DataLoader`` workers).
+        """
+        state = self.__dict__.copy()
+        state['file'] = None
+        state['mm'] = None
+        return state
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        """
+        Returns a given line.
+
+        :param index: Index of the line.
+        :type index: int
+
+        :return: Line (str).
+        """
+        if self.mm is None:
+            self.open()
+        line = self.mm[self.offsets[index]:self.offsets[index+1]]
+        # Remove end of line characters.
+        if line.endswith(b'\r\n'):
+            line = line[:-2]
+        elif line.endswith(b'\n') or line.endswith(b'\r'):
+            line = line[:-1]
+        return line.decode('utf-8')
+
+    def close(self):
+        """
+        Unmaps the file.
+        """
+        if self.mm is not None and not isinstance(self.mm, bytes):
+            self.mm.close()
+            self.file.close()
+        self.file = None
+        self.mm = None
@@ -82,7 +82,7 @@ class StreamViewer(Component):
 
         """
         # Use worker interval.
-        if self.app_state.episode % self.app_state.args.logging_interval == 0:
+        if self.is_logging_episode():
 
             # Get indices.
             indices = data_dict[self.key_indices]
@@ -1,10 +1,12 @@
 from .config_interface import ConfigInterface
 from .config_registry import ConfigRegistry
 from .configuration_error import ConfigurationError
+from .runtime_context import RuntimeContext
 #from configs_parsing import load_default_configuration_file
 
 __all__ = [
     'ConfigInterface',
     'ConfigRegistry',
     'ConfigurationError',
+    'RuntimeContext',
     ]
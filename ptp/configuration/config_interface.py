@@ -21,6 +21,7 @@ import yaml
 from collections.abc import Mapping
 
 from ptp.configuration.config_registry import ConfigRegistry
+from ptp.configuration.runtime_context import RuntimeContext
 
 
 class ConfigInterface(Mapping):
@@ -40,12 +41,12 @@ class ConfigInterface(Mapping):
 
     """
 
-    def __init__(self, *keys):
+    def __init__(self, *keys, context=None):
         """
         Constructor:
 
             - Call base constructor (:py:class:`Mapping`),
-            - Initializes the :py:class:`ConfigRegistry`,
+            - Initializes the :py:class:`ConfigRegistry` (taken from the runtime context),
             - Initializes empty keys_path list
 
 
@@ -53,6 +54,9 @@ class ConfigInterface(Mapping):
         does not exist. If empty, shows the whole registry.
         :type keys: sequence / collection: dict, list etc.
 
+        :param context: Runtime context the configuration belongs to (DEFAULT: None, means the default context wrapping the singletons)
+        :type context: :py:class:`RuntimeContext`
+
         .. note::
 
             Calling :py:func:`to_dict` after initializing a :py:class:`ConfigInterface` with ``keys``, \
@@ -67,8 +71,11 @@ class ConfigInterface(Mapping):
         # call base constructor
         super(ConfigInterface, self).__init__()
 
-        # empty ConfigRegistry
-        self._config_registry = ConfigRegistry()
+        # Runtime context, providing the ConfigRegistry (and AppState for components using this configuration).
+        if context is None:
+            context = RuntimeContext.default()
+        self.context = context
+        self._config_registry = context.config_registry
 
         # keys_path as a list
         self._keys_path = list(keys)
@@ -143,7 +150,7 @@ class ConfigInterface(Mapping):
         """
         v = self._lookup(key)
         if isinstance(v, dict) or isinstance(v, ConfigRegistry):
-            return ConfigInterface(*self._keys_path, key)
+            return ConfigInterface(*self._keys_path, key, context=self.context)
         else:  # We are at a leaf of the tree
             return v
 
@@ -16,9 +16,10 @@
 # limitations under the License.
 
 import os
+import copy
 import yaml
 
-from ptp.utils.app_state import AppState
+from ptp.configuration.runtime_context import RuntimeContext
 
 
 def display_parsing_results(logger, parsed_args, unparsed_args):
@@ -94,20 +95,30 @@ def export_experiment_configuration_to_yml(logger, log_dir, filename, config_int
             exit(0)            
 
 
-def load_class_default_config_file(class_type):
+def load_class_default_config_file(class_type, context=None):
     """
     Function loads default configuration from the default config file associated with the given class type and adds it to parameter registry.
 
     :param class_type: Class type of a given object.
 
+    :param context: Runtime context providing the path to configs and caching the loaded configurations \
+    (DEFAULT: None, means the default context wrapping the singletons)
+    :type context: :py:class:`RuntimeContext`
+
     :raturn: Loaded default configuration.
     """
-    
+    if context is None:
+        context = RuntimeContext.default()
+
+    # Check whether the default configuration was already loaded (or restored).
+    if class_type.__module__ in context.default_configs:
+        return copy.deepcopy(context.default_configs[class_type.__module__])
+
     # Extract path to default config.
     module = class_type.__module__.replace(".","/")
     rel_path = module[module.find("ptp")+4:]
     # Build the abs path to the default config file of a given component.
-    abs_default_config = AppState().absolute_config_path + "default/" + rel_path + ".yml"
+    abs_default_config = context.app_state.absolute_config_path + "default/" + rel_path + ".yml"
 
     # Check if file exists.
     if not os.path.isfile(abs_default_config):
@@ -122,15 +133,35 @@ def load_class_default_config_file(class_type):
         # Return default parameters so they can be added to the global registry.
         if param_dict is None:
                 print("WARNING: The default configuration file '{}' is empty!".format(abs_default_config))
-                return {}
-        else:
-            return param_dict
+                param_dict = {}
+        # Remember the configuration, so next time we won't have to parse the file.
+        context.default_configs[class_type.__module__] = param_dict
+        return copy.deepcopy(param_dict)
 
     except yaml.YAMLError as e:
         print("ERROR: Couldn't properly parse the '{}' default configuration file. YAML error:\n  {}".format(abs_default_config, e))
         exit(-2)
 
 
+def add_class_default_config(class_module, param_dict, context=None):
+    """
+    Adds default configuration of a given class, so it won't be loaded from the default config file \
+    (used e.g. when restoring the exported pipeline).
+
+    :param class_module: Name of the module of a given class (i.e. ``class_type.__module__``).
+    :type class_module: str
+
+    :param param_dict: Default configuration.
+    :type param_dict: dict
+
+    :param context: Runtime context the configuration will be added to (DEFAULT: None, means the default context wrapping the singletons)
+    :type context: :py:class:`RuntimeContext`
+    """
+    if context is None:
+        context = RuntimeContext.default()
+    context.default_configs[class_module] = copy.deepcopy(param_dict)
+
+
 def recurrent_config_parse(configs: str, configs_parsed: list, abs_config_path: str):
     """
     Parses names of configuration files in a recursive manner, i.e. \
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+from ptp.utils.app_state import AppState
+from ptp.configuration.config_registry import ConfigRegistry
+
+
+class RuntimeContext(object):
+    """
+    Runtime context of a pipeline, gathering the :py:class:`ConfigRegistry` (configuration), \
+    the :py:class:`ptp.utils.AppState` (application state along with global variables, path to configs and log file) \
+    and the default configurations of components that were already loaded (or restored).
+
+    The default context (returned by :py:func:`default`) wraps the singletons, which is the behaviour used by the workers.
+    Every newly created context has its own registry and application state, so several independent pipelines \
+    (with different configurations and global variables) can be hosted in a single process:
+
+        >>> context = RuntimeContext()
+        >>> config = ConfigInterface(context=context)
+        >>> config.add_config_params({'pipeline': {...}})
+        >>> pipeline = PipelineManager('pipeline', config['pipeline'])
+
+    """
+
+    # Default context, wrapping the singletons.
+    __default = None
+
+    def __init__(self, config_registry=None, app_state=None):
+        """
+        Initializes the context.
+
+        :param config_registry: Configuration registry (DEFAULT: None, means that a new, independent registry will be created)
+        :type config_registry: :py:class:`ConfigRegistry`
+
+        :param app_state: Application state (DEFAULT: None, means that a new, independent application state will be created, \
+        initialized with the command line arguments and path to configs of the default one)
+        :type app_state: :py:class:`ptp.utils.AppState`
+        """
+        if config_registry is None:
+            config_registry = ConfigRegistry.create_instance()
+        self.config_registry = config_registry
+
+        if app_state is None:
+            app_state = AppState.create_instance()
+            # Start with the command line arguments and path to configs of the default context.
+            app_state.args = AppState().args
+            app_state.absolute_config_path = getattr(AppState(), "absolute_config_path", None)
+        self.app_state = app_state
+
+        # Default configurations that were already loaded (or restored), indexed by the class module.
+        self.default_configs = {}
+
+
+    @staticmethod
+    def default():
+        """
+        Returns the default context, wrapping the :py:class:`ConfigRegistry` and :py:class:`ptp.utils.AppState` singletons.
+
+        :return: :py:class:`RuntimeContext` object.
+        """
+        if RuntimeContext.__default is None:
+            RuntimeContext.__default = RuntimeContext(ConfigRegistry(), AppState())
+        return RuntimeContext.__default
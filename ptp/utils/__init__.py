@@ -1,16 +1,30 @@
 from .app_state import AppState
 from .globals_facade import GlobalsFacade
+from .histogram_writer import HistogramWriter
 from .key_mappings_facade import KeyMappingsFacade
+from .metrics_server import MetricsServer
 from .singleton import SingletonMetaClass
 from .statistics_aggregator import StatisticsAggregator
 from .statistics_collector import StatisticsCollector
+from .statistics_exporter import StatisticsSnapshot, StatisticsExporter
+from .statistics_sinks import StatisticsSink, CSVStatisticsSink, BinaryStatisticsSink
+from .streaming_statistics import QuantileSketch, StreamingStatistics
 
 
 __all__ = [
     'AppState',
     'GlobalsFacade',
+    'HistogramWriter',
     'KeyMappingsFacade',
+    'MetricsServer',
     'SingletonMetaClass',
     'StatisticsAggregator',
-    'StatisticsCollector',    
+    'StatisticsCollector',
+    'StatisticsSnapshot',
+    'StatisticsExporter',
+    'StatisticsSink',
+    'CSVStatisticsSink',
+    'BinaryStatisticsSink',
+    'QuantileSketch',
+    'StreamingStatistics',
     ]
@@ -22,15 +22,19 @@ class GlobalsFacade(object):
     """
     Simple facility for accessing global variables using provided mappings using list-like read-write access.
     """
-    def __init__(self, key_mappings):
+    def __init__(self, key_mappings, app_state=None):
         """
         Constructor. Initializes app state and stores key mappings.
 
         :param key_mappings: Dictionary of global key mappings of the parent object.
+
+        :param app_state: Application state storing the global variables (DEFAULT: None, means the ``AppState`` singleton).
         """
         # Remember parent object global keys mappings.
         self.key_mappings = key_mappings
-        self.app_state = AppState()
+        if app_state is None:
+            app_state = AppState()
+        self.app_state = app_state
 
     def __setitem__(self, key, value):
         """
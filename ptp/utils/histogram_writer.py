@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import math
+import queue
+import fnmatch
+import threading
+import torch
+
+import ptp.utils.logger as logging
+
+
+def compute_histogram(tensor, bins=64, max_samples=1000000):
+    """
+    Computes fixed-bin histogram of values of a tensor in its own context (device), without synchronization with the host.
+
+    Moments (min, max, sum and sum of squares) are computed on all values, whereas the histogram of very large \
+    tensors is computed on a strided subsample (and then rescaled), so no random numbers are drawn. Bins always \
+    span the range of all values, so they match the bucket limits derived from the moments in :py:func:`HistogramWriter.write`.
+
+    :param tensor: Tensor.
+
+    :param bins: Number of bins (DEFAULT: 64)
+    :type bins: int
+
+    :param max_samples: Maximum number of values used for computing the histogram (DEFAULT: 1000000)
+    :type max_samples: int
+
+    :return: Tuple of tensors (moments [min, max, num, sum, sum_squares], counts [bins]).
+    """
+    values = tensor.detach().reshape(-1).float()
+    num = values.numel()
+
+    # Subsample very large tensors.
+    stride = max(1, int(math.ceil(num / max_samples)))
+    sample = values[::stride]
+
+    # Range [min, max] of all values (extended by 1 for constant tensors, as in torch.histc), also used by write().
+    min_value, max_value = values.min(), values.max()
+    constant = min_value == max_value
+    low = torch.where(constant, min_value - 1, min_value)
+    high = torch.where(constant, max_value + 1, max_value)
+
+    # Fixed-bin histogram of the sample in that range (the maximum belongs to the last bin).
+    indices = ((sample - low) * (bins / (high - low))).long().clamp_(0, bins - 1)
+    counts = values.new_zeros(bins).index_add_(0, indices, values.new_ones(sample.numel()))
+    if sample.numel() != num:
+        counts = counts * (num / sample.numel())
+
+    moments = torch.stack([min_value, max_value, values.new_tensor(float(num)), values.sum(), (values * values).sum()])
+    return moments, counts
+
+
+class HistogramWriter(object):
+    """
+    Exports histograms of tensors (e.g. parameters and their gradients) to TensorBoard.
+
+    Histograms are computed in torch (see :py:func:`compute_histogram`), in the context of the tensors, and passed \
+    through a bounded queue to a background thread, which transfers them to the host and writes them with \
+    ``add_histogram_raw``. When the queue is full, histograms are dropped instead of blocking the training loop.
+
+    """
+
+    def __init__(self, tb_writer, bins=64, max_samples=1000000, filters='', max_queue_size=1000):
+        """
+        Initializes the writer and starts the background thread.
+
+        :param tb_writer: TensorBoard writer.
+        :type tb_writer: :py:class:`tensorboardX.SummaryWriter`
+
+        :param bins: Number of bins (DEFAULT: 64)
+        :type bins: int
+
+        :param max_samples: Maximum number of values of a single tensor used for computing its histogram (DEFAULT: 1000000)
+        :type max_samples: int
+
+        :param filters: Comma separated list of (fnmatch) patterns of names of tracked tensors \
+        (DEFAULT: '', means that all tensors are tracked)
+        :type filters: str
+
+        :param max_queue_size: Maximum number of histograms waiting for export (DEFAULT: 1000)
+        :type max_queue_size: int
+
+        """
+        self.tb_writer = tb_writer
+        self.bins = bins
+        self.max_samples = max_samples
+        self.filters = [f for f in filters.replace(" ", "").split(",") if f != ''] if filters is not None else []
+        self.logger = logging.initialize_logger('HistogramWriter')
+
+        # Number of histograms dropped due to full queue.
+        self.dropped = 0
+
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.thread = threading.Thread(target=self.run, name='HistogramWriter', daemon=True)
+        self.thread.start()
+
+    def is_tracked(self, name):
+        """
+        Checks whether the tensor with a given name passes the filters.
+
+        :param name: Name of the tensor (e.g. parameter).
+        :type name: str
+
+        """
+        return len(self.filters) == 0 or any(fnmatch.fnmatchcase(name, f) for f in self.filters)
+
+    def add_histogram(self, tag, tensor, step):
+        """
+        Computes the histogram of a tensor and passes it to the background thread.
+
+        :param tag: Tag of the histogram.
+        :type tag: str
+
+        :param tensor: Tensor.
+
+        :param step: Global step (e.g. episode).
+        :type step: int
+
+        """
+        moments, counts = compute_histogram(tensor, self.bins, self.max_samples)
+        try:
+            self.queue.put_nowait((tag, moments, counts, step))
+        except queue.Full:
+            self.dropped += 1
+
+    def add_parameters(self, named_parameters, step, gradients=False):
+        """
+        Adds histograms of (tracked) parameters and, optionally, of their gradients.
+
+        :param named_parameters: Iterable of pairs (name, parameter), e.g. returned by ``named_parameters()``.
+
+        :param step: Global step (e.g. episode).
+        :type step: int
+
+        :param gradients: If True, histograms of gradients will be added as well (DEFAULT: False)
+        :type gradients: bool
+
+        """
+        for name, param in named_parameters:
+            if not self.is_tracked(name):
+                continue
+            self.add_histogram(name, param.data, step)
+            if gradients and param.grad is not None:
+                self.add_histogram(name + '/grad', param.grad.data, step)
+
+    def run(self):
+        """
+        Main loop of the background thread: transfers the histograms to the host and writes them.
+        """
+        while True:
+            item = self.queue.get()
+            try:
+                # Stop.
+                if item is None:
+                    return
+                tag, moments, counts = item[0], item[1].cpu().tolist(), item[2].cpu().tolist()
+                self.write(tag, moments, counts, item[3])
+            except Exception as e:
+                self.logger.error("  {} :: {}".format(item[0], e))
+            finally:
+                self.queue.task_done()
+
+    def write(self, tag, moments, counts, step):
+        """
+        Writes the (host) histogram to TensorBoard.
+        """
+        min_value, max_value, num, total, sum_squares = moments
+        # Same range as the one used by compute_histogram.
+        low, high = (min_value, max_value) if min_value < max_value else (min_value - 1, max_value + 1)
+        width = (high - low) / len(counts)
+        bucket_limits = [low + width * (i + 1) for i in range(len(counts))]
+        self.tb_writer.add_histogram_raw(tag, min_value, max_value, num, total, sum_squares,
+            bucket_limits, counts, step)
+
+    def flush(self):
+        """
+        Waits until all queued histograms are written.
+        """
+        self.queue.join()
+
+    def close(self):
+        """
+        Writes the remaining histograms and stops the background thread.
+        """
+        self.queue.put(None)
+        self.thread.join()
+        if self.dropped > 0:
+            self.logger.warning("Dropped {} histograms as the export could not keep up with the training".format(self.dropped))
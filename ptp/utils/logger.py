@@ -21,7 +21,7 @@ import logging.config as logging_config
 
 from ptp.utils.app_state import AppState
 
-def initialize_logger(name, add_file_handler = True):
+def initialize_logger(name, add_file_handler = True, app_state = None):
     """
     Initializes the logger, with a specific configuration.
     Requires that AppState has the following variable already set:
@@ -29,6 +29,9 @@ def initialize_logger(name, add_file_handler = True):
 
     :param name: Name of the entity that "owns" the logger.
 
+    :param app_state: Application state (of a given runtime context) providing the log level and log file \
+    (DEFAULT: None, means the ``AppState`` singleton)
+
     :return: Logger object.
 
     """
@@ -50,23 +53,26 @@ def initialize_logger(name, add_file_handler = True):
 
     logging_config.dictConfig(logger_config)
 
+    if app_state is None:
+        app_state = AppState()
+
     # Create the Logger, set its label and logging level.
     logger = logging.getLogger(name=name)
 
     # Add file handler - when the file is initialized...
     if add_file_handler:
-        add_file_handler_to_logger(logger)
+        add_file_handler_to_logger(logger, app_state)
 
     # Set logger level depending on the settings.
-    if AppState().args is not None and AppState().args.log_level is not None:
-        logger.setLevel(getattr(logging, AppState().args.log_level.upper(), None))
+    if app_state.args is not None and getattr(app_state.args, "log_level", None) is not None:
+        logger.setLevel(getattr(logging, app_state.args.log_level.upper(), None))
     else:
         logger.setLevel('INFO')
 
     return logger
 
 
-def add_file_handler_to_logger(logger):
+def add_file_handler_to_logger(logger, app_state = None):
     """
     Add a ``logging.FileHandler`` to the logger.
     Requires that AppState has the following variable already set:
@@ -75,13 +81,19 @@ def add_file_handler_to_logger(logger):
 
     :param logger: Logger object.
 
+    :param app_state: Application state (of a given runtime context) providing the log file \
+    (DEFAULT: None, means the ``AppState`` singleton)
+
     """
+    if app_state is None:
+        app_state = AppState()
+
     # This makes 
-    if AppState().log_file is None:
+    if app_state.log_file is None:
         return
 
     # Create file handler which logs even DEBUG messages.
-    fh = logging.FileHandler(AppState().log_file)
+    fh = logging.FileHandler(app_state.log_file)
 
     # Set logging level for this file.
     fh.setLevel(logging.DEBUG)
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import time
+import numbers
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import ptp.utils.logger as logging
+
+
+def escape_label(value):
+    """
+    Escapes the value of a label in the Prometheus text format.
+    """
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def is_number(value):
+    """
+    Checks whether the value can be exported as a sample (booleans and non-numeric values are skipped).
+    """
+    return isinstance(value, numbers.Number) and not isinstance(value, bool)
+
+
+class MetricsServer(object):
+    """
+    Serves the latest statistics of a running experiment on localhost, in the Prometheus text format \
+    (at ``/metrics``).
+
+    The exported metrics contain:
+
+        - the latest values of statistics collected by the registered collectors and aggregators,
+        - values of statistics from a ring buffer of recent episodes,
+        - throughput (episodes and samples per second) of the collectors,
+        - times spent in the components of the (registered) pipeline.
+
+    The training loop only replaces references to immutable snapshots (:py:class:`ptp.utils.StatisticsSnapshot`), \
+    which are read by the server thread, so no locks are taken. Episodes with deferred (tensor) statistics are \
+    published when the collector is synchronized (e.g. at logging interval).
+
+    """
+
+    def __init__(self, port, host='127.0.0.1', history=100):
+        """
+        Initializes the server and starts it in a background thread.
+
+        :param port: Port the server will listen on (0 means that a free port will be picked).
+        :type port: int
+
+        :param host: Address of the interface the server will listen on (DEFAULT: '127.0.0.1')
+        :type host: str
+
+        :param history: Number of recent episodes served (DEFAULT: 100)
+        :type history: int
+
+        """
+        self.logger = logging.initialize_logger('MetricsServer')
+        self.history = history
+        self.start_time = time.time()
+
+        # Sources of statistics: name -> snapshot / tuple of recent snapshots / (episodes, samples).
+        self.latest = {}
+        self.recent = {}
+        self.counters = {}
+        # Pipelines reporting times of their components.
+        self.pipelines = []
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ['/', '/metrics']:
+                    self.send_error(404)
+                    return
+                body = server.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Do not pollute the experiment log.
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='MetricsServer', daemon=True)
+        self.thread.start()
+        self.logger.info("Serving metrics at http://{}:{}/metrics".format(host, self.port))
+
+    def register_source(self, name):
+        """
+        Registers the source of statistics (must be called before publishing).
+
+        :param name: Name of the source (e.g. training, validation_set_agg).
+        :type name: str
+
+        """
+        self.latest[name] = None
+        self.recent[name] = ()
+        self.counters[name] = (0, 0.0)
+
+    def register_pipeline(self, pipeline):
+        """
+        Registers the pipeline, which times of components will be served (enables timing of the pipeline).
+
+        :param pipeline: :py:class:`ptp.application.PipelineManager`.
+
+        """
+        pipeline.enable_timing()
+        self.pipelines.append(pipeline)
+
+    def publish(self, name, snapshot, batch_size_key='batch_size'):
+        """
+        Publishes the snapshot of statistics (called by the training loop).
+
+        :param name: Name of the (registered) source.
+        :type name: str
+
+        :param snapshot: :py:class:`ptp.utils.StatisticsSnapshot`.
+
+        :param batch_size_key: Name of statistic used for computing the throughput in samples (DEFAULT: 'batch_size')
+        :type batch_size_key: str
+
+        """
+        self.latest[name] = snapshot
+        # Replace (do not modify) the tuple, so it can be safely read by the server thread.
+        self.recent[name] = self.recent[name][-(self.history - 1):] + (snapshot,) if self.history > 1 else (snapshot,)
+        episodes, samples = self.counters[name]
+        batch_size = snapshot.values.get(batch_size_key)
+        self.counters[name] = (episodes + 1, samples + (batch_size if is_number(batch_size) else 0))
+
+    def render(self):
+        """
+        Renders all the metrics in the Prometheus text format.
+
+        :return: String.
+
+        """
+        lines = []
+        elapsed = max(time.time() - self.start_time, 1e-9)
+
+        lines.append('# HELP ptp_statistic Latest value of statistic.')
+        lines.append('# TYPE ptp_statistic gauge')
+        for name, snapshot in list(self.latest.items()):
+            if snapshot is None:
+                continue
+            for key, value in snapshot.values.items():
+                if is_number(value):
+                    lines.append('ptp_statistic{{source="{}",statistic="{}"}} {}'.format(escape_label(name), escape_label(key), value))
+
+        lines.append('# HELP ptp_recent_statistic Value of statistic in one of recent episodes (offset 0 is the latest).')
+        lines.append('# TYPE ptp_recent_statistic gauge')
+        for name, recent in list(self.recent.items()):
+            for offset, snapshot in enumerate(reversed(recent)):
+                for key, value in snapshot.values.items():
+                    if is_number(value):
+                        lines.append('ptp_recent_statistic{{source="{}",statistic="{}",offset="{}"}} {}'.format(
+                            escape_label(name), escape_label(key), offset, value))
+
+        lines.append('# HELP ptp_episodes_total Number of published episodes.')
+        lines.append('# TYPE ptp_episodes_total counter')
+        for name, (episodes, _) in list(self.counters.items()):
+            lines.append('ptp_episodes_total{{source="{}"}} {}'.format(escape_label(name), episodes))
+        lines.append('# HELP ptp_episodes_per_second Average number of published episodes per second.')
+        lines.append('# TYPE ptp_episodes_per_second gauge')
+        for name, (episodes, _) in list(self.counters.items()):
+            lines.append('ptp_episodes_per_second{{source="{}"}} {}'.format(escape_label(name), episodes / elapsed))
+        lines.append('# HELP ptp_samples_per_second Average number of processed samples per second.')
+        lines.append('# TYPE ptp_samples_per_second gauge')
+        for name, (_, samples) in list(self.counters.items()):
+            lines.append('ptp_samples_per_second{{source="{}"}} {}'.format(escape_label(name), samples / elapsed))
+
+        lines.append('# HELP ptp_component_calls_total Number of calls of the component.')
+        lines.append('# TYPE ptp_component_calls_total counter')
+        timings = [(pipeline.name, component, calls, seconds) for pipeline in self.pipelines
+            for component, (calls, seconds) in list(pipeline.timings.items())]
+        for pipeline, component, calls, _ in timings:
+            lines.append('ptp_component_calls_total{{pipeline="{}",component="{}"}} {}'.format(escape_label(pipeline), escape_label(component), calls))
+        lines.append('# HELP ptp_component_seconds_total Time spent in the component (as seen by the host).')
+        lines.append('# TYPE ptp_component_seconds_total counter')
+        for pipeline, component, _, seconds in timings:
+            lines.append('ptp_component_seconds_total{{pipeline="{}",component="{}"}} {}'.format(escape_label(pipeline), escape_label(component), seconds))
+
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        """
+        Stops the server.
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
@@ -25,3 +25,9 @@ class SingletonMetaClass(type):
             cls._instances[cls] = super(
                 SingletonMetaClass, cls).__call__(*args, **kwargs)
         return cls._instances[cls]
+
+    def create_instance(cls, *args, **kwargs):
+        """
+        Creates a new, independent instance of the class (i.e. one that is not the singleton instance).
+        """
+        return super(SingletonMetaClass, cls).__call__(*args, **kwargs)
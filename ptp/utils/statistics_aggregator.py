@@ -19,6 +19,7 @@ __author__ = "Vincent Marois, Tomasz Kornuta"
 
 import numpy as np
 from ptp.utils.statistics_collector import StatisticsCollector
+from ptp.utils.statistics_exporter import StatisticsSnapshot
 
 
 class StatisticsAggregator(StatisticsCollector):
@@ -157,13 +158,31 @@ class StatisticsAggregator(StatisticsCollector):
 
         return self.csv_file
 
-    def export_to_csv(self, csv_file=None):
+    def snapshot(self):
         """
-        This method writes the current statistical aggregators values to the `csv_file` using the associated formatting.
+        Creates immutable snapshot of the current values of statistical aggregators, which can be exported in other thread.
+
+        :return: :py:class:`ptp.utils.StatisticsSnapshot`.
+
+        """
+        return StatisticsSnapshot(self.aggregators.keys(), self.formatting, self.aggregators)
+
+    def export_to_csv(self, csv_file=None, snapshot=None):
+        """
+        This method writes the current statistical aggregators values to the `csv_file` using the associated formatting \
+        (in background, if the exporter was initialized) and publishes them in the metrics server (if initialized).
 
         :param csv_file: File stream opened for writing, optional.
 
+        :param snapshot: Snapshot of current aggregators, optional (DEFAULT: None, means that it will be created)
+        :type snapshot: :py:class:`ptp.utils.StatisticsSnapshot`
+
         """
+        # Single snapshot, shared by the metrics server and the csv file.
+        if snapshot is None:
+            snapshot = self.snapshot()
+        self.publish_metrics(snapshot)
+
         # Try to use the remembered one.    
         if csv_file is None:
             csv_file = self.csv_file
@@ -171,39 +190,19 @@ class StatisticsAggregator(StatisticsCollector):
         if csv_file is None:
             return
 
-        values_str = ''
-
-        # Iterate through values and concatenate them.
-        for key, value in self.aggregators.items():
-
-            # Get formatting - using '{}' as default.
-            format_str = self.formatting.get(key, '{}')
-
-            # Add value to string using formatting.
-            values_str += format_str.format(value) + ","
-
-        # Remove last coma and add \n.
-        values_str = values_str[:-1] + '\n'
-
-        csv_file.write(values_str)
+        if self.exporter is not None:
+            self.exporter.submit(snapshot.write_csv, csv_file)
+        else:
+            snapshot.write_csv(csv_file)
 
     def export_to_checkpoint(self):
         """
         This method exports the aggregated data into a dictionary using the associated formatting.
 
         """
-        chkpt = {}
-
-        # Iterate through key, values and format them.
-        for key, value in self.aggregators.items():
-
-            # Get formatting - using '{}' as default.
-            format_str = self.formatting.get(key, '{}')
-
-            # Add to dict.
-            chkpt[key] = format_str.format(value)
-
-        return chkpt        
+        snapshot = self.snapshot()
+        # Skip aggregators that were not computed (e.g. by components not collecting statistics in the current phase).
+        return {key: snapshot.formatting[key].format(value) for key, value in snapshot.values.items() if value is not None}
 
     def export_to_string(self, additional_tag=''):
         """
@@ -217,46 +216,28 @@ class StatisticsAggregator(StatisticsCollector):
         :return: String being the concatenation of the statistical aggregators names & values.
 
         """
-        stat_str = ''
-
-        # Iterate through keys and values and concatenate them.
-        for key, value in self.aggregators.items():
-
-            stat_str += key + ' '
-            # Get formatting - using '{}' as default.
-            format_str = self.formatting.get(key, '{}')
-            # Add value to string using formatting.
-            stat_str += format_str.format(value) + "; "
-
-        # Remove last two elements and add additional tag
-        stat_str = stat_str[:-2] + " " + additional_tag
-
-        return stat_str
+        return self.snapshot().to_string(additional_tag)
 
     def export_to_tensorboard(self, tb_writer = None):
         """
-        Method exports current statistical aggregators values to TensorBoard.
+        Method exports current statistical aggregators values to TensorBoard \
+        (in background, if the exporter was initialized).
 
         :param tb_writer: TensorBoard writer, optional
         :type tb_writer: :py:class:`tensorboardX.SummaryWriter`
 
         """
-        # Get episode number.
-        episode = self.aggregators['episode']
-
         if tb_writer is None:
             tb_writer = self.tb_writer
         # If it is still None - well, we cannot do anything more.
         if tb_writer is None:
             return
 
-        # Iterate through keys and values and concatenate them.
-        for key, value in self.aggregators.items():
-            # Skip episode.
-            if key == 'episode':
-                continue
-            tb_writer.add_scalar(key, value, episode)
-
+        snapshot = self.snapshot()
+        if self.exporter is not None:
+            self.exporter.submit(snapshot.write_tensorboard, tb_writer)
+        else:
+            snapshot.write_tensorboard(tb_writer)
 
 if __name__ == "__main__":
 
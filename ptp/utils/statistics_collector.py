@@ -17,8 +17,14 @@
 
 __author__ = "Tomasz Kornuta & Vincent Marois"
 
+import torch
+import numpy as np
 from collections.abc import Mapping
 
+from ptp.utils.statistics_exporter import StatisticsSnapshot
+from ptp.utils.statistics_sinks import CSVStatisticsSink, BinaryStatisticsSink
+from ptp.utils.streaming_statistics import StreamingStatistics
+
 
 class StatisticsCollector(Mapping):
     """
@@ -27,36 +33,129 @@ class StatisticsCollector(Mapping):
 
     Inherits :py:class:`collections.Mapping`, therefore it offers functionality close to a ``dict``.
 
+    Values of every statistic are stored in a preallocated, typed numpy array (column) that is grown geometrically \
+    when full, hence appending a value costs (amortized) O(1) and does not box it into a Python object. \
+    Getting a statistic returns a view of the array containing the collected values, so aggregation can be vectorized.
+
+    Additionally, every numeric statistic is summarized by a mergeable :py:class:`ptp.utils.StreamingStatistics` \
+    (updated once per episode, weighted by the size of the batch if ``batch_size`` is collected), \
+    so aggregators do not need the history of values, which can be turned off (``keep_history=False``), \
+    and the collectors from several shards/processes can be combined with :py:func:`merge`.
+
+    Values can also be passed as (single element) tensors, e.g. residing on GPU. In such a case they are not \
+    synchronized with the host at every episode, but buffered along with the following operations (including \
+    the exports to sink) and materialized with a single transfer (per device) when the statistics are accessed \
+    (e.g. at logging interval or at the end of the epoch), see :py:func:`synchronize`.
+
+    Components can collect their statistics only in some episodes (see ``statistics_collection`` policy of \
+    :py:class:`ptp.components.Component`). Values missing in a given episode are left empty in csv, \
+    masked in the binary sink and skipped in TensorBoard, while the streaming statistics summarize \
+    (and weight) only the sampled episodes.
+
     """
 
-    def __init__(self):
+    # Initial capacity of each column.
+    initial_capacity = 1024
+
+    # Factor used when growing the column.
+    growth_factor = 2
+
+    # Statistic used as weight of the values of other (weighted) statistics.
+    weight_key = 'batch_size'
+
+    # Maximum number of deferred operations, forcing the synchronization.
+    max_deferred = 10000
+
+    def __init__(self, keep_history=True, phase=None):
         """
         Initialization - creates dictionaries for statistics and formatting.
+
+        :param keep_history: If False, only the last value of every statistic is stored (DEFAULT: True)
+        :type keep_history: bool
+
+        :param phase: Phase the statistics are collected in, e.g. training, validation or testing (DEFAULT: None)
+        :type phase: str
         """
         super(StatisticsCollector, self).__init__()
 
         # Set default "output streams" for none.
         self.tb_writer = None
-        self.csv_file = None
+        self.sink = None
+        self.exporter = None
+        self.metrics_server = None
+        self.metrics_source = None
 
+        # Columns (arrays) with values of statistics.
         self.statistics = dict()
+        # Number of values collected in every column.
+        self.lengths = dict()
         self.formatting = dict()
 
-    def add_statistics(self, key, formatting):
+        self.keep_history = keep_history
+        self.phase = phase
+        # Index of the current episode (counted by the collector, used by the collection policies).
+        self.episode_index = -1
+        # Keys of statistics collected in the current episode.
+        self.collected = set()
+        # Streaming statistics, along with flags indicating whether values should be weighted.
+        self.streams = dict()
+        self.weighted = dict()
+        # Values collected in the current episode, not passed to the streaming statistics yet.
+        self.pending = dict()
+        # Deferred operations (key, value), waiting for the synchronization of tensor values with the host.
+        self.deferred = []
+        # Accumulators (sums of arrays/tensors over all episodes, e.g. confusion matrices).
+        self.accumulators = dict()
+
+    @staticmethod
+    def infer_dtype(formatting):
+        """
+        Infers the type of the statistic values from its formatting.
+
+        :param formatting: Formatting string, e.g. '{:06d}' or '{:6.4f}'.
+        :type formatting: str
+
+        :return: ``np.int64`` for integer formattings, ``np.float64`` for floating point ones, ``object`` otherwise.
+        """
+        spec = formatting.strip()
+        if not spec.endswith('}') or ':' not in spec:
+            return object
+        type_char = spec[-2]
+        if type_char in 'dbox':
+            return np.int64
+        if type_char in 'eEfFgG%':
+            return np.float64
+        return object
+
+    def add_statistics(self, key, formatting, dtype=None, weighted=True):
         """
         Add a statistics to collector.
-        The value of associated to the key is of type ``list``.
+        The value of associated to the key is a (growing) numpy array.
 
         :param key: Key of the statistics.
         :type key: str
 
         :param formatting: Formatting that will be used when logging and exporting to CSV.
 
+        :param dtype: Type of the statistic values (DEFAULT: None, means that it will be inferred from formatting)
+
+        :param weighted: If True, values will be weighted by the batch size in the streaming statistics (DEFAULT: True)
+        :type weighted: bool
+
         """
         self.formatting[key] = formatting
 
-        # instantiate associated value as list.
-        self.statistics[key] = list()
+        if dtype is None:
+            dtype = self.infer_dtype(formatting)
+
+        # Preallocate the associated column.
+        self.statistics[key] = np.empty(self.initial_capacity if self.keep_history else 1, dtype=dtype)
+        self.lengths[key] = 0
+
+        # Numeric statistics are additionally summarized by streaming statistics.
+        if np.issubdtype(np.dtype(dtype), np.number):
+            self.streams[key] = StreamingStatistics()
+            self.weighted[key] = weighted
 
     def __getitem__(self, key):
         """
@@ -65,20 +164,86 @@ class StatisticsCollector(Mapping):
         :param key: Key to value in parameters.
         :type key: str
 
-        :return: Statistics value list associated with given key.
+        :return: Array view containing the values collected for given key.
 
         """
-        return self.statistics[key]
+        self.synchronize()
+        return self.statistics[key][:self.lengths[key]]
 
     def __setitem__(self, key, value):
         """
-        Add value to the list of the statistic associated with a given key.
+        Add value to the column of the statistic associated with a given key.
 
         :param key: Key to value in parameters.
-        :param value: Statistics value to append to the list associated with given key.
+        :param value: Statistics value to append to the column associated with given key \
+        (tensor values will be materialized during the next synchronization).
 
         """
-        self.statistics[key].append(value)
+        if key not in self.statistics:
+            raise KeyError(key)
+        # Preserve the order of operations - defer all of them until the next synchronization.
+        if isinstance(value, torch.Tensor) or len(self.deferred) > 0:
+            self.deferred.append((key, value))
+            if len(self.deferred) >= self.max_deferred:
+                self.synchronize()
+            return
+        self.__append(key, value)
+
+    def synchronize(self):
+        """
+        Materializes the deferred tensor values (with a single transfer per device) and replays the deferred \
+        operations, i.e. appends the values to columns and streaming statistics and exports them to sink.
+
+        """
+        if len(self.deferred) == 0:
+            return
+        operations = self.deferred
+        self.deferred = []
+
+        # Group the tensor values by device.
+        values = [value for _, value in operations]
+        devices = dict()
+        for i, value in enumerate(values):
+            if isinstance(value, torch.Tensor):
+                devices.setdefault(value.device, []).append(i)
+        # Transfer them all at once.
+        for indices in devices.values():
+            host_values = torch.stack([values[i].detach().reshape(()).double() for i in indices]).cpu().tolist()
+            for i, host_value in zip(indices, host_values):
+                values[i] = host_value
+
+        # Replay the operations.
+        for (key, _), value in zip(operations, values):
+            if key is None:
+                self.export_to_sink()
+            else:
+                self.__append(key, value)
+
+    def __append(self, key, value):
+        """
+        Appends (host) value to the column and streaming statistic associated with a given key.
+        """
+        # Value of that statistic was already collected - so this is a new episode.
+        if key in self.collected:
+            self.commit_episode()
+            self.collected.clear()
+        self.collected.add(key)
+        self.pending[key] = value
+
+        column = self.statistics[key]
+        if not self.keep_history:
+            column[0] = value
+            self.lengths[key] = 1
+            return
+
+        length = self.lengths[key]
+        # Grow the column when it is full.
+        if length == len(column):
+            grown = np.empty(max(self.initial_capacity, len(column) * self.growth_factor), dtype=column.dtype)
+            grown[:length] = column
+            self.statistics[key] = column = grown
+        column[length] = value
+        self.lengths[key] = length + 1
 
     def __delitem__(self, key):
         """
@@ -88,6 +253,11 @@ class StatisticsCollector(Mapping):
 
         """
         del self.statistics[key]
+        del self.lengths[key]
+        self.streams.pop(key, None)
+        self.weighted.pop(key, None)
+        self.pending.pop(key, None)
+        self.collected.discard(key)
 
     def __len__(self):
         """
@@ -106,18 +276,160 @@ class StatisticsCollector(Mapping):
         Check whether two collectors are equal (just for the purpose of compatibility with the base Mapping class).
         """
         if isinstance(other, self.__class__):
-            # Check statistics and formatting.
-            return self.statistics == other.statistics and self.formatting == other.formatting
+            # Check formatting and statistics.
+            if self.formatting != other.formatting or self.statistics.keys() != other.statistics.keys():
+                return False
+            return all(np.array_equal(self[key], other[key]) for key in self.statistics.keys())
         else:
             return False
 
     def empty(self):
         """
-        Empty the list associated to the keys of the current statistics collector.
+        Empty the columns associated to the keys of the current statistics collector (memory is kept for reuse).
 
         """
-        for key in self.statistics.keys():
-            del self.statistics[key][:]
+        # Export the deferred values first.
+        self.synchronize()
+        for key in self.lengths.keys():
+            self.lengths[key] = 0
+        self.pending.clear()
+        self.collected.clear()
+        self.episode_index = -1
+        for key in self.streams.keys():
+            self.streams[key] = StreamingStatistics()
+        for key in self.accumulators.keys():
+            self.accumulators[key] = None
+
+    def next_episode(self):
+        """
+        Starts the next episode, i.e. increments the episode index used by the statistics collection policies.
+
+        :return: Index of the episode (starting from 0).
+
+        """
+        self.episode_index += 1
+        return self.episode_index
+
+    def is_collected(self, key):
+        """
+        Checks whether the statistic was collected in the current episode.
+
+        :param key: Key of the statistics.
+        :type key: str
+
+        :return: True if the value of the statistic was collected in the current episode.
+
+        """
+        self.synchronize()
+        return key in self.collected
+
+    def commit_episode(self):
+        """
+        Passes the values collected in the current episode to the streaming statistics.
+
+        .. note::
+            Called automatically when the first value of the next episode is collected \
+            and when the streaming statistics are accessed.
+
+        """
+        if len(self.pending) == 0:
+            return
+        weight = float(self.pending.get(self.weight_key, 1))
+        for key, value in self.pending.items():
+            stream = self.streams.get(key)
+            if stream is not None:
+                stream.update(float(value), weight if self.weighted[key] else 1.0)
+        self.pending.clear()
+
+    def get_stream(self, key):
+        """
+        Returns the streaming statistics summarizing all values of a given statistic collected so far.
+
+        :param key: Key of the statistics.
+        :type key: str
+
+        :return: :py:class:`ptp.utils.StreamingStatistics`.
+
+        """
+        self.synchronize()
+        self.commit_episode()
+        return self.streams[key]
+
+    def add_accumulator(self, key):
+        """
+        Adds an accumulator, i.e. a sum of values (arrays or tensors of fixed shape) collected in all episodes.
+
+        :param key: Key of the accumulator.
+        :type key: str
+
+        """
+        self.accumulators[key] = None
+
+    def accumulate(self, key, value):
+        """
+        Adds value to the accumulator. Tensors are summed in their own context (device), without synchronization with the host.
+
+        :param key: Key of the accumulator.
+        :type key: str
+
+        :param value: Value (array or tensor).
+
+        """
+        if isinstance(value, torch.Tensor):
+            value = value.detach()
+        if self.accumulators[key] is None:
+            self.accumulators[key] = value.clone() if isinstance(value, torch.Tensor) else np.array(value)
+        else:
+            self.accumulators[key] += value
+
+    def get_accumulator(self, key):
+        """
+        Returns the sum of values collected so far.
+
+        :param key: Key of the accumulator.
+        :type key: str
+
+        :return: Numpy array (None if no value was accumulated).
+
+        """
+        value = self.accumulators[key]
+        if isinstance(value, torch.Tensor):
+            value = value.cpu().numpy()
+        return value
+
+    def merge(self, other):
+        """
+        Merges the streaming statistics of other collector (e.g. collected on other shard of data or in other process) \
+        (along with the accumulators) into the ones of this collector. The history of values is not merged.
+
+        :param other: :py:class:`StatisticsCollector` with the same statistics.
+
+        """
+        self.synchronize()
+        other.synchronize()
+        self.commit_episode()
+        other.commit_episode()
+        for key, stream in self.streams.items():
+            stream.merge(other.streams[key])
+        for key in self.accumulators.keys():
+            value = other.get_accumulator(key)
+            if value is None:
+                continue
+            if isinstance(self.accumulators[key], torch.Tensor):
+                value = torch.as_tensor(value, device=self.accumulators[key].device)
+            self.accumulate(key, value)
+
+    def initialize_sink(self, sink):
+        """
+        Memorizes the sink that will be used for storing the statistics at every episode.
+
+        :param sink: Sink (e.g. :py:class:`ptp.utils.statistics_sinks.BinaryStatisticsSink`).
+
+        :return: Sink.
+
+        """
+        self.sink = sink
+        return self.sink
 
     def initialize_csv_file(self, log_dir, filename):
         """
@@ -130,69 +442,132 @@ class StatisticsCollector(Mapping):
         :param filename: Filename to be created.
         :type filename: str
 
-        :return: File stream opened for writing.
+        :return: Sink (with the csv file opened for writing).
 
         """
-        header_str = ''
+        return self.initialize_sink(CSVStatisticsSink(log_dir + filename, self))
 
-        # Iterate through keys and concatenate them.
-        for key in self.statistics.keys():
-            header_str += key + ","
+    def initialize_binary_file(self, log_dir, filename, flush_interval=100):
+        """
+        Method creates new binary file (with a schema produced on the base of statistics names and types), \
+        to which the statistics will be written in chunks.
 
-        # Remove last coma and add \n.
-        header_str = header_str[:-1] + '\n'
+        :param log_dir: Path to file.
+        :type log_dir: str
 
-        # Open file for writing.
-        self.csv_file = open(log_dir + filename, 'w', 1)
-        self.csv_file.write(header_str)
+        :param filename: Filename to be created.
+        :type filename: str
+
+        :param flush_interval: Number of episodes buffered before writing them to file (DEFAULT: 100)
+        :type flush_interval: int
 
-        return self.csv_file
+        :return: Sink (with the binary file opened for writing).
 
-    def export_to_csv(self, csv_file=None):
         """
-        Method writes current statistics to csv using the possessed formatting.
+        return self.initialize_sink(BinaryStatisticsSink(log_dir + filename, self, flush_interval))
 
-        :param csv_file: File stream opened for writing, optional
+    def export_to_sink(self):
+        """
+        Method passes current statistics to the sink and publishes them in the metrics server (if initialized).
 
         """
-        # Try to use the remembered one.    
-        if csv_file is None:
-            csv_file = self.csv_file
-        # If it is still None - well, we cannot do anything more.
-        if csv_file is None:
+        if self.sink is None and self.metrics_server is None:
             return
+        # Export will be done during the synchronization.
+        if len(self.deferred) > 0:
+            self.deferred.append((None, None))
+            return
+        # Single snapshot of the episode, shared by the (csv) sink and the metrics server.
+        snapshot = self.snapshot() if self.metrics_server is not None else None
+        if self.sink is not None:
+            self.sink.write(self, snapshot)
+        self.publish_metrics(snapshot)
 
-        # Iterate through values and concatenate them.
-        values_str = ''
-        for key, value in self.statistics.items():
-            # Get formatting - using '{}' as default.
-            format_str = self.formatting.get(key, '{}')
+    def initialize_metrics(self, metrics_server, source):
+        """
+        Memorizes the metrics server the statistics will be published in and registers the collector as its source.
 
-            # Add value to string using formatting.
-            values_str += format_str.format(value[-1]) + ","
+        :param metrics_server: :py:class:`ptp.utils.MetricsServer`.
 
-        # Remove last coma and add \n.
-        values_str = values_str[:-1] + '\n'
+        :param source: Name of the source (e.g. training).
+        :type source: str
 
-        csv_file.write(values_str)
+        """
+        self.metrics_server = metrics_server
+        self.metrics_source = source
+        metrics_server.register_source(source)
 
-    def export_to_checkpoint(self):
+    def publish_metrics(self, snapshot=None):
         """
-        This method exports the collected data into a dictionary using the associated formatting.
+        Publishes the snapshot of current statistics in the metrics server (if initialized).
+
+        :param snapshot: Snapshot of current statistics, optional (DEFAULT: None, means that it will be created)
+        :type snapshot: :py:class:`ptp.utils.StatisticsSnapshot`
 
         """
-        chkpt = {}
+        if self.metrics_server is not None:
+            if snapshot is None:
+                snapshot = self.snapshot()
+            self.metrics_server.publish(self.metrics_source, snapshot)
 
-        # Iterate through key, values and format them.
-        for key, value in self.statistics.items():
+    def initialize_exporter(self, exporter):
+        """
+        Memorizes the exporter that will be used for formatting and writing the statistics in background.
+
+        :param exporter: :py:class:`ptp.utils.StatisticsExporter`.
+
+        """
+        self.exporter = exporter
+
+    def snapshot(self):
+        """
+        Creates immutable snapshot of the current (last) values of statistics, which can be exported in other thread.
+
+        :return: :py:class:`ptp.utils.StatisticsSnapshot` (values of statistics that were not collected \
+        in the current episode are None).
+
+        """
+        self.synchronize()
+        values = {}
+        for key in self.statistics.keys():
+            if key not in self.collected:
+                continue
+            value = self.statistics[key][self.lengths[key] - 1]
+            values[key] = value.item() if isinstance(value, np.generic) else value
+        return StatisticsSnapshot(self.statistics.keys(), self.formatting, values)
+
+    def export_to_csv(self, csv_file=None, snapshot=None):
+        """
+        Method writes current statistics to csv using the possessed formatting \
+        (in background, if the exporter was initialized).
+
+        :param csv_file: File stream opened for writing, optional (DEFAULT: None, means that the statistics \
+        will be passed to the memorized sink)
+
+        :param snapshot: Snapshot of current statistics, optional (DEFAULT: None, means that it will be created)
+        :type snapshot: :py:class:`ptp.utils.StatisticsSnapshot`
+
+        """
+        # Use the remembered sink.
+        if csv_file is None:
+            self.export_to_sink()
+            return
 
-            # Get formatting - using '{}' as default.
-            format_str = self.formatting.get(key, '{}')
+        if snapshot is None:
+            snapshot = self.snapshot()
+        if self.exporter is not None:
+            self.exporter.submit(snapshot.write_csv, csv_file)
+        else:
+            snapshot.write_csv(csv_file)
 
-            # Add to dict.
-            chkpt[key]  = format_str.format(value[-1])
+    def export_to_checkpoint(self):
+        """
+        This method exports the collected data into a dictionary using the associated formatting.
 
-        return chkpt
+        """
+        snapshot = self.snapshot()
+        # Skip statistics that were not collected in the current episode.
+        return {key: snapshot.formatting[key].format(value) for key, value in snapshot.values.items() if value is not None}
 
     def export_to_string(self, additional_tag=''):
         """
@@ -206,19 +581,23 @@ class StatisticsCollector(Mapping):
         :return: String being the concatenation of the statistics names & values.
 
         """
-        # Iterate through keys and values and concatenate them.
-        stat_str = ''
-        for key, value in self.statistics.items():
-            stat_str += key + ' '
-            # Get formatting - using '{}' as default.
-            format_str = self.formatting.get(key, '{}')
-            # Add value to string using formatting.
-            stat_str += format_str.format(value[-1]) + "; "
+        return self.snapshot().to_string(additional_tag)
 
-        # Remove last two element.
-        stat_str = stat_str[:-2] + " " + additional_tag
+    def export_to_logger(self, logger, additional_tag=''):
+        """
+        Method logs current statistics (in background, if the exporter was initialized).
 
-        return stat_str
+        :param logger: Logger.
+
+        :param additional_tag: An additional tag to append at the end of the logged string.
+        :type additional_tag: str
+
+        """
+        snapshot = self.snapshot()
+        if self.exporter is not None:
+            self.exporter.submit(lambda: logger.info(snapshot.to_string(additional_tag)))
+        else:
+            logger.info(snapshot.to_string(additional_tag))
 
     def initialize_tensorboard(self, tb_writer):
         """ 
@@ -228,28 +607,23 @@ class StatisticsCollector(Mapping):
 
     def export_to_tensorboard(self, tb_writer=None):
         """
-        Method exports current statistics to tensorboard.
+        Method exports current statistics to tensorboard (in background, if the exporter was initialized).
 
         :param tb_writer: TensorBoard writer, optional.
         :type tb_writer: :py:class:`tensorboardX.SummaryWriter`
 
         """
-        # Get episode number.
-        episode = self.statistics['episode'][-1]
-
         if tb_writer is None:
             tb_writer = self.tb_writer
         # If it is still None - well, we cannot do anything more.
         if tb_writer is None:
             return
 
-        # Iterate through keys and values and concatenate them.
-        for key, value in self.statistics.items():
-            # Skip episode.
-            if key == 'episode':
-                continue
-            tb_writer.add_scalar(key, value[-1], episode)
-
+        snapshot = self.snapshot()
+        if self.exporter is not None:
+            self.exporter.submit(snapshot.write_tensorboard, tb_writer)
+        else:
+            snapshot.write_tensorboard(tb_writer)
 
 if __name__ == "__main__":
 
@@ -262,8 +636,8 @@ if __name__ == "__main__":
     stat_col['loss'] = 0.7
     stat_col['acc'] = 100
 
-    csv_file = stat_col.initialize_csv_file('./', 'collector_test.csv')
-    stat_col.export_to_csv(csv_file)
+    sink = stat_col.initialize_csv_file('./', 'collector_test.csv')
+    stat_col.export_to_csv()
     print(stat_col.export_to_string())
 
     stat_col['episode'] = 1
@@ -273,7 +647,7 @@ if __name__ == "__main__":
     stat_col.add_statistic('seq_length', '{:2.0f}')
     stat_col['seq_length'] = 5
 
-    stat_col.export_to_csv(csv_file)
+    stat_col.export_to_csv()
     print(stat_col.export_to_string('[Validation]'))
 
     stat_col.empty()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import queue
+import threading
+
+import ptp.utils.logger as logging
+
+
+class StatisticsSnapshot(object):
+    """
+    Immutable snapshot of the (last) values of statistics or of statistical aggregators, \
+    along with their formatting. Offers all the formatting used by the exports, so it can be done in any thread.
+
+    """
+
+    __slots__ = ('keys', 'formatting', 'values')
+
+    def __init__(self, keys, formatting, values):
+        """
+        Creates the snapshot.
+
+        :param keys: Names of statistics.
+
+        :param formatting: Dictionary with formatting of statistics.
+
+        :param values: Dictionary with values of statistics (None means that the value was not collected).
+
+        """
+        object.__setattr__(self, 'keys', tuple(keys))
+        object.__setattr__(self, 'formatting', {key: formatting.get(key, '{}') for key in self.keys})
+        object.__setattr__(self, 'values', {key: values.get(key) for key in self.keys})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("StatisticsSnapshot is immutable")
+
+    def to_csv_row(self):
+        """
+        Returns the values formatted as a row of csv file (missing values are left empty).
+        """
+        return ','.join('' if self.values[key] is None else self.formatting[key].format(self.values[key]) for key in self.keys) + '\n'
+
+    def to_string(self, additional_tag=''):
+        """
+        Returns the names and formatted values of statistics (missing values are skipped).
+
+        :param additional_tag: An additional tag to append at the end of the created string.
+        :type additional_tag: str
+
+        """
+        stat_str = '; '.join(key + ' ' + self.formatting[key].format(self.values[key]) for key in self.keys if self.values[key] is not None)
+        return stat_str + " " + additional_tag
+
+    def write_csv(self, csv_file):
+        """
+        Writes the values as a row of a csv file.
+
+        :param csv_file: File stream opened for writing.
+
+        """
+        csv_file.write(self.to_csv_row())
+
+    def write_tensorboard(self, tb_writer, episode_key='episode'):
+        """
+        Exports the (collected) values to TensorBoard.
+
+        :param tb_writer: TensorBoard writer.
+        :type tb_writer: :py:class:`tensorboardX.SummaryWriter`
+
+        :param episode_key: Name of statistic used as the global step (DEFAULT: 'episode')
+        :type episode_key: str
+
+        """
+        episode = self.values[episode_key]
+        for key in self.keys:
+            # Skip episode and missing values.
+            if key == episode_key or self.values[key] is None:
+                continue
+            tb_writer.add_scalar(key, self.values[key], episode)
+
+
+class StatisticsExporter(object):
+    """
+    Exports statistics (snapshots) to logger, csv files and TensorBoard in a background thread, \
+    so the formatting and I/O are done outside of the training loop.
+
+    Tasks are executed in order of submission. The queue is bounded: when the exports cannot keep up, \
+    the submitting thread is blocked until there is space in the queue (backpressure).
+
+    """
+
+    def __init__(self, max_queue_size=1000):
+        """
+        Initializes the exporter and starts the background thread.
+
+        :param max_queue_size: Maximum number of tasks waiting in the queue (DEFAULT: 1000)
+        :type max_queue_size: int
+
+        """
+        self.logger = logging.initialize_logger('StatisticsExporter')
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.thread = threading.Thread(target=self.run, name='StatisticsExporter', daemon=True)
+        self.thread.start()
+
+    def submit(self, function, *args):
+        """
+        Submits the task to the background thread (blocks when the queue is full).
+
+        :param function: Function to be called.
+
+        :param args: Its arguments.
+
+        """
+        if self.thread is None:
+            # Exporter is closed - execute the task synchronously.
+            function(*args)
+            return
+        self.queue.put((function, args))
+
+    def run(self):
+        """
+        Main loop of the background thread.
+        """
+        while True:
+            task = self.queue.get()
+            try:
+                # Stop.
+                if task is None:
+                    return
+                function, args = task
+                function(*args)
+            except Exception as e:
+                self.logger.error("Export failed: {}".format(e))
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """
+        Waits until all submitted tasks are executed.
+        """
+        if self.thread is not None:
+            self.queue.join()
+
+    def close(self):
+        """
+        Executes the remaining tasks and stops the background thread.
+        """
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import os
+import json
+import struct
+import argparse
+import numpy as np
+from abc import abstractmethod
+
+
+class StatisticsSink(object):
+    """
+    Base class of sinks, i.e. objects storing the (last) values of statistics collected by the \
+    :py:class:`ptp.utils.StatisticsCollector` at every episode.
+
+    """
+
+    def __init__(self, file_name, stat_col):
+        """
+        Initializes the sink.
+
+        :param file_name: Name of the file (with path).
+        :type file_name: str
+
+        :param stat_col: :py:class:`ptp.utils.StatisticsCollector` defining the (fixed) list of statistics to store.
+
+        """
+        self.file_name = file_name
+        self.keys = list(stat_col.statistics.keys())
+
+    @abstractmethod
+    def write(self, stat_col, snapshot=None):
+        """
+        Writes the last values of the statistics.
+
+        :param stat_col: :py:class:`ptp.utils.StatisticsCollector`.
+
+        :param snapshot: Snapshot of the last values of the statistics, optional (DEFAULT: None)
+        :type snapshot: :py:class:`ptp.utils.StatisticsSnapshot`
+
+        """
+
+    def flush(self):
+        """
+        Flushes the buffered values (if any) to file.
+        """
+
+    @abstractmethod
+    def close(self):
+        """
+        Flushes the buffered values and closes the file.
+        """
+
+
+class CSVStatisticsSink(StatisticsSink):
+    """
+    Sink storing the statistics in a (line-buffered) csv file, one row (formatted string) per episode.
+
+    """
+
+    def __init__(self, file_name, stat_col):
+        """
+        Creates the file and writes the header with names of statistics.
+
+        :param file_name: Name of the file (with path).
+        :type file_name: str
+
+        :param stat_col: :py:class:`ptp.utils.StatisticsCollector` defining the (fixed) list of statistics to store.
+
+        """
+        super(CSVStatisticsSink, self).__init__(file_name, stat_col)
+
+        # Open file for writing.
+        self.file = open(file_name, 'w', 1)
+        self.file.write(','.join(self.keys) + '\n')
+
+    def write(self, stat_col, snapshot=None):
+        """
+        Writes the last values of the statistics using the associated formatting.
+
+        :param stat_col: :py:class:`ptp.utils.StatisticsCollector`.
+
+        :param snapshot: Snapshot of the last values of the statistics, optional (DEFAULT: None, means that it will be created)
+        :type snapshot: :py:class:`ptp.utils.StatisticsSnapshot`
+
+        """
+        stat_col.export_to_csv(self.file, snapshot)
+
+    def close(self):
+        """
+        Closes the file.
+        """
+        self.file.close()
+
+
+class BinaryStatisticsSink(StatisticsSink):
+    """
+    Sink storing the statistics in a buffered, columnar binary file.
+
+    The file starts with a schema header (magic, version, names and formatting of the statistics), followed by \
+    append-only chunks. Every chunk contains the number of rows and, for every statistic, its dtype, the raw \
+    content of the column and flags indicating whether the values were collected in given episodes. Values are buffered in typed arrays and written as a single chunk every ``flush_interval`` \
+    episodes (and when closing the sink), so no formatting happens during the experiment.
+
+    Use :py:func:`read_binary_statistics` to load the file or :py:func:`convert_binary_statistics_to_csv` to \
+    convert it into csv.
+
+    """
+
+    # Magic string at the beginning of the file.
+    magic = b'PTPSTATS'
+
+    # Version of the format.
+    version = 2
+
+    # Versions of the format that can be read.
+    supported_versions = (1, 2)
+
+    # Magic string at the beginning of every chunk.
+    chunk_magic = b'CHNK'
+
+    def __init__(self, file_name, stat_col, flush_interval=100):
+        """
+        Creates the file and writes the schema header.
+
+        :param file_name: Name of the file (with path).
+        :type file_name: str
+
+        :param stat_col: :py:class:`ptp.utils.StatisticsCollector` defining the (fixed) list of statistics to store.
+
+        :param flush_interval: Number of rows buffered before writing a chunk to file (DEFAULT: 100)
+        :type flush_interval: int
+
+        """
+        super(BinaryStatisticsSink, self).__init__(file_name, stat_col)
+        self.flush_interval = max(1, flush_interval)
+
+        # Buffers - one per statistic, typed just like the collector's columns.
+        self.buffers = {key: np.empty(self.flush_interval, dtype=stat_col.statistics[key].dtype) for key in self.keys}
+        # Flags indicating whether the values were collected.
+        self.present = {key: np.zeros(self.flush_interval, dtype=np.uint8) for key in self.keys}
+        self.rows = 0
+
+        # Write the schema header.
+        header = json.dumps({
+            'keys': self.keys,
+            'formatting': {key: stat_col.formatting.get(key, '{}') for key in self.keys}
+            }).encode('utf-8')
+        self.file = open(file_name, 'wb')
+        self.file.write(self.magic)
+        self.file.write(struct.pack('<BI', self.version, len(header)))
+        self.file.write(header)
+        self.file.flush()
+
+    def write(self, stat_col, snapshot=None):
+        """
+        Buffers the last values of the statistics, writing the chunk to file when the buffers are full.
+
+        :param stat_col: :py:class:`ptp.utils.StatisticsCollector`.
+
+        :param snapshot: Not used (values are taken directly from the columns of the collector).
+
+        """
+        for key in self.keys:
+            present = stat_col.is_collected(key)
+            self.present[key][self.rows] = present
+            if present:
+                self.buffers[key][self.rows] = stat_col[key][-1]
+            elif self.buffers[key].dtype == object:
+                self.buffers[key][self.rows] = ''
+            else:
+                self.buffers[key][self.rows] = 0
+        self.rows += 1
+
+        if self.rows == self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered rows to file as a single chunk.
+        """
+        if self.rows == 0:
+            return
+        self.file.write(self.chunk_magic)
+        self.file.write(struct.pack('<I', self.rows))
+        for key in self.keys:
+            column = self.buffers[key][:self.rows]
+            # Non-numeric values are stored as strings.
+            if column.dtype == object:
+                column = np.array([str(value) for value in column])
+            dtype_str = column.dtype.str.encode('ascii')
+            data = np.ascontiguousarray(column).tobytes()
+            self.file.write(struct.pack('<H', len(dtype_str)))
+            self.file.write(dtype_str)
+            self.file.write(struct.pack('<Q', len(data)))
+            self.file.write(data)
+            self.file.write(self.present[key][:self.rows].tobytes())
+        self.file.flush()
+        self.rows = 0
+
+    def close(self):
+        """
+        Writes the remaining rows and closes the file.
+        """
+        self.flush()
+        self.file.close()
+
+
+def read_binary_statistics(file_name):
+    """
+    Reads the statistics stored by the :py:class:`BinaryStatisticsSink`.
+
+    .. note::
+        An incomplete last chunk (e.g. when the experiment was interrupted) is skipped.
+
+    :param file_name: Name of the file (with path).
+    :type file_name: str
+
+    :return: Tuple (list of names of statistics, dict with their formatting, dict with numpy arrays containing their values). \
+    Values that were not collected in given episodes are masked (i.e. the columns are then ``numpy.ma.MaskedArray``).
+
+    """
+    with open(os.path.expanduser(file_name), 'rb') as f:
+        if f.read(len(BinaryStatisticsSink.magic)) != BinaryStatisticsSink.magic:
+            raise ValueError("File '{}' does not contain binary statistics".format(file_name))
+        version, header_len = struct.unpack('<BI', f.read(5))
+        if version not in BinaryStatisticsSink.supported_versions:
+            raise ValueError("Unsupported version {} of binary statistics in file '{}'".format(version, file_name))
+        header = json.loads(f.read(header_len).decode('utf-8'))
+        keys = header['keys']
+
+        chunks = {key: [] for key in keys}
+        masks = {key: [] for key in keys}
+        while True:
+            try:
+                if f.read(len(BinaryStatisticsSink.chunk_magic)) != BinaryStatisticsSink.chunk_magic:
+                    break
+                rows, = struct.unpack('<I', f.read(4))
+                chunk = {}
+                mask = {}
+                for key in keys:
+                    dtype_len, = struct.unpack('<H', f.read(2))
+                    dtype = np.dtype(f.read(dtype_len).decode('ascii'))
+                    data_len, = struct.unpack('<Q', f.read(8))
+                    data = f.read(data_len)
+                    if len(data) != data_len:
+                        raise struct.error("Incomplete chunk")
+                    chunk[key] = np.frombuffer(data, dtype=dtype, count=rows)
+                    # Flags were introduced in version 2 - before that all values were collected.
+                    if version >= 2:
+                        present = f.read(rows)
+                        if len(present) != rows:
+                            raise struct.error("Incomplete chunk")
+                        mask[key] = np.frombuffer(present, dtype=np.uint8) == 0
+                    else:
+                        mask[key] = np.zeros(rows, dtype=bool)
+            except struct.error:
+                break
+            for key in keys:
+                chunks[key].append(chunk[key])
+                masks[key].append(mask[key])
+
+    values = {}
+    for key in keys:
+        if len(chunks[key]) == 0:
+            values[key] = np.empty(0)
+            continue
+        values[key] = np.concatenate(chunks[key])
+        mask = np.concatenate(masks[key])
+        if mask.any():
+            values[key] = np.ma.masked_array(values[key], mask=mask)
+    return keys, header['formatting'], values
+
+
+def convert_binary_statistics_to_csv(binary_file, csv_file):
+    """
+    Converts the statistics stored by the :py:class:`BinaryStatisticsSink` into a csv file, \
+    formatted just like the one created by :py:class:`CSVStatisticsSink`.
+
+    :param binary_file: Name of the input binary file (with path).
+    :type binary_file: str
+
+    :param csv_file: Name of the output csv file (with path).
+    :type csv_file: str
+
+    """
+    keys, formatting, values = read_binary_statistics(binary_file)
+    num_rows = min(len(values[key]) for key in keys) if len(keys) > 0 else 0
+    masks = {key: np.ma.getmaskarray(values[key]) for key in keys}
+    values = {key: np.ma.getdata(values[key]) for key in keys}
+
+    with open(os.path.expanduser(csv_file), 'w') as f:
+        f.write(','.join(keys) + '\n')
+        for row in range(num_rows):
+            # Values that were not collected are left empty.
+            f.write(','.join('' if masks[key][row] else formatting.get(key, '{}').format(values[key][row]) for key in keys) + '\n')
+
+
+def main():
+    """
+    Entry point converting binary statistics file(s) into csv.
+
+    """
+    parser = argparse.ArgumentParser(description='Converts binary statistics file(s) into csv')
+    parser.add_argument('files', nargs='+', type=str, help='Binary statistics file(s) to be converted')
+    args = parser.parse_args()
+
+    for binary_file in args.files:
+        csv_file = os.path.splitext(binary_file)[0] + '.csv'
+        convert_binary_statistics_to_csv(binary_file, csv_file)
+        print("Converted '{}' to '{}'".format(binary_file, csv_file))
+
+
+if __name__ == "__main__":
+    main()
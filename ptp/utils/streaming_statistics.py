@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import math
+
+
+class QuantileSketch(object):
+    """
+    Mergeable sketch approximating the quantiles of a stream of (weighted) values with a given relative accuracy.
+
+    Values are counted in logarithmically sized buckets (separately for positive and negative values), \
+    so the returned quantile ``x'`` of the true quantile ``x`` satisfies ``|x' - x| <= relative_accuracy * |x|``. \
+    Merging of two sketches (with the same accuracy) is exact, i.e. it is equivalent to sketching the \
+    concatenated streams.
+
+    """
+
+    # Values with smaller magnitude are counted as zeros.
+    min_value = 1e-9
+
+    def __init__(self, relative_accuracy=0.01):
+        """
+        Initializes the sketch.
+
+        :param relative_accuracy: Relative accuracy of the quantiles (DEFAULT: 0.01)
+        :type relative_accuracy: float
+
+        """
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+
+        self.positive = {}
+        self.negative = {}
+        self.zero = 0.0
+        self.count = 0.0
+
+    def bucket(self, value):
+        """
+        Returns the index of the bucket for a given (positive) value.
+        """
+        return int(math.ceil(math.log(value) / self.log_gamma))
+
+    def bucket_value(self, index):
+        """
+        Returns the (positive) value represented by the bucket with a given index.
+        """
+        return 2.0 * self.gamma ** index / (self.gamma + 1)
+
+    def update(self, value, weight=1.0):
+        """
+        Adds a value to the sketch.
+
+        :param value: Value.
+        :type value: float
+
+        :param weight: Weight of the value (DEFAULT: 1.0)
+        :type weight: float
+
+        """
+        if value > self.min_value:
+            index = self.bucket(value)
+            self.positive[index] = self.positive.get(index, 0.0) + weight
+        elif value < -self.min_value:
+            index = self.bucket(-value)
+            self.negative[index] = self.negative.get(index, 0.0) + weight
+        else:
+            self.zero += weight
+        self.count += weight
+
+    def merge(self, other):
+        """
+        Merges other sketch into this one.
+
+        :param other: :py:class:`QuantileSketch` with the same relative accuracy.
+
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracies ({} and {})".format(
+                self.relative_accuracy, other.relative_accuracy))
+        for index, weight in other.positive.items():
+            self.positive[index] = self.positive.get(index, 0.0) + weight
+        for index, weight in other.negative.items():
+            self.negative[index] = self.negative.get(index, 0.0) + weight
+        self.zero += other.zero
+        self.count += other.count
+
+    def quantile(self, q):
+        """
+        Returns the approximation of the q-th quantile.
+
+        :param q: Quantile, in range [0, 1].
+        :type q: float
+
+        :return: Value or NaN if the sketch is empty.
+
+        """
+        if self.count <= 0:
+            return float('nan')
+        rank = q * self.count
+        cumulative = 0.0
+        # Negative values - from the biggest magnitude.
+        for index in sorted(self.negative.keys(), reverse=True):
+            cumulative += self.negative[index]
+            if cumulative > rank:
+                return -self.bucket_value(index)
+        cumulative += self.zero
+        if cumulative > rank:
+            return 0.0
+        # Positive values - from the smallest magnitude.
+        last = None
+        for index in sorted(self.positive.keys()):
+            cumulative += self.positive[index]
+            last = index
+            if cumulative > rank:
+                return self.bucket_value(index)
+        # q = 1 - return the biggest value.
+        if last is not None:
+            return self.bucket_value(last)
+        if self.zero > 0:
+            return 0.0
+        return -self.bucket_value(min(self.negative.keys()))
+
+
+class StreamingStatistics(object):
+    """
+    Streaming, mergeable state summarizing a (weighted) stream of values of a single statistic: \
+    number of values, sum of values and weights, weighted mean and sum of squared differences (Welford), \
+    min, max and a :py:class:`QuantileSketch`.
+
+    Every update costs O(1) and states computed on different shards of the data (e.g. in different processes) \
+    can be merged exactly with :py:func:`merge`.
+
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        """
+        Initializes the (empty) state.
+
+        :param relative_accuracy: Relative accuracy of the quantile sketch (DEFAULT: 0.01)
+        :type relative_accuracy: float
+
+        """
+        # Number of values.
+        self.count = 0
+        # Sum of values (not weighted).
+        self.total = 0.0
+        # Sum of weights.
+        self.weight = 0.0
+        # Weighted mean.
+        self.mean = 0.0
+        # Weighted sum of squared differences from the mean.
+        self.m2 = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+        self.sketch = QuantileSketch(relative_accuracy)
+
+    def update(self, value, weight=1.0):
+        """
+        Updates the state with a new value.
+
+        :param value: Value.
+        :type value: float
+
+        :param weight: Weight of the value, e.g. size of the batch (DEFAULT: 1.0)
+        :type weight: float
+
+        """
+        self.count += 1
+        self.total += value
+        if weight > 0:
+            self.weight += weight
+            delta = value - self.mean
+            self.mean += delta * weight / self.weight
+            self.m2 += weight * delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.sketch.update(value, weight)
+
+    def merge(self, other):
+        """
+        Merges other state into this one (parallel algorithm of Chan et al.).
+
+        :param other: :py:class:`StreamingStatistics`.
+
+        """
+        weight = self.weight + other.weight
+        if weight > 0:
+            delta = other.mean - self.mean
+            self.mean += delta * other.weight / weight
+            self.m2 += other.m2 + delta * delta * self.weight * other.weight / weight
+        self.weight = weight
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+
+    def variance(self, ddof=0):
+        """
+        Returns the (weighted) variance.
+
+        :param ddof: Delta degrees of freedom, i.e. the divisor is sum of weights minus ddof (DEFAULT: 0)
+        :type ddof: int
+
+        :return: Variance (0.0 if there are not enough values).
+
+        """
+        if self.weight - ddof <= 0:
+            return 0.0
+        return max(self.m2, 0.0) / (self.weight - ddof)
+
+    def std(self, ddof=0):
+        """
+        Returns the (weighted) standard deviation.
+
+        :param ddof: Delta degrees of freedom, i.e. the divisor is sum of weights minus ddof (DEFAULT: 0)
+        :type ddof: int
+
+        :return: Standard deviation (0.0 if there are not enough values).
+
+        """
+        return math.sqrt(self.variance(ddof))
+
+    def quantile(self, q):
+        """
+        Returns the (approximated) q-th quantile, clamped to the [min, max] range.
+
+        :param q: Quantile, in range [0, 1].
+        :type q: float
+
+        """
+        if self.count == 0:
+            return float('nan')
+        return min(max(self.sketch.quantile(q), self.min), self.max)
@@ -2,6 +2,7 @@ from .worker import Worker
 from .trainer import Trainer
 #from .offline_trainer import OfflineTrainer
 from .online_trainer import OnlineTrainer
+from .quantizer import Quantizer
 #from .tester import Tester
 
 __all__ = [
@@ -9,5 +10,6 @@ __all__ = [
     'Trainer',
     #'OfflineTrainer',
     'OnlineTrainer',
+    'Quantizer',
     #'Tester'
     ]
@@ -161,6 +161,8 @@ class OnlineTrainer(Trainer):
 
             # Inform the training problem class that epoch has started.
             self.training.problem.initialize_epoch(self.app_state.epoch)
+            # Start the epoch from the initial states.
+            self.pipeline.reset_states(training=True)
 
             # Set initial status.
             training_status = "Not Converged"
@@ -202,29 +204,14 @@ class OnlineTrainer(Trainer):
                         (self.app_state.episode % self.app_state.args.logging_interval == 0):
                     self.training_stat_col.export_to_tensorboard()
 
-                    # Export histograms.
-                    if self.app_state.args.tensorboard >= 1:
-                        for name, param in self.pipeline.named_parameters():
-                            try:
-                                self.training_batch_writer.add_histogram(name, 
-                                    param.data.cpu().numpy(), self.app_state.episode, bins='doane')
-
-                            except Exception as e:
-                                self.logger.error("  {} :: data :: {}".format(name, e))
-
-                    # Export gradients.
-                    if self.app_state.args.tensorboard >= 2:
-                        for name, param in self.pipeline.named_parameters():
-                            try:
-                                self.training_batch_writer.add_histogram(name + '/grad', 
-                                    param.grad.data.cpu().numpy(), self.app_state.episode, bins='doane')
-
-                            except Exception as e:
-                                self.logger.error("  {} :: grad :: {}".format(name, e))
+                    # Export histograms (and gradients).
+                    if self.histogram_writer is not None:
+                        self.histogram_writer.add_parameters(self.pipeline.named_parameters(),
+                            self.app_state.episode, gradients=(self.app_state.args.tensorboard >= 2))
 
                 # 5.3. Log to logger - at logging frequency.
                 if self.app_state.episode % self.app_state.args.logging_interval == 0:
-                    self.logger.info(self.training_stat_col.export_to_string())
+                    self.training_stat_col.export_to_logger(self.logger)
 
                 #  6. Validate and (optionally) save the model.
                 if (self.app_state.episode % self.partial_validation_interval) == 0:
@@ -290,6 +277,8 @@ class OnlineTrainer(Trainer):
                     self.logger.info('Starting next epoch: {}'.format(self.app_state.epoch))
                     # Inform the training problem class that epoch has started.
                     self.training.problem.initialize_epoch(self.app_state.epoch)
+                    # Start the epoch from the initial states.
+                    self.pipeline.reset_states(training=True)
                     # Empty the statistics collector.
                     self.training_stat_col.empty()
 
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import os
+import time
+import torch
+
+import ptp.configuration.config_parsing as config_parse
+
+from ptp.workers.worker import Worker
+
+from ptp.application.problem_manager import ProblemManager
+from ptp.application.pipeline_manager import PipelineManager
+
+from ptp.utils.statistics_collector import StatisticsCollector
+from ptp.utils.statistics_aggregator import StatisticsAggregator
+
+
+class Quantizer(Worker):
+    """
+    Worker responsible for post-training dynamic int8 quantization of the models in the pipeline.
+
+    Loads the trained pipeline, evaluates it on a given set (in fp32), quantizes all the models, \
+    evaluates it once again on the very same batches and reports the differences of the aggregated \
+    statistics (e.g. accuracy) along with the speedup. Finally, saves the quantized checkpoint that \
+    can be loaded by :py:func:`ptp.application.PipelineManager.load`.
+
+    """
+
+    def __init__(self, name="Quantizer"):
+        """
+        Calls the ``Worker`` constructor, adds some additional arguments to parser.
+
+        :param name: Name of the worker (DEFAULT: "Quantizer").
+        :type name: str
+
+        """
+        # Call base constructor to set up app state, registry and add default arguments.
+        super(Quantizer, self).__init__(name)
+
+        self.parser.add_argument(
+            '--section',
+            dest='section',
+            type=str,
+            default='testing',
+            choices=['training', 'validation', 'testing'],
+            help='Section of the configuration file with the problem used for evaluation of the pipeline (DEFAULT: testing)')
+
+        self.parser.add_argument(
+            '--episodes',
+            dest='max_episodes',
+            type=int,
+            default=100,
+            help='Number of batches used for evaluation of the pipeline before and after quantization.'
+                ' Set to -1 to use the whole set (DEFAULT: 100)')
+
+
+    def setup_experiment(self):
+        """
+        Sets up the experiment of the ``Quantizer``:
+
+            - Calls base class setup_experiment to parse the command line arguments,
+            - Loads the config file(s),
+            - Sets up the log directory,
+            - Creates the problem manager and the pipeline,
+            - Loads the (fp32) models from the checkpoint.
+
+        """
+        # Call base method to parse all command line arguments and add default sections.
+        super(Quantizer, self).setup_experiment()
+
+        # Check if config file was selected.
+        if self.app_state.args.config == '':
+            print('Please pass configuration file(s) as --c parameter')
+            exit(-1)
+
+        # Check if checkpoint file was indicated.
+        chkpt_file = os.path.expanduser(self.app_state.args.load_checkpoint)
+        if chkpt_file == "":
+            print('Please pass path to and name of the file containing pipeline to be quantized as --load parameter')
+            exit(-1)
+
+        # Check if file with model exists.
+        if not os.path.isfile(chkpt_file):
+            print('Error: Checkpoint file {} does not exist'.format(chkpt_file))
+            exit(-2)
+
+        # Quantized models can be executed on CPU only.
+        if self.app_state.args.use_gpu:
+            print('Error: Dynamically quantized models can be executed on CPU only')
+            exit(-2)
+
+        # Load the configuration (along with the default configurations it points to).
+        self.load_configuration(self.app_state.args.config)
+
+        # Get the section used for evaluation.
+        self.section = self.app_state.args.section
+
+        # Get problem type.
+        try:
+            problem_type = self.config[self.section]['problem']['type']
+        except KeyError:
+            print("Error: Couldn't retrieve the problem 'type' from the '{}' section in the loaded configuration".format(self.section))
+            exit(-4)
+
+        # Get pipeline name.
+        try:
+            pipeline_name = self.config['pipeline']['name']
+        except KeyError:
+            print("Error: Couldn't retrieve the pipeline 'name' from the loaded configuration")
+            exit(-4)
+
+        # Create the experiment directory and log file.
+        self.setup_log_dir(problem_type, pipeline_name, 'quantizer.log', prefix='quantize_')
+
+        # Set cpu types.
+        self.app_state.set_types()
+
+        # Set random seeds in the evaluation section.
+        self.set_random_seeds(self.section, self.config[self.section])
+
+        # Total number of detected errors.
+        errors =0
+
+        ################# PROBLEM #################
+
+        # Build problem manager.
+        self.problem = ProblemManager(self.section, self.config[self.section])
+        errors += self.problem.build()
+
+        ###################### PIPELINE ######################
+
+        # Build the pipeline using the loaded configuration.
+        self.pipeline = PipelineManager(pipeline_name, self.config['pipeline'])
+        errors += self.pipeline.build()
+
+        # Check errors.
+        if errors > 0:
+            self.logger.error('Found {} errors, terminating execution'.format(errors))
+            exit(-5)
+
+        # Handshake definitions.
+        self.logger.info("Handshaking {} pipeline".format(self.section))
+        errors += self.pipeline.handshake(self.problem.problem.output_data_definitions())
+
+        # Check errors.
+        if errors > 0:
+            self.logger.error('Found {} errors, terminating execution'.format(errors))
+            exit(-5)
+
+        # Check if there are any models in the pipeline.
+        if len(self.pipeline.models) == 0:
+            self.logger.error('Cannot proceed with quantization, as there are no models in the pipeline')
+            exit(-6)
+
+        # Load the trained models params from checkpoint.
+        try:
+            self.pipeline.load(chkpt_file)
+        except KeyError:
+            self.logger.error("File {} seems not to be a valid model checkpoint".format(chkpt_file))
+            exit(-7)
+
+        # Quantized checkpoint will be stored next to the original one.
+        self.quantized_chkpt_file = os.path.splitext(chkpt_file)[0] + '_quantized.pt'
+
+        # Export and log configuration, optionally asking the user for confirmation.
+        config_parse.display_parsing_results(self.logger, self.app_state.args, self.unparsed)
+        config_parse.export_experiment_configuration_to_yml(self.logger, self.log_dir, "quantization_configuration.yaml", self.config, self.app_state.args.confirm)
+
+
+    def evaluate(self, tag):
+        """
+        Evaluates the pipeline on (at most ``--episodes``) batches fetched from the problem.
+
+        Random seeds are reset before iterating over the ``DataLoader``, so every call processes the very same batches \
+        (in the same order), without keeping them in memory.
+
+        :param tag: Tag used in logging and in the name of the csv file.
+        :type tag: str
+
+        :return: Tuple (aggregated statistics, total time of forward passes [s]).
+
+        """
+        # Create statistics collector and aggregator.
+        stat_col = StatisticsCollector(keep_history=False, phase=self.section)
+        self.add_statistics(stat_col)
+        self.problem.problem.add_statistics(stat_col)
+        self.pipeline.add_statistics(stat_col)
+
+        stat_agg = StatisticsAggregator()
+        self.add_aggregators(stat_agg)
+        self.problem.problem.add_aggregators(stat_agg)
+        self.pipeline.add_aggregators(stat_agg)
+        # Will contain a single row with aggregated statistics.
+        stat_file = stat_agg.initialize_csv_file(self.log_dir, tag + '_set_agg_statistics.csv')
+
+        # Turn on evaluation mode.
+        self.pipeline.eval()
+
+        # Reset the seeds, so the sampler (and data augmentation) will produce the same batches.
+        self.set_random_seeds(self.section, self.config[self.section])
+        max_episodes = self.app_state.args.max_episodes
+
+        forward_time = 0.0
+        with torch.no_grad():
+            for episode, batch in enumerate(self.problem.dataloader):
+                if episode == max_episodes:
+                    break
+                self.app_state.episode = episode
+                # Measure the time of the forward pass only.
+                start = time.perf_counter()
+                self.pipeline.forward(batch)
+                forward_time += time.perf_counter() - start
+                # Collect the statistics.
+                self.collect_all_statistics(self.problem, self.pipeline, batch, stat_col)
+
+        # Aggregate and export the statistics.
+        self.aggregate_all_statistics(self.problem, self.pipeline, stat_col, stat_agg)
+        self.export_all_statistics(stat_agg, '[{}]'.format(tag))
+        stat_file.close()
+
+        return stat_agg, forward_time
+
+
+    @staticmethod
+    def create_report(fp32_agg, fp32_time, int8_agg, int8_time):
+        """
+        Creates the report comparing the aggregated statistics of the original and the quantized pipeline.
+
+        :param fp32_agg: Aggregated statistics of the original pipeline (``StatisticsAggregator``).
+
+        :param fp32_time: Total time of forward passes of the original pipeline [s].
+
+        :param int8_agg: Aggregated statistics of the quantized pipeline (``StatisticsAggregator``).
+
+        :param int8_time: Total time of forward passes of the quantized pipeline [s].
+
+        :return: Report (str).
+
+        """
+        report_str = 'Quantization report:\n'
+        report_str += '='*80 + '\n'
+        report_str += '  {:<30} {:>14} {:>14} {:>14}\n'.format('statistic', 'fp32', 'int8', 'delta')
+        for key, fp32_value in fp32_agg.aggregators.items():
+            if key in ['episode', 'episodes_aggregated']:
+                continue
+            int8_value = int8_agg.aggregators[key]
+            try:
+                report_str += '  {:<30} {:>14.6f} {:>14.6f} {:>+14.6f}\n'.format(key, fp32_value, int8_value, int8_value - fp32_value)
+            except (TypeError, ValueError):
+                # Skip non-numeric aggregators.
+                continue
+        report_str += '  {:<30} {:>14.6f} {:>14.6f}\n'.format('forward time [s]', fp32_time, int8_time)
+        if int8_time > 0:
+            report_str += '  Speedup: {:.2f}x\n'.format(fp32_time / int8_time)
+        report_str += '='*80 + '\n'
+        return report_str
+
+
+    def run_experiment(self):
+        """
+        Main function of the ``Quantizer``: evaluates the pipeline, quantizes it, evaluates it once again, \
+        reports the differences and saves the quantized checkpoint.
+
+        """
+        num_batches = len(self.problem.dataloader)
+        if self.app_state.args.max_episodes != -1:
+            num_batches = min(num_batches, self.app_state.args.max_episodes)
+        self.logger.info("Evaluating the pipeline on {} batches from the '{}' set".format(num_batches, self.section))
+
+        # Evaluate the original pipeline.
+        fp32_agg, fp32_time = self.evaluate('fp32')
+
+        # Quantize the models.
+        self.pipeline.quantize()
+        summary_str = self.pipeline.summarize_models_header()
+        summary_str += self.pipeline.summarize_models()
+        self.logger.info(summary_str)
+
+        # Evaluate the quantized pipeline.
+        int8_agg, int8_time = self.evaluate('int8')
+
+        # Compare the aggregated statistics.
+        self.logger.info(self.create_report(fp32_agg, fp32_time, int8_agg, int8_time))
+
+        # Use the mean loss of the quantized pipeline (if present) as the checkpoint loss.
+        loss = int8_agg.aggregators.get('loss', float('inf'))
+
+        # Save the quantized checkpoint.
+        chkpt = self.pipeline.create_checkpoint("Quantized", loss)
+        torch.save(chkpt, self.quantized_chkpt_file)
+        self.logger.info("Exported quantized pipeline '{}' to checkpoint:\n {}".format(self.pipeline.name, self.quantized_chkpt_file))
+
+
+def main():
+    """
+    Entry point function for the ``Quantizer``.
+
+    """
+    quantizer = Quantizer()
+    # parse args, load configuration and create all required objects.
+    quantizer.setup_experiment()
+    # run the experiment
+    quantizer.run_experiment()
+
+
+if __name__ == '__main__':
+    main()
@@ -32,6 +32,7 @@ from ptp.application.pipeline_manager import PipelineManager
 
 from ptp.utils.statistics_collector import StatisticsCollector
 from ptp.utils.statistics_aggregator import StatisticsAggregator
+from ptp.utils.statistics_exporter import StatisticsExporter
 
 
 class Tester(Worker):
@@ -309,13 +310,17 @@ class Tester(Worker):
         Function initializes all statistics collectors and aggregators used by a given worker,
         creates output files etc.
         """
+        # Create exporter formatting and writing the statistics in background.
+        self.exporter = StatisticsExporter()
+
         # Create statistics collector for testing.
-        self.testing_stat_col = StatisticsCollector()
+        self.testing_stat_col = StatisticsCollector(keep_history=False, phase='testing')
         self.add_statistics(self.testing_stat_col)
         self.testing.problem.add_statistics(self.testing_stat_col)
         self.pipeline.add_statistics(self.testing_stat_col)
-        # Create the csv file to store the testing statistics.
-        self.testing_batch_stats_file = self.testing_stat_col.initialize_csv_file(self.log_dir, 'testing_statistics.csv')
+        # Create the file to store the testing statistics.
+        self.testing_batch_stats_file = self.initialize_statistics_file(self.testing_stat_col, self.log_dir, 'testing_statistics')
+        self.testing_stat_col.initialize_exporter(self.exporter)
 
         # Create statistics aggregator for testing.
         self.testing_stat_agg = StatisticsAggregator()
@@ -325,11 +330,24 @@ class Tester(Worker):
         # Create the csv file to store the testing statistic aggregations.
         # Will contain a single row with aggregated statistics.
         self.testing_set_stats_file = self.testing_stat_agg.initialize_csv_file(self.log_dir, 'testing_set_agg_statistics.csv')
+        self.testing_stat_agg.initialize_exporter(self.exporter)
+
+        # Create the metrics server (if indicated).
+        self.metrics_server = self.initialize_metrics_server(self.pipeline, {
+            'testing': self.testing_stat_col,
+            'testing_set_agg': self.testing_stat_agg
+            })
 
     def finalize_statistics_collection(self):
         """
         Finalizes statistics collection, closes all files etc.
         """
+        # Export the deferred statistics.
+        self.testing_stat_col.synchronize()
+        # Wait until all the exports are done.
+        self.exporter.close()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
         # Close all files.
         self.testing_batch_stats_file.close()
         self.testing_set_stats_file.close()
@@ -378,7 +396,7 @@ class Tester(Worker):
 
                     # Log to logger - at logging frequency.
                     if episode % self.app_state.args.logging_interval == 0:
-                        self.logger.info(self.testing_stat_col.export_to_string('[Partial Test]'))
+                        self.testing_stat_col.export_to_logger(self.logger, '[Partial Test]')
 
                     # move to next episode.
                     episode += 1
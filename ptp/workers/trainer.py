@@ -20,11 +20,7 @@ __author__ = "Vincent Marois, Tomasz Kornuta"
 import os
 import yaml
 import torch
-from time import sleep
-from datetime import datetime
-
-import ptp.configuration.config_parsing as config_parse
-import ptp.utils.logger as logging
+from torch.utils.data.sampler import WeightedRandomSampler
 
 from ptp.workers.worker import Worker
 
@@ -33,6 +29,8 @@ from ptp.application.pipeline_manager import PipelineManager
 
 from ptp.utils.statistics_collector import StatisticsCollector
 from ptp.utils.statistics_aggregator import StatisticsAggregator
+from ptp.utils.histogram_writer import HistogramWriter
+from ptp.utils.statistics_exporter import StatisticsExporter
 
 
 class Trainer(Worker):
@@ -67,9 +65,16 @@ class Trainer(Worker):
             type=int,
             help="If present, enable logging to TensorBoard. Available log levels:\n"
                 "0: Log the collected statistics.\n"
-                "1: Add the histograms of the model's biases & weights (Warning: Slow).\n"
-                "2: Add the histograms of the model's biases & weights gradients "
-                "(Warning: Even slower).")
+                "1: Add the histograms of the model's biases & weights.\n"
+                "2: Add the histograms of the model's biases & weights gradients.")
+
+        self.parser.add_argument(
+            '--histogram_filter',
+            dest='histogram_filter',
+            type=str,
+            default='',
+            help='Comma separated list of patterns (e.g. "model1.*,*.bias") of names of the parameters, '
+                'which histograms will be exported to TensorBoard (DEFAULT: "", means all parameters)')
 
         self.parser.add_argument(
             '--save',
@@ -131,24 +136,8 @@ class Trainer(Worker):
             self.logger.error("Cannot use GPU as there are no CUDA-compatible devices present in the system!")
             exit(-2)
 
-        # Check if config file exists.            
-        root_config = self.app_state.args.config
-        if not os.path.isfile(root_config):
-            print('Error: Configuration file {} does not exist'.format(root_config))
-            exit(-3)
-        
-        # Extract absolute path to main ptp 'config' directory.
-        abs_config_path = os.path.abspath(root_config)
-        # Save it in app_state!
-        self.app_state.absolute_config_path = abs_config_path[:abs_config_path.find("configs")+8] 
-        # Get relative path.
-        rel_config_path = abs_config_path[abs_config_path.find("configs")+8:]
-
-        # Get the list of configurations which need to be loaded.
-        configs_to_load = config_parse.recurrent_config_parse(rel_config_path, [], self.app_state.absolute_config_path)
-
-        # Read the YAML files one by one - but in reverse order -> overwrite the first indicated config(s)
-        config_parse.reverse_order_config_load(self.config, configs_to_load, self.app_state.absolute_config_path)
+        # Load the configuration (along with the default configurations it points to).
+        self.load_configuration(self.app_state.args.config)
 
         # -> At this point, the Param Registry contains the configuration loaded (and overwritten) from several files.
         # Log the resulting training configuration.
@@ -179,28 +168,8 @@ class Trainer(Worker):
             print("Error: Couldn't retrieve the pipeline 'name' from the loaded configuration")
             exit(-1)
 
-        # Prepare the output path for logging
-        while True:  # Dirty fix: if log_dir already exists, wait for 1 second and try again
-            try:
-                time_str = '{0:%Y%m%d_%H%M%S}'.format(datetime.now())
-                if self.app_state.args.savetag != '':
-                    time_str = time_str + "_" + self.app_state.args.savetag
-                self.log_dir = os.path.expanduser(self.app_state.args.expdir) + '/' + training_problem_type + '/' + pipeline_name + '/' + time_str + '/'
-                # Lowercase dir.
-                self.log_dir = self.log_dir.lower()
-                os.makedirs(self.log_dir, exist_ok=False)
-            except FileExistsError:
-                sleep(1)
-            else:
-                break
-
-        # Set log dir.
-        self.app_state.log_file = self.log_dir + 'trainer.log'
-        # Initialize logger in app state.
-        self.app_state.logger = logging.initialize_logger("AppState")
-        # Add handlers for the logfile to worker logger.
-        logging.add_file_handler_to_logger(self.logger)
-        self.logger.info("Logger directory set to: {}".format(self.log_dir ))
+        # Create the experiment directory and log file.
+        self.setup_log_dir(training_problem_type, pipeline_name, 'trainer.log')
 
         # Set cpu/gpu types.
         self.app_state.set_types()
@@ -257,6 +226,10 @@ class Trainer(Worker):
         self.pipeline = PipelineManager(pipeline_name, self.config['pipeline'])
         errors += self.pipeline.build()
 
+        # Check whether weights of samples won't be taken into account twice.
+        if errors == 0:
+            errors += self.check_weighted_sampling(self.training)
+
         # Check errors.
         if errors > 0:
             self.logger.error('Found {} errors, terminating execution'.format(errors))
@@ -349,6 +322,27 @@ class Trainer(Worker):
 
         self.logger.info(log_str)
 
+    def check_weighted_sampling(self, problem_mgr):
+        """
+        Checks whether weights of samples provided by the problem are not used both by the ``WeightedRandomSampler`` \
+        and by the losses (with ``use_weights`` set), as samples would be then weighted twice.
+
+        :param problem_mgr: Problem manager.
+        :type problem_mgr: ``ProblemManager``
+
+        :return: Number of detected errors (0 or 1).
+        """
+        # Sampler draws samples proportionally to weights provided by the problem.
+        if not isinstance(problem_mgr.sampler, WeightedRandomSampler) or 'weights' in problem_mgr.config['sampler']:
+            return 0
+
+        weighted_losses = [loss.name for loss in self.pipeline.losses if getattr(loss, "use_weights", False)]
+        if len(weighted_losses) > 0:
+            self.logger.error("Problem '{}' samples with WeightedRandomSampler using the weights of samples, thus they cannot "
+                "be used by the losses as well (set 'use_weights: False' in: {})".format(problem_mgr.name, ', '.join(weighted_losses)))
+            return 1
+        return 0
+
     def add_statistics(self, stat_col):
         """
         Calls base method and adds epoch statistics to ``StatisticsCollector``.
@@ -386,15 +380,21 @@ class Trainer(Worker):
 
         - Creates the output files (csv).
 
+        - Creates the exporter formatting and writing the statistics in background.
+
         """
+        # Create exporter formatting and writing the statistics in background.
+        self.exporter = StatisticsExporter()
+
         # TRAINING.
         # Create statistics collector for training.
-        self.training_stat_col = StatisticsCollector()
+        self.training_stat_col = StatisticsCollector(keep_history=False, phase='training')
         self.add_statistics(self.training_stat_col)
         self.training.problem.add_statistics(self.training_stat_col)
         self.pipeline.add_statistics(self.training_stat_col)
-        # Create the csv file to store the training statistics.
-        self.training_batch_stats_file = self.training_stat_col.initialize_csv_file(self.log_dir, 'training_statistics.csv')
+        # Create the file to store the training statistics.
+        self.training_batch_stats_file = self.initialize_statistics_file(self.training_stat_col, self.log_dir, 'training_statistics')
+        self.training_stat_col.initialize_exporter(self.exporter)
 
         # Create statistics aggregator for training.
         self.training_stat_agg = StatisticsAggregator()
@@ -403,15 +403,17 @@ class Trainer(Worker):
         self.pipeline.add_aggregators(self.training_stat_agg)
         # Create the csv file to store the training statistic aggregations.
         self.training_set_stats_file = self.training_stat_agg.initialize_csv_file(self.log_dir, 'training_set_agg_statistics.csv')
+        self.training_stat_agg.initialize_exporter(self.exporter)
 
         # VALIDATION.
         # Create statistics collector for validation.
-        self.validation_stat_col = StatisticsCollector()
+        self.validation_stat_col = StatisticsCollector(keep_history=False, phase='validation')
         self.add_statistics(self.validation_stat_col)
         self.validation.problem.add_statistics(self.validation_stat_col)
         self.pipeline.add_statistics(self.validation_stat_col)
-        # Create the csv file to store the validation statistics.
-        self.validation_batch_stats_file = self.validation_stat_col.initialize_csv_file(self.log_dir, 'validation_statistics.csv')
+        # Create the file to store the validation statistics.
+        self.validation_batch_stats_file = self.initialize_statistics_file(self.validation_stat_col, self.log_dir, 'validation_statistics')
+        self.validation_stat_col.initialize_exporter(self.exporter)
 
         # Create statistics aggregator for validation.
         self.validation_stat_agg = StatisticsAggregator()
@@ -420,6 +422,15 @@ class Trainer(Worker):
         self.pipeline.add_aggregators(self.validation_stat_agg)
         # Create the csv file to store the validation statistic aggregations.
         self.validation_set_stats_file = self.validation_stat_agg.initialize_csv_file(self.log_dir, 'validation_set_agg_statistics.csv')
+        self.validation_stat_agg.initialize_exporter(self.exporter)
+
+        # Create the metrics server (if indicated).
+        self.metrics_server = self.initialize_metrics_server(self.pipeline, {
+            'training': self.training_stat_col,
+            'training_set_agg': self.training_stat_agg,
+            'validation': self.validation_stat_col,
+            'validation_set_agg': self.validation_stat_agg
+            })
 
 
     def finalize_statistics_collection(self):
@@ -427,6 +438,13 @@ class Trainer(Worker):
         Finalizes the statistics collection by closing the csv files.
 
         """
+        # Export the deferred statistics.
+        self.training_stat_col.synchronize()
+        self.validation_stat_col.synchronize()
+        # Wait until all the exports are done.
+        self.exporter.close()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
         # Close all files.
         self.training_batch_stats_file.close()
         self.training_set_stats_file.close()
@@ -453,16 +471,29 @@ class Trainer(Worker):
 
             self.validation_set_writer = SummaryWriter(self.log_dir + '/validation_set_agg')
             self.validation_stat_agg.initialize_tensorboard(self.validation_set_writer)
+
+            # Histograms are computed in torch and exported by a background thread.
+            if self.app_state.args.tensorboard >= 1:
+                self.histogram_writer = HistogramWriter(self.training_batch_writer, filters=self.app_state.args.histogram_filter)
+            else:
+                self.histogram_writer = None
         else:
             self.training_batch_writer = None
             self.training_set_writer = None
             self.validation_batch_writer = None
             self.validation_set_writer = None
+            self.histogram_writer = None
 
     def finalize_tensorboard(self):
         """ 
         Finalizes the operation of TensorBoard writers by closing them.
         """
+        # Wait until all the exports are done (exporter is created along with the statistics collection).
+        if getattr(self, 'exporter', None) is not None:
+            self.exporter.flush()
+        # Export the remaining histograms.
+        if self.histogram_writer is not None:
+            self.histogram_writer.close()
         # Close the TensorBoard writers.
         if self.training_batch_writer is not None:
             self.training_batch_writer.close()
@@ -487,6 +518,8 @@ class Trainer(Worker):
         """
         # Turn on evaluation mode.
         self.pipeline.eval()
+        # Validate starting from the initial states.
+        self.pipeline.reset_states(training=False)
         # Empty the statistics collector.
         self.validation_stat_col.empty()
 
@@ -516,6 +549,8 @@ class Trainer(Worker):
 
         # Turn on evaluation mode.
         self.pipeline.eval()
+        # Validate starting from the initial states.
+        self.pipeline.reset_states(training=False)
 
         # Reset the statistics.
         self.validation_stat_col.empty()
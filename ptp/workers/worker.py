@@ -17,14 +17,19 @@
 
 __author__ = "Vincent Marois, Tomasz Kornuta, Ryan L. McAvoy"
 
+import os
 import torch
 import argparse
 import numpy as np
+from time import sleep
+from datetime import datetime
 from random import randrange
 from abc import abstractmethod
 
+import ptp.configuration.config_parsing as config_parse
 import ptp.utils.logger as logging
 from ptp.utils.app_state import AppState
+from ptp.utils.metrics_server import MetricsServer
 from ptp.configuration.config_interface import ConfigInterface
 
 
@@ -133,9 +138,26 @@ class Worker(object):
                 default=100,
                 type=int,
                 help='Statistics logging interval. Will impact logging to the logger and '
-                    'exporting to TensorBoard. Writing to the csv file is not impacted '
+                    'exporting to TensorBoard. Writing to the statistics file is not impacted '
                     '(exports at every step). (DEFAULT: 100, i.e. logs every 100 episodes).')
 
+            self.parser.add_argument(
+                '--statistics_format',
+                dest='statistics_format',
+                type=str,
+                default='csv',
+                choices=['csv', 'binary'],
+                help='Format of the files storing statistics collected at every episode: csv (line-buffered) or\n'
+                    'binary (buffered, columnar, use ptp-stat-converter to convert it into csv) (DEFAULT: csv)')
+
+            self.parser.add_argument(
+                '--metrics_port',
+                dest='metrics_port',
+                type=int,
+                default=None,
+                help='If present, the latest statistics, component timings and throughput will be served on localhost\n'
+                    'on a given port (0 picks a free one) in the Prometheus text format (DEFAULT: None)')
+
             self.parser.add_argument(
                 '--agree',
                 dest='confirm',
@@ -175,6 +197,75 @@ class Worker(object):
         self.config.add_default_params({"testing": {}})
 
 
+    def load_configuration(self, root_config):
+        """
+        Loads the configuration from the indicated file along with all the default configurations it points to.
+
+        :param root_config: Configuration file (located in the main ptp ``configs`` directory).
+        :type root_config: str
+
+        """
+        # Check if config file exists.
+        if not os.path.isfile(root_config):
+            print('Error: Configuration file {} does not exist'.format(root_config))
+            exit(-3)
+
+        # Extract absolute path to main ptp 'config' directory.
+        abs_config_path = os.path.abspath(root_config)
+        # Save it in app_state!
+        self.app_state.absolute_config_path = abs_config_path[:abs_config_path.find("configs")+8] 
+        # Get relative path.
+        rel_config_path = abs_config_path[abs_config_path.find("configs")+8:]
+
+        # Get the list of configurations which need to be loaded.
+        configs_to_load = config_parse.recurrent_config_parse(rel_config_path, [], self.app_state.absolute_config_path)
+
+        # Read the YAML files one by one - but in reverse order -> overwrite the first indicated config(s)
+        config_parse.reverse_order_config_load(self.config, configs_to_load, self.app_state.absolute_config_path)
+
+
+    def setup_log_dir(self, problem_type, pipeline_name, log_file, prefix=''):
+        """
+        Creates the experiment directory (``expdir/problem_type/pipeline_name/[prefix]time[_savetag]/``) \
+        and adds the file handler to the worker logger.
+
+        :param problem_type: Type of the problem.
+        :type problem_type: str
+
+        :param pipeline_name: Name of the pipeline.
+        :type pipeline_name: str
+
+        :param log_file: Name of the log file.
+        :type log_file: str
+
+        :param prefix: Prefix of the name of the directory (DEFAULT: '').
+        :type prefix: str
+
+        """
+        # Prepare the output path for logging
+        while True:  # Dirty fix: if log_dir already exists, wait for 1 second and try again
+            try:
+                time_str = '{0}{1:%Y%m%d_%H%M%S}'.format(prefix, datetime.now())
+                if self.app_state.args.savetag != '':
+                    time_str = time_str + "_" + self.app_state.args.savetag
+                self.log_dir = os.path.expanduser(self.app_state.args.expdir) + '/' + problem_type + '/' + pipeline_name + '/' + time_str + '/'
+                # Lowercase dir.
+                self.log_dir = self.log_dir.lower()
+                os.makedirs(self.log_dir, exist_ok=False)
+            except FileExistsError:
+                sleep(1)
+            else:
+                break
+
+        # Set log dir.
+        self.app_state.log_file = self.log_dir + log_file
+        # Initialize logger in app state.
+        self.app_state.logger = logging.initialize_logger("AppState")
+        # Add handlers for the logfile to worker logger.
+        logging.add_file_handler_to_logger(self.logger)
+        self.logger.info("Logger directory set to: {}".format(self.log_dir ))
+
+
     def add_statistics(self, stat_col):
         """
         Adds most elementary shared statistics to ``StatisticsCollector``: episode.
@@ -201,6 +292,27 @@ class Worker(object):
         stat_agg.add_aggregator('episodes_aggregated', '{:06d}')
 
 
+    def initialize_statistics_file(self, stat_col, log_dir, name):
+        """
+        Creates the file storing the statistics collected at every episode, in the format \
+        indicated by the ``--statistics_format`` command line argument.
+
+        :param stat_col: ``StatisticsCollector``.
+
+        :param log_dir: Path to file.
+        :type log_dir: str
+
+        :param name: Name of the file (without extension).
+        :type name: str
+
+        :return: Sink (with the file opened for writing).
+
+        """
+        if self.app_state.args is not None and getattr(self.app_state.args, 'statistics_format', 'csv') == 'binary':
+            return stat_col.initialize_binary_file(log_dir, name + '.bin')
+        return stat_col.initialize_csv_file(log_dir, name + '.csv')
+
+
     @abstractmethod
     def run_experiment(self):
         """
@@ -212,6 +324,31 @@ class Worker(object):
         """
 
 
+    def initialize_metrics_server(self, pipeline_mgr, stat_objs):
+        """
+        Creates the metrics server (if indicated by the command line arguments) serving statistics of given \
+        collectors/aggregators and times of components of the pipeline.
+
+        :param pipeline_mgr: Pipeline manager.
+
+        :param stat_objs: Dictionary of ``StatisticsCollector`` and ``StatisticsAggregator`` objects (source name -> object).
+
+        :return: :py:class:`ptp.utils.MetricsServer` or None.
+
+        """
+        if self.app_state.args.metrics_port is None:
+            return None
+        try:
+            metrics_server = MetricsServer(self.app_state.args.metrics_port)
+        except OSError as e:
+            self.logger.error("Cannot start the metrics server: {}".format(e))
+            return None
+        metrics_server.register_pipeline(pipeline_mgr)
+        for source, stat_obj in stat_objs.items():
+            stat_obj.initialize_metrics(metrics_server, source)
+        return metrics_server
+
+
     def collect_all_statistics(self, problem_mgr, pipeline_mgr, data_dict, stat_col):
         """
         Function that collects statistics
@@ -229,12 +366,14 @@ class Worker(object):
 
         """
         # Collect "local" statistics.
+        stat_col.next_episode()
         stat_col['episode'] = self.app_state.episode
         if ('epoch' in stat_col) and (self.app_state.epoch is not None):
             stat_col['epoch'] = self.app_state.epoch
 
         # Collect rest of statistics.
-        problem_mgr.problem.collect_statistics(stat_col, data_dict)
+        if problem_mgr.problem.should_collect_statistics(stat_col):
+            problem_mgr.problem.collect_statistics(stat_col, data_dict)
         pipeline_mgr.collect_statistics(stat_col, data_dict)
 
         
@@ -257,9 +396,10 @@ class Worker(object):
         if ('epoch' in stat_col) and ('epoch' in stat_agg) and (self.app_state.epoch is not None):
             stat_agg.aggregators['epoch'] = self.app_state.epoch
         stat_agg.aggregators['episode'] = self.app_state.episode
-        stat_agg.aggregators['episodes_aggregated'] = len(stat_col['episode'])
+        stat_agg.aggregators['episodes_aggregated'] = stat_col.get_stream('episode').count
         # Aggregate rest of statistics.
-        problem_mgr.problem.aggregate_statistics(stat_col, stat_agg)
+        if problem_mgr.problem.collects_statistics_in_phase(stat_col.phase):
+            problem_mgr.problem.aggregate_statistics(stat_col, stat_agg)
         pipeline_mgr.aggregate_statistics(stat_col, stat_agg)
     
 
@@ -278,7 +418,7 @@ class Worker(object):
         """ 
         # Log to logger
         if export_to_log:
-            self.logger.info(stat_obj.export_to_string(tag))
+            stat_obj.export_to_logger(self.logger, tag)
 
         # Export to csv
         stat_obj.export_to_csv()
@@ -216,6 +216,8 @@ setup(
          'console_scripts': [
              'ptp-online-trainer=ptp.workers.online_trainer:main',
              'ptp-tester=ptp.workers.tester:main',
+             'ptp-quantizer=ptp.workers.quantizer:main',
+             'ptp-stat-converter=ptp.utils.statistics_sinks:main',
          ]
      },
 
@@ -1,21 +1,51 @@
 from .app_state_tests import TestAppState
+from .bleu_tests import TestBLEU
 from .component_tests import TestComponent
 from .config_registry_tests import TestConfigRegistry
 from .data_dict_tests import TestDataDict
 from .data_definition_tests import TestDataDefinition
 from .handshaking_tests import TestHandshaking
+from .histogram_writer_tests import TestHistogramWriter
+from .image_augmentation_tests import TestBatchImageAugmentation
+from .image_cache_tests import TestImageCache
+from .mapped_lines_tests import TestMappedLines
+from .mnist_tests import TestMNIST
 from .pipeline_tests import TestPipeline
+from .precision_recall_statistics_tests import TestPrecisionRecallStatistics
+from .prediction_cache_tests import TestPredictionCache
 from .problem_tests import TestProblem
+from .quantizer_tests import TestQuantizer
+from .recurrent_neural_network_tests import TestRecurrentNeuralNetwork
 from .sampler_factory_tests import TestSamplerFactory
+from .statistics_collector_tests import TestStatisticsCollector
+from .vqa_med_2019_tests import TestVQAMED2019
+from .wikitext_language_modeling_tests import TestWikiTextLanguageModeling
+from .wily_language_identification_tests import TestWiLYLanguageIdentification
+from .wily_ngram_language_modeling_tests import TestWiLYNGramLanguageModeling
 
 __all__ = [
     'TestAppState',
+    'TestBLEU',
     'TestComponent',
     'TestConfigRegistry',
     'TestDataDict',
     'TestDataDefinition',
     'TestHandshaking',
+    'TestHistogramWriter',
+    'TestBatchImageAugmentation',
+    'TestImageCache',
+    'TestMappedLines',
+    'TestMNIST',
     'TestPipeline',
+    'TestPrecisionRecallStatistics',
+    'TestPredictionCache',
     'TestProblem',
+    'TestQuantizer',
+    'TestRecurrentNeuralNetwork',
     'TestSamplerFactory',
+    'TestStatisticsCollector',
+    'TestVQAMED2019',
+    'TestWikiTextLanguageModeling',
+    'TestWiLYLanguageIdentification',
+    'TestWiLYNGramLanguageModeling',
     ]
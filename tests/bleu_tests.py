@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import torch
+import warnings
+import unittest
+from nltk.translate.bleu_score import sentence_bleu, corpus_bleu
+
+from ptp.components.utils.bleu import bleu_counts, bleu_from_counts
+
+
+class TestBLEU(unittest.TestCase):
+
+    def compare_with_nltk(self, hypotheses, references, hypotheses_valid, references_valid, weights, base=None):
+        """ Compares sentence and corpus BLEU with the ones calculated by NLTK. """
+        counts = bleu_counts(hypotheses, references, len(weights), hypotheses_valid, references_valid, base)
+        scores = bleu_from_counts(*counts, weights)
+        corpus_score = bleu_from_counts(*[c.sum(0) for c in counts], weights)
+
+        # Remove the invalid elements.
+        hyps = [[t for t, v in zip(h, m) if v] for h, m in zip(hypotheses.tolist(), hypotheses_valid.tolist())]
+        refs = [[t for t, v in zip(r, m) if v] for r, m in zip(references.tolist(), references_valid.tolist())]
+
+        with warnings.catch_warnings():
+            # NLTK warns about zero counts of n-gram overlaps.
+            warnings.simplefilter("ignore")
+            for score, hyp, ref in zip(scores.tolist(), hyps, refs):
+                self.assertAlmostEqual(score, sentence_bleu([ref], hyp, weights), places=12)
+            self.assertAlmostEqual(float(corpus_score), corpus_bleu([[ref] for ref in refs], hyps, weights), places=12)
+
+
+    def test_small_vocabulary(self):
+        """ Tests sentences with many n-gram matches (small vocabulary, padding, different lengths). """
+        torch.manual_seed(0)
+        hypotheses = torch.randint(0, 5, (64, 12))
+        references = torch.randint(0, 5, (64, 15))
+        self.compare_with_nltk(hypotheses, references, torch.rand(64, 12) > 0.2, torch.rand(64, 15) > 0.2, [0.25]*4)
+        self.compare_with_nltk(hypotheses, references, torch.rand(64, 12) > 0.5, torch.ones(64, 15, dtype=torch.bool), [0.5, 0.5])
+        # Base given in advance (e.g. size of the vocabulary).
+        self.compare_with_nltk(hypotheses, references, torch.rand(64, 12) > 0.2, torch.rand(64, 15) > 0.2, [0.25]*4, base=5)
+        self.compare_with_nltk(hypotheses, references, torch.rand(64, 12) > 0.2, torch.rand(64, 15) > 0.2, [0.25]*4, base=1000)
+
+
+    def test_large_vocabulary(self):
+        """ Tests indices too big for hashing of n-grams into single integers. """
+        torch.manual_seed(1)
+        hypotheses = torch.randint(0, 4, (32, 10)) * 100003
+        references = torch.randint(0, 4, (32, 10)) * 100003
+        self.compare_with_nltk(hypotheses, references, torch.rand(32, 10) > 0.1, torch.rand(32, 10) > 0.1, [0.25]*4)
+
+
+    def test_edge_cases(self):
+        """ Tests empty hypotheses, identical sentences and sentences shorter than the n-gram order. """
+        hypotheses = torch.tensor([[1, 2, 3, 4, 5], [1, 2, 3, 4, 5], [1, 2, 0, 0, 0], [7, 7, 7, 7, 7]])
+        references = torch.tensor([[1, 2, 3, 4, 5], [5, 4, 3, 2, 1], [1, 2, 3, 0, 0], [7, 7, 0, 0, 0]])
+        hypotheses_valid = torch.tensor([[True]*5, [False]*5, [True, True, False, False, False], [True]*5])
+        references_valid = torch.tensor([[True]*5, [True]*5, [True, True, True, False, False], [True, True, False, False, False]])
+        self.compare_with_nltk(hypotheses, references, hypotheses_valid, references_valid, [0.25]*4)
+
+
+#if __name__ == "__main__":
+#    unittest.main()
@@ -17,6 +17,7 @@
 __author__ = "Tomasz Kornuta"
 
 import unittest
+import numpy as np
 
 from ptp.components.component import Component
 from ptp.components.problems.problem import Problem
@@ -79,6 +80,29 @@ class TestComponent(unittest.TestCase):
         self.assertEqual(data_dict['inputs'], None)
         self.assertEqual(data_dict['targets'], 3)
 
+    def test_statistics_sampling(self):
+        """ Tests whether sampling of episodes is reproducible and does not affect the global numpy generator. """
+        class StatColMockup(object):
+            phase = 'training'
+            episode_index = 0
+
+        decisions = []
+        for _ in range(2):
+            config = ConfigInterface()
+            config.add_config_params({'statistics_collection': {'fraction': 0.5}})
+            component = MockupComponent("sampled_component", config)
+
+            np.random.seed(0)
+            decisions.append([component.should_collect_statistics(StatColMockup()) for _ in range(20)])
+            # Global stream was not consumed.
+            value = np.random.rand()
+            np.random.seed(0)
+            self.assertEqual(value, np.random.rand())
+
+        self.assertEqual(decisions[0], decisions[1])
+        self.assertTrue(any(decisions[0]) and not all(decisions[0]))
+
+
     def test_global_set_get(self):
         """ Tests setting and getting global value. """
         # Set global value.
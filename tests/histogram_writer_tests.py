@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import unittest
+import torch
+
+from ptp.utils.histogram_writer import compute_histogram, HistogramWriter
+
+
+class TensorBoardWriterMockup(object):
+    """ Collects histograms passed to add_histogram_raw. """
+    def __init__(self):
+        self.histograms = []
+
+    def add_histogram_raw(self, tag, min, max, num, sum, sum_squares, bucket_limits, bucket_counts, global_step):
+        self.histograms.append((tag, min, max, num, bucket_limits, bucket_counts))
+
+
+class TestHistogramWriter(unittest.TestCase):
+
+    def test_histogram_equal_to_histc(self):
+        """ Tests whether histogram of a small tensor is equal to the one computed by torch.histc. """
+        tensor = torch.randn(1000)
+        moments, counts = compute_histogram(tensor, bins=10)
+
+        self.assertTrue(torch.equal(counts, torch.histc(tensor, bins=10)))
+        self.assertEqual(moments[:3].tolist(), [tensor.min().item(), tensor.max().item(), 1000])
+
+    def test_constant_tensor(self):
+        """ Tests whether constant tensor is put in the middle bin of [value-1, value+1] range, as by torch.histc. """
+        tensor = torch.ones(5)
+        _, counts = compute_histogram(tensor, bins=4)
+        self.assertTrue(torch.equal(counts, torch.histc(tensor, bins=4)))
+
+    def test_subsample_uses_range_of_all_values(self):
+        """ Tests whether bins of subsampled tensor span the range of all values, matching the exported bucket limits. """
+        tensor = torch.zeros(2000001)
+        tensor[1] = 100
+        moments, counts = compute_histogram(tensor, bins=4)
+
+        # Outlier is skipped by subsampling, but zeros remain in the first bucket (0, 25].
+        self.assertEqual(moments[0].item(), 0)
+        self.assertEqual(moments[1].item(), 100)
+        self.assertEqual(counts.tolist(), [2000001, 0, 0, 0])
+
+        tb_writer = TensorBoardWriterMockup()
+        writer = HistogramWriter(tb_writer, bins=4)
+        writer.add_histogram('zeros', tensor, 0)
+        writer.close()
+
+        _, _, _, num, bucket_limits, bucket_counts = tb_writer.histograms[0]
+        self.assertEqual(num, 2000001)
+        self.assertEqual(bucket_limits, [25, 50, 75, 100])
+        self.assertEqual(bucket_counts, [2000001, 0, 0, 0])
+
+    def test_filters(self):
+        """ Tests whether only parameters matching the filters are exported. """
+        tb_writer = TensorBoardWriterMockup()
+        writer = HistogramWriter(tb_writer, filters='weight')
+        module = torch.nn.Linear(3, 2)
+        writer.add_parameters(module.named_parameters(), 0)
+        writer.close()
+
+        self.assertEqual([h[0] for h in tb_writer.histograms], ['weight'])
+
+
+#if __name__ == "__main__":
+#    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import unittest
+import torch
+import torch.nn.functional as F
+import torchvision.transforms.functional as TF
+
+from ptp.components.utils.image_augmentation import BatchImageAugmentation
+
+
+class TestBatchImageAugmentation(unittest.TestCase):
+
+    def test_affine_equal_to_torchvision(self):
+        """ Tests whether the affine transformations are equal to the ones applied by torchvision (and RandomAffine). """
+        torch.manual_seed(0)
+        height, width = 32, 48
+        images = torch.rand(1, 3, height, width)
+
+        for angle, translation, scale in [(30.0, (3.0, -5.0), 1.2), (-60.0, (0.0, 0.0), 0.8), (0.0, (4.0, 2.0), 1.0), (135.0, (-2.0, 6.0), 0.5)]:
+            expected = TF.affine(images, angle=angle, translate=list(translation), scale=scale, shear=[0.0],
+                interpolation=TF.InterpolationMode.BILINEAR)
+
+            theta = BatchImageAugmentation.inverse_affine_matrices(torch.tensor([angle]), torch.tensor([translation]),
+                torch.tensor([scale]), height, width)
+            grid = F.affine_grid(theta, [1, 3, height, width], align_corners=False)
+            augmented = F.grid_sample(images, grid, mode='bilinear', padding_mode='zeros', align_corners=False)
+
+            self.assertTrue(torch.allclose(augmented, expected, atol=1e-5), "angle = {}".format(angle))
+
+    def test_flip_and_normalization(self):
+        """ Tests horizontal flip and normalization of channels. """
+        images = torch.rand(2, 3, 4, 5)
+        mean, std = [0.1, 0.2, 0.3], [0.5, 0.6, 0.7]
+
+        # Identity transformation along with normalization.
+        augmented = BatchImageAugmentation(mean=mean, std=std)(images)
+        self.assertTrue(torch.allclose(augmented, TF.normalize(images, mean, std)))
+
+        # Flip of all images.
+        augmented = BatchImageAugmentation(flip=1.0)(images)
+        self.assertTrue(torch.equal(augmented, images.flip(-1)))
+
+    def test_from_config(self):
+        """ Tests whether augmentation is created only when it is enabled. """
+        config = {'enabled': False, 'rotate': [-10, 10], 'translate': [0.1, 0.1], 'scale': [0.9, 1.1], 'flip': 0.5}
+        self.assertIsNone(BatchImageAugmentation.from_config(config))
+        config['enabled'] = True
+        augmentation = BatchImageAugmentation.from_config(config)
+        self.assertEqual(augmentation.rotate, [-10, 10])
+        self.assertEqual(augmentation(torch.rand(3, 1, 8, 8)).shape, (3, 1, 8, 8))
+
+
+#if __name__ == "__main__":
+#    unittest.main()
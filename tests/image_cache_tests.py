@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import unittest
+import os
+import time
+import pickle
+import tempfile
+import numpy as np
+from PIL import Image
+from torch.utils.data import Dataset, DataLoader
+
+from ptp.components.utils.image_cache import ImageCache
+
+
+class CachedImages(Dataset):
+    """ Dataset returning images from the cache. """
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __len__(self):
+        return len(self.cache)
+
+    def __getitem__(self, index):
+        return self.cache.get(self.cache.ids[index])[0]
+
+
+class TestImageCache(unittest.TestCase):
+
+    def setUp(self):
+        # Create folder with a few small images of different sizes.
+        self.folder = tempfile.TemporaryDirectory()
+        self.image_folder = os.path.join(self.folder.name, 'images')
+        self.cache_folder = os.path.join(self.folder.name, 'cache')
+        os.makedirs(self.image_folder)
+        for i in range(4):
+            self.save_image(i, 40 * i)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def save_image(self, i, value):
+        image = np.full([10 + i, 12 + 2 * i, 3], value, dtype=np.uint8)
+        image[0, :, 0] = 255
+        Image.fromarray(image).save(os.path.join(self.image_folder, 'img{}.jpg'.format(i)))
+
+    def expected(self, i):
+        """ Returns image resized as by the cache (and transforms.Resize) along with its original size. """
+        img = Image.open(os.path.join(self.image_folder, 'img{}.jpg'.format(i))).convert('RGB')
+        return np.asarray(img.resize((6, 5), Image.BILINEAR)), (img.size[1], img.size[0])
+
+    def test_lazy_fill(self):
+        """ Tests whether images are decoded on first access only. """
+        cache = ImageCache(self.cache_folder, self.image_folder, 5, 6)
+        self.assertEqual(cache.ids, ['img0', 'img1', 'img2', 'img3'])
+
+        image, size = cache.get('img2')
+        expected_image, expected_size = self.expected(2)
+        self.assertTrue(np.array_equal(image, expected_image))
+        self.assertEqual(size, expected_size)
+        self.assertEqual(cache.meta[:, 0].tolist(), [0, 0, 1, 0])
+
+        # Rows are persisted: reopened cache does not decode images again.
+        cache = ImageCache(self.cache_folder, self.image_folder, 5, 6)
+        cache.open()
+        self.assertEqual(cache.meta[:, 0].tolist(), [0, 0, 1, 0])
+
+        cache.build()
+        self.assertEqual(cache.meta[:, 0].tolist(), [1, 1, 1, 1])
+        for i in range(4):
+            image, size = cache.get('img{}'.format(i))
+            self.assertTrue(np.array_equal(image, self.expected(i)[0]))
+            self.assertEqual(size, self.expected(i)[1])
+
+    def test_invalidation(self):
+        """ Tests whether modified images are refilled and cache of a different size is recreated. """
+        cache = ImageCache(self.cache_folder, self.image_folder, 5, 6)
+        cache.build()
+
+        # Modify one of the images.
+        self.save_image(1, 200)
+        os.utime(os.path.join(self.image_folder, 'img1.jpg'), (time.time() + 10, time.time() + 10))
+
+        cache = ImageCache(self.cache_folder, self.image_folder, 5, 6)
+        cache.open()
+        self.assertEqual(cache.meta[:, 0].tolist(), [1, 0, 1, 1])
+        self.assertTrue(np.array_equal(cache.get('img1')[0], self.expected(1)[0]))
+
+        # Cache for a different size is a different file.
+        cache = ImageCache(self.cache_folder, self.image_folder, 4, 4)
+        cache.open()
+        self.assertEqual(cache.images.shape, (4, 4, 4, 3))
+        self.assertEqual(cache.meta[:, 0].tolist(), [0, 0, 0, 0])
+
+        # Adding an image recreates the cache.
+        self.save_image(4, 10)
+        cache = ImageCache(self.cache_folder, self.image_folder, 5, 6)
+        cache.open()
+        self.assertEqual(len(cache), 5)
+        self.assertEqual(cache.meta[:, 0].tolist(), [0, 0, 0, 0, 0])
+
+    def test_workers(self):
+        """ Tests whether mapped arrays are not pickled and rows filled by the DataLoader workers are shared. """
+        cache = ImageCache(self.cache_folder, self.image_folder, 5, 6)
+        cache.get('img0')
+
+        state = pickle.loads(pickle.dumps(cache))
+        self.assertIsNone(state.images)
+        self.assertTrue(np.array_equal(state.get('img0')[0], self.expected(0)[0]))
+
+        # Workers are spawned, so the cache is pickled.
+        loader = DataLoader(CachedImages(cache), batch_size=1, num_workers=1, multiprocessing_context='spawn')
+        images = [batch[0].numpy() for batch in loader]
+        for i in range(4):
+            self.assertTrue(np.array_equal(images[i], self.expected(i)[0]))
+        # Rows were filled by the workers.
+        self.assertEqual(cache.meta[:, 0].tolist(), [1, 1, 1, 1])
+
+
+#if __name__ == "__main__":
+#    unittest.main()
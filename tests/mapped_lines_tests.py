@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import unittest
+import os
+import pickle
+import tempfile
+
+import ptp.components.utils.io as io
+from ptp.components.utils.mapped_lines import MappedLines
+
+
+class TestMappedLines(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def write(self, filename, content):
+        """ Writes (binary) content to the file. """
+        with open(os.path.join(self.folder.name, filename), 'wb') as f:
+            f.write(content)
+
+    def assertSameLines(self, filename):
+        """ Checks whether the mapped lines are equal to the lines loaded from the file. """
+        expected = io.load_string_list_from_txt_file(self.folder.name, filename)
+        lines = MappedLines(self.folder.name, filename)
+        self.assertEqual(len(lines), len(expected))
+        self.assertEqual([lines[i] for i in range(len(lines))], expected)
+        lines.close()
+
+    def test_line_endings(self):
+        """ Tests whether lines are equal to the ones loaded by load_string_list_from_txt_file for different ends of lines. """
+        contents = {
+            'empty.txt': b'',
+            'single_eol.txt': b'\n',
+            'trailing_eol.txt': b'first line\nsecond line\n',
+            'missing_eol.txt': b'first line\nsecond line',
+            'empty_lines.txt': b'\n\nfirst line\n\n\nlast line\n\n',
+            'crlf.txt': b'first line\r\nsecond line\r\n\r\nlast line',
+            'cr.txt': b'first line\rsecond line\r\r',
+            'mixed.txt': b'first\r\nsecond\nthird\rfourth\r\n',
+            'utf8.txt': u'zażółć gęślą jaźń\n日本語\n'.encode('utf-8'),
+            }
+        for filename, content in contents.items():
+            with self.subTest(filename=filename):
+                self.write(filename, content)
+                self.assertSameLines(filename)
+
+    def test_index_invalidated(self):
+        """ Tests whether the index is rebuilt when the file is changed. """
+        self.write('lines.txt', b'first\nsecond\n')
+        self.assertSameLines('lines.txt')
+        # Make the index older, so the check does not rely on resolution of timestamps.
+        index_file = os.path.join(self.folder.name, 'lines.txt.index.npy')
+        past = os.path.getmtime(index_file) - 10
+        os.utime(index_file, (past, past))
+
+        self.write('lines.txt', b'a\nb\nc\n')
+        self.assertSameLines('lines.txt')
+        self.assertGreater(os.path.getmtime(index_file), past)
+
+    def test_pickle(self):
+        """ Tests whether the mapped file is not pickled, but reopened on access. """
+        self.write('lines.txt', b'first\nsecond\n')
+        lines = MappedLines(self.folder.name, 'lines.txt')
+        self.assertEqual(lines[1], 'second')
+        copy = pickle.loads(pickle.dumps(lines))
+        self.assertIsNone(copy.mm)
+        self.assertEqual([copy[0], copy[1]], ['first', 'second'])
+        lines.close()
+        copy.close()
+
+
+#if __name__ == "__main__":
+#    unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import unittest
+import os
+import struct
+import tempfile
+import numpy as np
+import torch
+
+from ptp.utils.app_state import AppState
+from ptp.configuration.config_interface import ConfigInterface
+from ptp.configuration.runtime_context import RuntimeContext
+from ptp.components.problems.image_to_class.mnist import MNIST
+
+
+class TestMNIST(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestMNIST, self).__init__(*args, **kwargs)
+        # Extract absolute path to config.
+        abs_config_path = os.path.realpath(__file__)
+        # Save it in app_state!
+        AppState().absolute_config_path = abs_config_path[:abs_config_path.find("tests")]+"configs/"
+
+    def setUp(self):
+        # Create (small, random) raw MNIST files, so nothing will be downloaded.
+        self.data_folder = tempfile.TemporaryDirectory()
+        raw_folder = os.path.join(self.data_folder.name, "MNIST", "raw")
+        os.makedirs(raw_folder)
+        rng = np.random.RandomState(0)
+        for prefix, num_samples in [("train", 12), ("t10k", 5)]:
+            images = rng.randint(0, 256, size=(num_samples, 28, 28)).astype(np.uint8)
+            labels = rng.randint(0, 10, size=num_samples).astype(np.uint8)
+            with open(os.path.join(raw_folder, prefix + "-images-idx3-ubyte"), 'wb') as f:
+                f.write(struct.pack('>IIII', 2051, num_samples, 28, 28) + images.tobytes())
+            with open(os.path.join(raw_folder, prefix + "-labels-idx1-ubyte"), 'wb') as f:
+                f.write(struct.pack('>II', 2049, num_samples) + labels.tobytes())
+
+    def tearDown(self):
+        self.data_folder.cleanup()
+
+    def build_problem(self, params):
+        """ Builds the problem (in its own context). """
+        config = ConfigInterface(context=RuntimeContext())
+        config.add_config_params(dict({'data_folder': self.data_folder.name}, **params))
+        return MNIST('mnist', config)
+
+    def test_in_memory_batches(self):
+        """ Tests whether batches fetched from memory are equal to batches of samples (for native and resized images). """
+        for size in [{}, {'resize_image': [32, 32]}, {'resize_image': [14, 20]}]:
+            for use_train_data in [True, False]:
+                with self.subTest(size=size, use_train_data=use_train_data):
+                    params = dict({'use_train_data': use_train_data}, **size)
+                    samples = self.build_problem(dict({'in_memory': False}, **params))
+                    # Second time from the cache of resized images.
+                    for _ in range(2):
+                        memory = self.build_problem(dict({'in_memory': True}, **params))
+                        self.assertEqual(len(memory), len(samples))
+
+                        indices = list(reversed(range(len(samples))))[::2] + [0]
+                        expected = samples.collate_fn(samples.__getitems__(indices))
+                        batch = memory.collate_fn(memory.__getitems__(indices))
+                        self.assertEqual(batch['inputs'].shape, (len(indices), 1, samples.height, samples.width))
+                        self.assertEqual(batch['inputs'].dtype, expected['inputs'].dtype)
+                        self.assertTrue(torch.equal(batch['inputs'], expected['inputs']))
+                        self.assertTrue(torch.equal(batch['targets'], expected['targets']))
+                        self.assertEqual(batch['labels'], expected['labels'])
+
+                        # Single samples.
+                        for index in indices:
+                            self.assertTrue(torch.equal(memory[index]['inputs'], samples[index]['inputs']))
+                            self.assertEqual(memory[index]['labels'], samples[index]['labels'])
+
+    def test_cache_folder(self):
+        """ Tests whether resized images are cached in the configured folder, or kept in memory only when it cannot be written. """
+        params = {'in_memory': True, 'resize_image': [14, 20], 'use_train_data': False}
+        reference = self.build_problem(params)
+        self.assertTrue(os.path.isfile(os.path.join(self.data_folder.name, "mnist_test_14x20.pt")))
+
+        with tempfile.TemporaryDirectory() as cache_folder:
+            problem = self.build_problem(dict({'cache_folder': os.path.join(cache_folder, "cache")}, **params))
+            self.assertTrue(os.path.isfile(os.path.join(cache_folder, "cache", "mnist_test_14x20.pt")))
+            self.assertTrue(torch.equal(problem.images, reference.images))
+
+            # Folder that cannot be created (its parent is a file).
+            blocker = os.path.join(cache_folder, "file")
+            open(blocker, 'w').close()
+            problem = self.build_problem(dict({'cache_folder': os.path.join(blocker, "cache")}, **params))
+            self.assertTrue(torch.equal(problem.images, reference.images))
+            self.assertEqual(sorted(os.listdir(cache_folder)), ["cache", "file"])
+
+
+#if __name__ == "__main__":
+#    unittest.main()
@@ -17,12 +17,23 @@
 __author__ = "Tomasz Kornuta"
 
 import unittest
+import argparse
+import copy
+import logging as pylogging
 import os
+import torch
+import tempfile
 
+import ptp.configuration.config_parsing as config_parse
+import ptp.utils.logger as logging
 from ptp.utils.app_state import AppState
+from ptp.data_types.data_dict import DataDict
 from ptp.configuration.config_interface import ConfigInterface
 from ptp.configuration.config_registry import ConfigRegistry
+from ptp.configuration.runtime_context import RuntimeContext
 from ptp.application.pipeline_manager import PipelineManager
+from ptp.utils.statistics_collector import StatisticsCollector
+from ptp.utils.statistics_aggregator import StatisticsAggregator
 
 class TestPipeline(unittest.TestCase):
 
@@ -31,6 +42,8 @@ class TestPipeline(unittest.TestCase):
         # Set required globals.
         app_state = AppState()
         app_state.__setitem__("bow_size", 10, override=True)
+        app_state.__setitem__("input_size", 8, override=True)
+        app_state.__setitem__("prediction_size", 3, override=True)
         # Extract absolute path to config.
         abs_config_path = os.path.realpath(__file__)
         # Save it in app_state!
@@ -123,5 +136,290 @@ class TestPipeline(unittest.TestCase):
         self.assertEqual(pipe[1].name, 'bow_encoder2')
 
 
+    def test_quantize_models(self):
+        """ Tests quantization of models and loading of the quantized checkpoint. """
+        # Instantiate.
+        ConfigRegistry()._clear_registry()
+        config = ConfigInterface()
+        config.add_default_params({
+            'ffn' : 
+                {
+                    'type': 'FeedForwardNetwork',
+                    'priority': 1,
+                    'hidden_sizes': [16]
+                }
+            })
+        pipe = PipelineManager('testpm', config)
+        pipe.build(False)
+        pipe.eval()
+
+        inputs = torch.randn(4, 8)
+        data_dict = DataDict({'inputs': inputs})
+        pipe.models[0](data_dict)
+        fp32_predictions = data_dict['predictions']
+
+        # Quantize and create checkpoint.
+        pipe.quantize()
+        self.assertTrue(pipe.models[0].quantized)
+        chkpt = pipe.create_checkpoint("Quantized", 0.0)
+        self.assertEqual(chkpt['quantized'], ['ffn'])
+
+        # Quantization keeps the interface and (roughly) the outputs.
+        data_dict = DataDict({'inputs': inputs})
+        pipe.models[0](data_dict)
+        int8_predictions = data_dict['predictions']
+        self.assertEqual(int8_predictions.shape, fp32_predictions.shape)
+        self.assertTrue(torch.allclose(int8_predictions, fp32_predictions, atol=0.1))
+
+        # Load the quantized checkpoint into a new (fp32) pipeline.
+        pipe2 = PipelineManager('testpm', config)
+        pipe2.build(False)
+        pipe2.models[0].load_from_checkpoint(chkpt)
+        pipe2.eval()
+        self.assertTrue(pipe2.models[0].quantized)
+
+        data_dict = DataDict({'inputs': inputs})
+        pipe2.models[0](data_dict)
+        self.assertTrue(torch.equal(data_dict['predictions'], int8_predictions))
+
+
+    def test_export_restore(self):
+        """ Tests exporting the pipeline to artifact and restoring it without configuration and vocabulary files. """
+        artifact_dir = tempfile.TemporaryDirectory()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # Create vocabulary source file.
+            with open(os.path.join(tmpdir, 'labels.txt'), 'w') as f:
+                f.write("cat dog bird")
+            # Instantiate.
+            ConfigRegistry()._clear_registry()
+            config = ConfigInterface()
+            config.add_config_params({
+                'label_indexer' : 
+                    {
+                        'type': 'LabelIndexer',
+                        'priority': 1,
+                        'data_folder': tmpdir,
+                        'source_vocabulary_files': 'labels.txt',
+                        'streams': {'inputs': 'labels', 'outputs': 'indices'}
+                    },
+                'ffn' : 
+                    {
+                        'type': 'FeedForwardNetwork',
+                        'priority': 2,
+                        'hidden_sizes': [16]
+                    }
+                })
+            pipe = PipelineManager('testpm', config)
+            pipe.build(False)
+            pipe.eval()
+
+            inputs = torch.randn(2, 8)
+            data_dict = DataDict({'inputs': inputs, 'labels': ['dog', 'bird']})
+            pipe.forward(data_dict)
+
+            # Export pipeline.
+            artifact_file = os.path.join(artifact_dir.name, 'testpm.artifact')
+            pipe.export(artifact_file)
+
+        # Restore the pipeline when the vocabulary file, default configuration files and registry are not available.
+        ConfigRegistry()._clear_registry()
+        default_configs = copy.deepcopy(RuntimeContext.default().default_configs)
+        app_state = AppState()
+        abs_config_path = app_state.absolute_config_path
+        app_state.absolute_config_path = "/nonexistent/"
+        try:
+            restored = PipelineManager.restore(artifact_file)
+        finally:
+            app_state.absolute_config_path = abs_config_path
+            artifact_dir.cleanup()
+
+        # Default configurations were restored into the context of the restored pipeline only.
+        self.assertIn(type(pipe[1]).__module__, restored.context.default_configs)
+        self.assertEqual(RuntimeContext.default().default_configs, default_configs)
+
+        # Check the order and outputs.
+        self.assertEqual(len(restored), 2)
+        self.assertEqual(restored[0].name, 'label_indexer')
+        self.assertEqual(restored[0].word_to_ix, pipe[0].word_to_ix)
+
+        restored_dict = DataDict({'inputs': inputs, 'labels': ['dog', 'bird']})
+        restored.forward(restored_dict)
+        self.assertTrue(torch.equal(restored_dict['indices'], data_dict['indices']))
+        self.assertTrue(torch.equal(restored_dict['predictions'], data_dict['predictions']))
+
+
+    def test_independent_contexts(self):
+        """ Tests whether pipelines with different configurations and globals can be built in independent contexts. """
+        ConfigRegistry()._clear_registry()
+        pipes = []
+        for input_size in [3, 5]:
+            # Create context with its own registry and globals.
+            context = RuntimeContext()
+            context.app_state["input_size"] = input_size
+            context.app_state["prediction_size"] = 2
+            config = ConfigInterface(context=context)
+            config.add_config_params({
+                'pipeline': {
+                    'ffn' : 
+                        {
+                            'type': 'FeedForwardNetwork',
+                            'priority': 1
+                        }
+                    }
+                })
+            pipe = PipelineManager('testpm', config['pipeline'])
+            self.assertEqual(pipe.build(False), 0)
+            pipes.append(pipe)
+
+        # Check that pipelines do not share configuration nor globals.
+        self.assertEqual(pipes[0][0].input_size, 3)
+        self.assertEqual(pipes[1][0].input_size, 5)
+        self.assertEqual(pipes[0][0].app_state["input_size"], 3)
+        self.assertNotIn('pipeline', ConfigRegistry())
+        self.assertEqual(AppState()["input_size"], 8)
+        # Cached default configurations are not shared either.
+        self.assertIsNot(pipes[0].context.default_configs, pipes[1].context.default_configs)
+        pipes[0].context.default_configs[type(pipes[0][0]).__module__]['dropout_rate'] = 0.5
+        self.assertEqual(config_parse.load_class_default_config_file(type(pipes[1][0]), pipes[1].context)['dropout_rate'], 0)
+
+
+    def test_independent_loggers(self):
+        """ Tests whether log level and log file are taken from the application state of a given context. """
+        with tempfile.TemporaryDirectory() as log_dir:
+            loggers = []
+            for log_level in ['DEBUG', 'ERROR']:
+                context = RuntimeContext()
+                context.app_state.args = argparse.Namespace(log_level=log_level)
+                context.app_state.log_file = os.path.join(log_dir, log_level + '.log')
+                loggers.append(logging.initialize_logger('context_' + log_level, app_state=context.app_state))
+
+            self.assertEqual(loggers[0].level, pylogging.DEBUG)
+            self.assertEqual(loggers[1].level, pylogging.ERROR)
+            for logger, log_level in zip(loggers, ['DEBUG', 'ERROR']):
+                file_handlers = [h for h in logger.handlers if isinstance(h, pylogging.FileHandler)]
+                self.assertEqual([h.baseFilename for h in file_handlers], [os.path.join(log_dir, log_level + '.log')])
+                for h in file_handlers:
+                    logger.removeHandler(h)
+                    h.close()
+
+
+    def test_restore_two_artifacts(self):
+        """ Tests whether artifacts with different globals can be restored in a single process. """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            artifact_files = []
+            expected = []
+            for input_size in [3, 5]:
+                # Build and export the pipeline in its own context.
+                context = RuntimeContext()
+                context.app_state["input_size"] = input_size
+                context.app_state["prediction_size"] = 2
+                config = ConfigInterface(context=context)
+                config.add_config_params({'pipeline': {'ffn' : {'type': 'FeedForwardNetwork', 'priority': 1}}})
+                pipe = PipelineManager('testpm', config['pipeline'])
+                pipe.build(False)
+                pipe.eval()
+
+                inputs = torch.randn(2, input_size)
+                data_dict = DataDict({'inputs': inputs})
+                pipe.forward(data_dict)
+                expected.append((inputs, data_dict['predictions']))
+
+                artifact_files.append(os.path.join(tmpdir, 'testpm{}.artifact'.format(input_size)))
+                pipe.export(artifact_files[-1])
+
+            restored = [PipelineManager.restore(artifact_file) for artifact_file in artifact_files]
+
+        # Check that every pipeline was restored with its own globals.
+        for pipe, (inputs, predictions), input_size in zip(restored, expected, [3, 5]):
+            self.assertEqual(pipe[0].input_size, input_size)
+            self.assertEqual(pipe[0].app_state["input_size"], input_size)
+            data_dict = DataDict({'inputs': inputs})
+            pipe.forward(data_dict)
+            self.assertTrue(torch.equal(data_dict['predictions'], predictions))
+        # Globals of the default context were not modified.
+        self.assertEqual(AppState()["input_size"], 8)
+
+
+    def test_restore_without_worker(self):
+        """ Tests whether the restored pipeline with a publisher logging at worker interval can be run without worker arguments. """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # Build and export the pipeline in (worker-like) context.
+            context = RuntimeContext()
+            context.app_state["input_size"] = 4
+            context.app_state["prediction_size"] = 3
+            context.app_state["num_classes"] = 3
+            context.app_state.args = argparse.Namespace(logging_interval=1, disable='', use_gpu=False)
+            config = ConfigInterface(context=context)
+            config.add_config_params({'pipeline': {
+                'ffn' : {'type': 'FeedForwardNetwork', 'priority': 1},
+                'precision_recall' : {'type': 'PrecisionRecallStatistics', 'priority': 2}
+                }})
+            pipe = PipelineManager('testpm', config['pipeline'])
+            self.assertEqual(pipe.build(False), 0)
+            artifact_file = os.path.join(tmpdir, 'testpm.artifact')
+            pipe.export(artifact_file)
+
+            restored = PipelineManager.restore(artifact_file)
+
+        # Worker arguments are not set in the restored context.
+        self.assertIsNone(restored[1].app_state.args)
+        self.assertFalse(restored[1].is_logging_episode())
+        restored.eval()
+        data_dict = DataDict({'inputs': torch.randn(5, 4), 'targets': torch.tensor([0, 1, 2, 1, 0])})
+        restored.forward(data_dict)
+        self.assertEqual(data_dict['predictions'].shape, (5, 3))
+
+        # Statistics can be still collected.
+        stat_col = StatisticsCollector()
+        restored.add_statistics(stat_col)
+        stat_col.next_episode()
+        restored.collect_statistics(stat_col, data_dict)
+        self.assertIn('f1score', stat_col)
+
+        # The logging interval of the worker is respected.
+        self.assertTrue(pipe[1].is_logging_episode())
+        context.app_state.args.logging_interval = 2
+        context.app_state.episode = 3
+        self.assertFalse(pipe[1].is_logging_episode())
+
+
+    def test_aggregators_skipped_in_phase(self):
+        """ Tests whether aggregators of components not collecting statistics in a given phase are left missing. """
+        context = RuntimeContext()
+        context.app_state["input_size"] = 4
+        context.app_state["prediction_size"] = 3
+        context.app_state["num_classes"] = 3
+        context.app_state.args = argparse.Namespace(logging_interval=1, disable='', use_gpu=False)
+        context.app_state.episode = 0
+        config = ConfigInterface(context=context)
+        config.add_config_params({'pipeline': {
+            'ffn' : {'type': 'FeedForwardNetwork', 'priority': 1},
+            'precision_recall' : {'type': 'PrecisionRecallStatistics', 'priority': 2,
+                'statistics_collection': {'phases': 'training'}}
+            }})
+        pipe = PipelineManager('testpm', config['pipeline'])
+        self.assertEqual(pipe.build(False), 0)
+        pipe.eval()
+
+        for phase, collected in [('training', True), ('validation', False)]:
+            stat_col = StatisticsCollector(phase=phase)
+            stat_agg = StatisticsAggregator()
+            pipe.add_statistics(stat_col)
+            pipe.add_aggregators(stat_agg)
+
+            stat_col.next_episode()
+            data_dict = DataDict({'inputs': torch.randn(5, 4), 'targets': torch.tensor([0, 1, 2, 0, 1])})
+            pipe.forward(data_dict)
+            pipe.collect_statistics(stat_col, data_dict)
+            pipe.aggregate_statistics(stat_col, stat_agg)
+
+            for key in ['precision', 'recall_macro', 'f1score_std']:
+                self.assertEqual(stat_agg[key] is not None, collected)
+            if not collected:
+                # Missing values are left empty in csv.
+                self.assertEqual(stat_agg.snapshot().to_csv_row(), ','*(len(stat_agg)-1) + '\n')
+                self.assertNotIn('precision', stat_agg.export_to_checkpoint())
+
+
 #if __name__ == "__main__":
 #    unittest.main()
\ No newline at end of file
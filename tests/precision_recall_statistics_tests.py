@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import gc
+import unittest
+import argparse
+import os
+import torch
+import numpy as np
+
+from ptp.utils.app_state import AppState
+from ptp.data_types.data_dict import DataDict
+from ptp.configuration.config_interface import ConfigInterface
+from ptp.configuration.runtime_context import RuntimeContext
+from ptp.utils.statistics_collector import StatisticsCollector
+from ptp.utils.statistics_aggregator import StatisticsAggregator
+from ptp.components.publishers.precision_recall_statistics import PrecisionRecallStatistics
+
+try:
+    from sklearn.metrics import confusion_matrix, precision_recall_fscore_support
+except ImportError:
+    confusion_matrix = None
+
+
+@unittest.skipIf(confusion_matrix is None, "SciKit learn is not installed")
+class TestPrecisionRecallStatistics(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestPrecisionRecallStatistics, self).__init__(*args, **kwargs)
+        # Extract absolute path to config.
+        abs_config_path = os.path.realpath(__file__)
+        # Save it in app_state!
+        AppState().absolute_config_path = abs_config_path[:abs_config_path.find("tests")]+"configs/"
+
+    def build_component(self, params, word_mappings=None):
+        """ Builds the component (in its own context). """
+        context = RuntimeContext()
+        context.app_state.args = argparse.Namespace(logging_interval=1)
+        context.app_state.episode = 0
+        context.app_state["num_classes"] = 4
+        if word_mappings is not None:
+            context.app_state["word_mappings"] = word_mappings
+        config = ConfigInterface(context=context)
+        config.add_config_params(params)
+        return PrecisionRecallStatistics('precision_recall', config)
+
+    def check_against_sklearn(self, component, batches, labels):
+        """ Collects and aggregates statistics over batches, comparing them with the ones computed by sklearn. """
+        stat_col = StatisticsCollector()
+        stat_agg = StatisticsAggregator()
+        component.add_statistics(stat_col)
+        component.add_aggregators(stat_agg)
+
+        for data_dict in batches:
+            stat_col.next_episode()
+            component(data_dict)
+            component.collect_statistics(stat_col, data_dict)
+        component.aggregate_statistics(stat_col, stat_agg)
+
+        targets = torch.cat([d['targets'] for d in batches]).numpy()
+        preds = torch.cat([d['predictions'] for d in batches]).numpy()
+        masks = torch.cat([d['masks'] for d in batches]).numpy() if component.use_masking else np.ones_like(targets)
+        # Only samples with mapped labels are taken into account.
+        selected = np.isin(targets, labels) & np.isin(preds, labels) & (masks > 0)
+
+        expected = confusion_matrix(targets[selected], preds[selected], labels=labels)
+        accumulated = stat_col.get_accumulator(component.key_confusion_matrix)
+        self.assertEqual(accumulated.dtype, np.int64)
+        self.assertTrue(np.array_equal(accumulated, expected))
+
+        for average in ['weighted', 'macro', 'micro']:
+            precision, recall, f1score, _ = precision_recall_fscore_support(targets[selected], preds[selected],
+                labels=labels, average=average, zero_division=0)
+            suffix = '' if average == 'weighted' else '_' + average
+            self.assertAlmostEqual(stat_agg['precision' + suffix], precision)
+            self.assertAlmostEqual(stat_agg['recall' + suffix], recall)
+            self.assertAlmostEqual(stat_agg['f1score' + suffix], f1score)
+
+    def test_without_masks(self):
+        """ Tests the confusion matrix and aggregated scores (without masking). """
+        torch.manual_seed(0)
+        component = self.build_component({'use_prediction_distributions': False})
+        batches = [DataDict({'targets': torch.randint(0, 4, [20]), 'predictions': torch.randint(0, 4, [20])}) for _ in range(3)]
+        self.check_against_sklearn(component, batches, [0, 1, 2, 3])
+
+    def test_with_masks(self):
+        """ Tests the confusion matrix and aggregated scores with masked samples. """
+        torch.manual_seed(1)
+        component = self.build_component({'use_prediction_distributions': False, 'use_masking': True})
+        batches = [DataDict({'targets': torch.randint(0, 4, [20]), 'predictions': torch.randint(0, 4, [20]),
+            'masks': torch.randint(0, 2, [20])}) for _ in range(3)]
+        self.check_against_sklearn(component, batches, [0, 1, 2, 3])
+
+    def test_index_remap(self):
+        """ Tests the confusion matrix and aggregated scores with classes remapped by word mappings. """
+        torch.manual_seed(2)
+        # Index 2 is the first class, indices 3 and 4 are not mapped.
+        component = self.build_component({'use_prediction_distributions': False, 'use_word_mappings': True},
+            word_mappings={'a': 2, 'b': 0, 'c': 1})
+        batches = [DataDict({'targets': torch.randint(0, 5, [20]), 'predictions': torch.randint(0, 5, [20])}) for _ in range(3)]
+        self.check_against_sklearn(component, batches, [2, 0, 1])
+
+    def test_batch_not_kept_alive(self):
+        """ Tests whether the batch is not referenced by the component after the confusion matrix was calculated. """
+        component = self.build_component({'use_prediction_distributions': False})
+        data_dict = DataDict({'targets': torch.tensor([0, 1]), 'predictions': torch.tensor([0, 2])})
+        component(data_dict)
+        self.assertIs(component.last_confusion_matrix[0](), data_dict)
+        del data_dict
+        gc.collect()
+        self.assertIsNone(component.last_confusion_matrix[0]())
+
+
+#if __name__ == "__main__":
+#    unittest.main()
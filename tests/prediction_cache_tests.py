@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import unittest
+import os
+import torch
+import tempfile
+
+from ptp.utils.app_state import AppState
+from ptp.data_types.data_dict import DataDict
+from ptp.configuration.config_interface import ConfigInterface
+from ptp.configuration.runtime_context import RuntimeContext
+from ptp.application.pipeline_manager import PipelineManager
+from ptp.application.prediction_cache import PredictionCache
+
+
+class TestPredictionCache(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestPredictionCache, self).__init__(*args, **kwargs)
+        # Extract absolute path to config.
+        abs_config_path = os.path.realpath(__file__)
+        # Save it in app_state!
+        AppState().absolute_config_path = abs_config_path[:abs_config_path.find("tests")]+"configs/"
+
+    def build_pipeline(self):
+        """ Builds a simple pipeline (in its own context). """
+        context = RuntimeContext()
+        context.app_state["input_size"] = 4
+        context.app_state["prediction_size"] = 3
+        config = ConfigInterface(context=context)
+        config.add_config_params({'pipeline': {'ffn' : {'type': 'FeedForwardNetwork', 'priority': 1}}})
+        pipe = PipelineManager('testpm', config['pipeline'])
+        pipe.build(False)
+        pipe.eval()
+        return pipe
+
+    def test_cached_predictions(self):
+        """ Tests whether cached predictions are equal to the computed ones and repeated samples are not recomputed. """
+        pipe = self.build_pipeline()
+        cache = PredictionCache(pipe, ['inputs'], ['predictions'], max_entries=3)
+
+        inputs = torch.randn(2, 4)
+        # Batch with a repeated sample.
+        batch = DataDict({'inputs': torch.stack([inputs[0], inputs[1], inputs[0]])})
+        cache.forward(batch)
+        self.assertEqual(cache.misses, 2)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(len(cache), 2)
+
+        # Compare with predictions computed without cache.
+        reference = DataDict({'inputs': batch['inputs']})
+        pipe.forward(reference)
+        self.assertTrue(torch.allclose(batch['predictions'], reference['predictions']))
+
+        # Second pass: all samples should be taken from cache.
+        batch = DataDict({'inputs': inputs.flip(0)})
+        cache.forward(batch)
+        self.assertEqual(cache.misses, 2)
+        self.assertEqual(cache.hits, 3)
+        self.assertTrue(torch.allclose(batch['predictions'], reference['predictions'][[1, 0]]))
+
+        # Check LRU limit.
+        batch = DataDict({'inputs': torch.randn(2, 4)})
+        cache.forward(batch)
+        self.assertEqual(len(cache), 3)
+
+    def test_persistence(self):
+        """ Tests storing and loading of the cache. """
+        pipe = self.build_pipeline()
+        cache = PredictionCache(pipe, ['inputs'], ['predictions'])
+        batch = DataDict({'inputs': torch.randn(5, 4)})
+        cache.forward(batch)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_file = os.path.join(tmpdir, 'cache.pt')
+            cache.save(cache_file)
+
+            # Load cache for the same models.
+            loaded = PredictionCache(pipe, ['inputs'], ['predictions'], cache_file=cache_file)
+            self.assertEqual(len(loaded), 5)
+
+            # Entries created for other models must be skipped.
+            other = PredictionCache(self.build_pipeline(), ['inputs'], ['predictions'], cache_file=cache_file)
+            self.assertEqual(len(other), 0)
+
+    def test_refresh(self):
+        """ Tests whether predictions cached before loading a checkpoint (or changing the parameters) are not used. """
+        pipe = self.build_pipeline()
+        cache = PredictionCache(pipe, ['inputs'], ['predictions'])
+        inputs = torch.randn(5, 4)
+        cache.forward(DataDict({'inputs': inputs}))
+
+        # Load parameters of other pipeline from checkpoint.
+        other = self.build_pipeline()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            checkpoint_file = os.path.join(tmpdir, 'testpm_best.pt')
+            torch.save({'name': 'testpm', 'timestamp': '', 'episode': 0, 'loss': 0.0, 'status': '', 'ffn': other[0].state_dict()}, checkpoint_file)
+            pipe.load(checkpoint_file)
+
+        batch = DataDict({'inputs': inputs})
+        cache.forward(batch)
+        self.assertEqual(cache.misses, 10)
+        self.assertEqual(len(cache), 5)
+        reference = DataDict({'inputs': inputs})
+        other.forward(reference)
+        self.assertTrue(torch.allclose(batch['predictions'], reference['predictions']))
+
+        # Parameters changed in place must be followed by an explicit refresh.
+        with torch.no_grad():
+            for param in pipe[0].parameters():
+                param.add_(1.0)
+        cache.refresh()
+        self.assertEqual(len(cache), 0)
+
+
+#if __name__ == "__main__":
+#    unittest.main()
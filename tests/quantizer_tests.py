@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import unittest
+import argparse
+import logging
+import os
+import struct
+import tempfile
+import numpy as np
+import torch
+
+from ptp.utils.app_state import AppState
+from ptp.data_types.data_dict import DataDict
+from ptp.configuration.config_interface import ConfigInterface
+from ptp.configuration.runtime_context import RuntimeContext
+from ptp.application.problem_manager import ProblemManager
+from ptp.application.pipeline_manager import PipelineManager
+from ptp.components.models.feed_forward_network import FeedForwardNetwork
+from ptp.workers.quantizer import Quantizer
+
+
+class TestQuantizer(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestQuantizer, self).__init__(*args, **kwargs)
+        # Extract absolute path to config.
+        abs_config_path = os.path.realpath(__file__)
+        # Save it in app_state!
+        AppState().absolute_config_path = abs_config_path[:abs_config_path.find("tests")]+"configs/"
+
+    def setUp(self):
+        # Create (small, random) raw MNIST files, so nothing will be downloaded.
+        self.data_folder = tempfile.TemporaryDirectory()
+        raw_folder = os.path.join(self.data_folder.name, "MNIST", "raw")
+        os.makedirs(raw_folder)
+        rng = np.random.RandomState(0)
+        for prefix, num_samples in [("train", 8), ("t10k", 40)]:
+            images = rng.randint(0, 256, size=(num_samples, 28, 28)).astype(np.uint8)
+            labels = rng.randint(0, 10, size=num_samples).astype(np.uint8)
+            with open(os.path.join(raw_folder, prefix + "-images-idx3-ubyte"), 'wb') as f:
+                f.write(struct.pack('>IIII', 2051, num_samples, 28, 28) + images.tobytes())
+            with open(os.path.join(raw_folder, prefix + "-labels-idx1-ubyte"), 'wb') as f:
+                f.write(struct.pack('>II', 2049, num_samples) + labels.tobytes())
+        # Worker arguments are kept in the (global) application state.
+        self.args = AppState().args
+
+    def tearDown(self):
+        AppState().args = self.args
+        self.data_folder.cleanup()
+
+    def test_model_quantize(self):
+        """ Tests whether linear layers are replaced with the dynamically quantized ones, keeping the outputs. """
+        config = ConfigInterface(context=RuntimeContext())
+        config.add_config_params({'hidden_sizes': [16], 'dropout_rate': 0.0})
+        config.context.app_state.__setitem__("input_size", 8)
+        config.context.app_state.__setitem__("prediction_size", 3)
+        model = FeedForwardNetwork('ffn', config)
+        model.eval()
+        inputs = torch.randn(5, 8)
+        data_dict = DataDict({'inputs': inputs})
+        model(data_dict)
+        fp32_predictions = data_dict['predictions']
+
+        model.quantize()
+        self.assertTrue(model.quantized)
+        self.assertTrue(model.frozen)
+        modules = [type(module) for module in model.modules()]
+        self.assertNotIn(torch.nn.Linear, modules)
+        self.assertIn(torch.ao.nn.quantized.dynamic.Linear, modules)
+        # Quantization is applied only once.
+        model.quantize()
+        self.assertEqual([type(module) for module in model.modules()], modules)
+
+        data_dict = DataDict({'inputs': inputs})
+        model(data_dict)
+        self.assertEqual(data_dict['predictions'].shape, fp32_predictions.shape)
+        self.assertTrue(torch.allclose(data_dict['predictions'], fp32_predictions, atol=0.1))
+
+    def build_quantizer(self, max_episodes):
+        """ Creates quantizer with a (shuffled) MNIST problem and a simple classifier. """
+        AppState().args = argparse.Namespace(max_episodes=max_episodes, logging_interval=1, disable='', use_gpu=False, log_level='WARNING')
+        quantizer = Quantizer()
+        quantizer.logger = logging.getLogger('quantizer')
+        quantizer.log_dir = self.data_folder.name + '/'
+        quantizer.section = 'testing'
+        quantizer.config = ConfigInterface(context=RuntimeContext())
+        quantizer.config.add_config_params({
+            'testing': {
+                'problem': {'type': 'MNIST', 'data_folder': self.data_folder.name, 'use_train_data': False, 'batch_size': 8},
+                'dataloader': {'shuffle': True}
+                },
+            'pipeline': {
+                'reshaper': {'type': 'ReshapeTensor', 'priority': 1, 'input_dims': [-1, 1, 28, 28], 'output_dims': [-1, 784],
+                    'streams': {'outputs': 'reshaped_images'}, 'globals': {'output_size': 'reshaped_image_size'}},
+                'classifier': {'type': 'FeedForwardNetwork', 'priority': 2, 'hidden_sizes': [32],
+                    'streams': {'inputs': 'reshaped_images'}, 'globals': {'input_size': 'reshaped_image_size', 'prediction_size': 'num_classes'}},
+                'nllloss': {'type': 'NLLLoss', 'priority': 10},
+                'batch_size': {'type': 'BatchSizeStatistics', 'priority': 100}
+                }
+            })
+        quantizer.problem = ProblemManager('testing', quantizer.config['testing'])
+        self.assertEqual(quantizer.problem.build(log=False), 0)
+        quantizer.pipeline = PipelineManager('quantized', quantizer.config['pipeline'])
+        self.assertEqual(quantizer.pipeline.build(False), 0)
+        self.assertEqual(quantizer.pipeline.handshake(quantizer.problem.problem.output_data_definitions(), False), 0)
+        return quantizer
+
+    def test_evaluate_same_batches(self):
+        """ Tests whether consecutive evaluations stream the very same (shuffled) batches. """
+        quantizer = self.build_quantizer(3)
+        first_agg, _ = quantizer.evaluate('first')
+        second_agg, _ = quantizer.evaluate('second')
+        # Limited number of episodes.
+        self.assertEqual(first_agg.aggregators['episodes_aggregated'], 3)
+        self.assertEqual(first_agg.aggregators['loss'], second_agg.aggregators['loss'])
+
+        # Whole set.
+        quantizer = self.build_quantizer(-1)
+        agg, _ = quantizer.evaluate('all')
+        self.assertEqual(agg.aggregators['episodes_aggregated'], 5)
+        self.assertEqual(agg.aggregators['samples_aggregated'], 40)
+
+    def test_compare_quantized(self):
+        """ Tests the comparison of statistics of the original and the quantized pipeline. """
+        quantizer = self.build_quantizer(-1)
+        fp32_agg, fp32_time = quantizer.evaluate('fp32')
+        quantizer.pipeline.quantize()
+        int8_agg, int8_time = quantizer.evaluate('int8')
+        # Results of the quantized pipeline are close to the original ones.
+        self.assertAlmostEqual(fp32_agg.aggregators['loss'], int8_agg.aggregators['loss'], delta=0.05)
+        self.assertTrue(os.path.isfile(os.path.join(self.data_folder.name, 'int8_set_agg_statistics.csv')))
+
+        report = quantizer.create_report(fp32_agg, fp32_time, int8_agg, int8_time)
+        rows = {line.split()[0]: line.split()[1:] for line in report.splitlines() if line.startswith('  ')}
+        self.assertNotIn('episode', rows)
+        fp32_loss, int8_loss, delta = [float(value) for value in rows['loss']]
+        self.assertAlmostEqual(fp32_loss, fp32_agg.aggregators['loss'], places=5)
+        self.assertAlmostEqual(int8_loss, int8_agg.aggregators['loss'], places=5)
+        self.assertAlmostEqual(delta, int8_loss - fp32_loss, places=5)
+
+
+#if __name__ == "__main__":
+#    unittest.main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import unittest
+import os
+import torch
+
+from ptp.utils.app_state import AppState
+from ptp.data_types.data_dict import DataDict
+from ptp.configuration.config_interface import ConfigInterface
+from ptp.configuration.runtime_context import RuntimeContext
+from ptp.configuration.configuration_error import ConfigurationError
+from ptp.components.models.recurrent_neural_network import RecurrentNeuralNetwork
+
+
+class TestRecurrentNeuralNetwork(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestRecurrentNeuralNetwork, self).__init__(*args, **kwargs)
+        # Extract absolute path to config.
+        abs_config_path = os.path.realpath(__file__)
+        # Save it in app_state!
+        AppState().absolute_config_path = abs_config_path[:abs_config_path.find("tests")]+"configs/"
+
+    def build_rnn(self, params):
+        """ Builds the RNN (in its own context). """
+        context = RuntimeContext()
+        context.app_state["input_size"] = 4
+        context.app_state["prediction_size"] = 3
+        config = ConfigInterface(context=context)
+        config.add_config_params(params)
+        return RecurrentNeuralNetwork('rnn', config)
+
+    def forward(self, rnn, inputs, sessions=None):
+        data_dict = DataDict({'inputs': inputs})
+        if sessions is not None:
+            data_dict.extend({'sessions': sessions})
+        rnn(data_dict)
+        return data_dict['predictions']
+
+    def test_incremental_scoring(self):
+        """ Tests whether scoring sequences in parts with the session cache gives the same predictions as scoring them at once. """
+        torch.manual_seed(0)
+        rnn = self.build_rnn({'cell_type': 'LSTM', 'prediction_mode': 'Dense', 'session_cache_size': 10})
+        rnn.eval()
+        inputs = torch.randn(2, 6, 4)
+
+        with torch.no_grad():
+            full = self.forward(rnn, inputs, ['a', 'b'])
+            rnn.reset_sessions()
+            first = self.forward(rnn, inputs[:, :2], ['a', 'b'])
+            # Continue sessions in a different order and in separate batches.
+            second_b = self.forward(rnn, inputs[1:, 2:], ['b'])
+            second_a = self.forward(rnn, inputs[:1, 2:], ['a'])
+
+        self.assertTrue(torch.allclose(first, full[:, :2], atol=1e-6))
+        self.assertTrue(torch.allclose(second_a, full[:1, 2:], atol=1e-6))
+        self.assertTrue(torch.allclose(second_b, full[1:, 2:], atol=1e-6))
+
+    def test_eviction_and_reset(self):
+        """ Tests whether the least recently used sessions are evicted and sessions can be reset. """
+        rnn = self.build_rnn({'cell_type': 'GRU', 'prediction_mode': 'Dense', 'session_cache_size': 2})
+        rnn.eval()
+        inputs = torch.randn(1, 3, 4)
+
+        with torch.no_grad():
+            start = self.forward(rnn, inputs, ['a'])
+            self.forward(rnn, inputs, ['b'])
+            # Use 'a', so 'b' will be the least recently used one.
+            continued = self.forward(rnn, inputs, ['a'])
+            self.forward(rnn, inputs, ['c'])
+            self.assertEqual(list(rnn.sessions_states[False].keys()), ['a', 'c'])
+            # Session 'a' was continued, 'b' was evicted, so it starts from the initial state.
+            self.assertFalse(torch.allclose(continued, start))
+            self.assertTrue(torch.allclose(self.forward(rnn, inputs, ['b']), start))
+
+            rnn.reset_sessions(['c'])
+            self.assertEqual(list(rnn.sessions_states[False].keys()), ['b'])
+            self.assertTrue(torch.allclose(self.forward(rnn, inputs, ['c']), start))
+            rnn.reset_sessions()
+            self.assertEqual(len(rnn.sessions_states[False]), 0)
+            self.assertTrue(torch.allclose(self.forward(rnn, inputs, ['a']), start))
+
+    def test_sessions_separated_by_mode(self):
+        """ Tests whether sessions processed in the training mode do not affect the evaluation. """
+        rnn = self.build_rnn({'cell_type': 'RNN_TANH', 'prediction_mode': 'Dense', 'session_cache_size': 2, 'dropout_rate': 0})
+        inputs = torch.randn(1, 3, 4)
+
+        rnn.eval()
+        with torch.no_grad():
+            start = self.forward(rnn, inputs, ['a'])
+            rnn.reset_sessions()
+        rnn.train()
+        self.forward(rnn, inputs, ['a'])
+        rnn.eval()
+        with torch.no_grad():
+            self.assertTrue(torch.allclose(self.forward(rnn, inputs, ['a']), start))
+        self.assertEqual(list(rnn.sessions_states[True].keys()), ['a'])
+
+        rnn.reset_sessions(training=True)
+        self.assertEqual(len(rnn.sessions_states[True]), 0)
+        self.assertEqual(list(rnn.sessions_states[False].keys()), ['a'])
+
+    def test_duplicated_sessions(self):
+        """ Tests whether batch containing the same session twice is rejected. """
+        rnn = self.build_rnn({'prediction_mode': 'Dense', 'session_cache_size': 2})
+        with self.assertRaises(ValueError):
+            self.forward(rnn, torch.randn(2, 3, 4), ['a', 'a'])
+
+    def test_session_cache_without_inputs(self):
+        """ Tests whether session cache is rejected when inputs are not used. """
+        with self.assertRaises(ConfigurationError):
+            self.build_rnn({'input_mode': 'Autoregression_None', 'session_cache_size': 2})
+
+
+    def test_carry_over_state(self):
+        """ Tests whether the carried over state continues the sequences and is reset separately in both modes. """
+        rnn = self.build_rnn({'cell_type': 'LSTM', 'prediction_mode': 'Dense', 'carry_over_state': True})
+        rnn.eval()
+        inputs = torch.randn(2, 6, 4)
+
+        with torch.no_grad():
+            full = self.forward(rnn, inputs)
+            rnn.reset_state()
+            self.assertTrue(torch.allclose(self.forward(rnn, inputs[:, :3]), full[:, :3], atol=1e-6))
+            self.assertTrue(torch.allclose(self.forward(rnn, inputs[:, 3:]), full[:, 3:], atol=1e-6))
+
+            # State of the training mode is reset, whereas the one of evaluation is kept.
+            rnn.carried_states[True] = rnn.carried_states[False]
+            rnn.reset_state(training=True)
+            self.assertNotIn(True, rnn.carried_states)
+            self.assertIn(False, rnn.carried_states)
+
+            # Batch of different size starts from the initial state.
+            self.assertTrue(torch.allclose(self.forward(rnn, inputs[:1, :3]), full[:1, :3], atol=1e-6))
+
+            rnn.reset_state(training=False)
+            self.assertEqual(len(rnn.carried_states), 0)
+            self.assertTrue(torch.allclose(self.forward(rnn, inputs), full, atol=1e-6))
+
+    def test_carry_over_state_with_session_cache(self):
+        """ Tests whether carrying over the state along with session cache is rejected. """
+        with self.assertRaises(ConfigurationError):
+            self.build_rnn({'carry_over_state': True, 'session_cache_size': 2})
+
+
+#if __name__ == "__main__":
+#    unittest.main()
@@ -93,5 +93,22 @@ class TestSamplerFactory(unittest.TestCase):
         # Check number of samples.
         self.assertEqual(len(sampler), 5)
 
+
+    def test_create_batch_sampler(self):
+        """ Tests whther BatchSampler groups indices returned by the sampler configured in its subsection. """
+
+        config = ConfigInterface()
+        config.add_default_params({'name': 'BatchSampler',
+                                'batch_size': 8,
+                                'sampler': {'name': 'SubsetRandomSampler', 'indices': '0, 20'}})
+        # Create the sampler.
+        sampler = SamplerFactory.build(TestProblemMockup(), config)
+
+        # Check number of batches and their sizes.
+        batches = list(sampler)
+        self.assertEqual(len(sampler), 3)
+        self.assertEqual([len(batch) for batch in batches], [8, 8, 4])
+        self.assertEqual(sorted(sum(batches, [])), list(range(20)))
+
 #if __name__ == "__main__":
 #    unittest.main()
\ No newline at end of file
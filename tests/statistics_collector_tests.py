@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import io
+import tempfile
+import urllib.request
+import torch
+import unittest
+import numpy as np
+
+from ptp.utils.metrics_server import MetricsServer
+from ptp.utils.statistics_collector import StatisticsCollector
+from ptp.utils.statistics_exporter import StatisticsExporter
+from ptp.utils.statistics_sinks import read_binary_statistics, convert_binary_statistics_to_csv
+from ptp.utils.streaming_statistics import StreamingStatistics
+
+
+class TestStatisticsCollector(unittest.TestCase):
+
+    def test_columns(self):
+        """ Tests whether values are appended to typed columns that grow when needed. """
+        stat_col = StatisticsCollector()
+        stat_col.add_statistics('episode', '{:06d}')
+        stat_col.add_statistics('loss', '{:12.10f}')
+
+        num_values = 3 * StatisticsCollector.initial_capacity + 1
+        for episode in range(num_values):
+            stat_col['episode'] = episode
+            stat_col['loss'] = episode / 2
+
+        self.assertEqual(stat_col['episode'].dtype, np.int64)
+        self.assertEqual(stat_col['loss'].dtype, np.float64)
+        self.assertEqual(len(stat_col['episode']), num_values)
+        self.assertTrue(np.array_equal(stat_col['episode'], np.arange(num_values)))
+        self.assertEqual(stat_col['loss'][-1], (num_values - 1) / 2)
+        self.assertEqual(stat_col.export_to_string(), 'episode {:06d}; loss {:12.10f} '.format(num_values - 1, (num_values - 1) / 2))
+
+
+    def test_empty(self):
+        """ Tests whether emptying removes the values but keeps the statistics. """
+        stat_col = StatisticsCollector()
+        stat_col.add_statistics('acc', '{:6.4f}')
+        stat_col.add_statistics('tag', '{}')
+        stat_col['acc'] = 0.5
+        stat_col['tag'] = 'a'
+        self.assertEqual(stat_col['tag'].dtype, object)
+
+        stat_col.empty()
+        self.assertEqual(len(stat_col['acc']), 0)
+        self.assertEqual(len(stat_col['tag']), 0)
+        self.assertTrue('acc' in stat_col)
+
+        stat_col['acc'] = 0.25
+        self.assertEqual(list(stat_col['acc']), [0.25])
+
+
+    def test_binary_sink(self):
+        """ Tests whether statistics written to the binary sink can be read back and converted to csv. """
+        stat_col = StatisticsCollector()
+        stat_col.add_statistics('episode', '{:06d}')
+        stat_col.add_statistics('loss', '{:12.10f}')
+
+        with tempfile.TemporaryDirectory() as log_dir:
+            log_dir += '/'
+            # Binary file, flushed every 4 episodes.
+            sink = stat_col.initialize_binary_file(log_dir, 'statistics.bin', flush_interval=4)
+            for episode in range(10):
+                stat_col['episode'] = episode
+                stat_col['loss'] = 1.0 / (episode + 1)
+                stat_col.export_to_csv()
+            sink.close()
+
+            # Reference csv file.
+            sink = stat_col.initialize_csv_file(log_dir, 'reference.csv')
+            for episode in range(10):
+                stat_col['episode'] = episode
+                stat_col['loss'] = 1.0 / (episode + 1)
+                stat_col.export_to_csv()
+            sink.close()
+
+            keys, _, values = read_binary_statistics(log_dir + 'statistics.bin')
+            self.assertEqual(keys, ['episode', 'loss'])
+            self.assertTrue(np.array_equal(values['episode'], np.arange(10)))
+            self.assertTrue(np.allclose(values['loss'], 1.0 / np.arange(1, 11)))
+
+            convert_binary_statistics_to_csv(log_dir + 'statistics.bin', log_dir + 'statistics.csv')
+            with open(log_dir + 'statistics.csv') as f, open(log_dir + 'reference.csv') as ref:
+                self.assertEqual(f.read(), ref.read())
+
+
+    def test_streaming_statistics(self):
+        """ Tests whether streaming statistics are weighted by batch sizes and can be merged across shards. """
+        rng = np.random.RandomState(0)
+        values = rng.rand(200)
+        batch_sizes = rng.randint(1, 64, size=200)
+
+        # Collect all values in one collector and halves in two "shards" without history.
+        stat_cols = [StatisticsCollector(), StatisticsCollector(keep_history=False), StatisticsCollector(keep_history=False)]
+        for stat_col in stat_cols:
+            stat_col.add_statistics('acc', '{:6.4f}')
+            stat_col.add_statistics('batch_size', '{:06d}')
+        for i, (value, batch_size) in enumerate(zip(values, batch_sizes)):
+            for stat_col in [stat_cols[0], stat_cols[1 + i % 2]]:
+                stat_col['acc'] = value
+                stat_col['batch_size'] = batch_size
+
+        # Check the weighted moments.
+        avg = np.average(values, weights=batch_sizes)
+        std = np.sqrt(np.average((values - avg)**2, weights=batch_sizes))
+        acc = stat_cols[0].get_stream('acc')
+        self.assertAlmostEqual(acc.mean, avg)
+        self.assertAlmostEqual(acc.std(), std)
+        self.assertEqual(acc.min, values.min())
+        self.assertEqual(acc.max, values.max())
+        self.assertEqual(stat_cols[0].get_stream('batch_size').total, batch_sizes.sum())
+
+        # Check merged shards.
+        stat_cols[1].merge(stat_cols[2])
+        merged = stat_cols[1].get_stream('acc')
+        self.assertEqual(merged.count, 200)
+        self.assertAlmostEqual(merged.mean, avg)
+        self.assertAlmostEqual(merged.std(), std)
+        self.assertEqual(merged.quantile(0.5), acc.quantile(0.5))
+        self.assertEqual(len(stat_cols[1]['acc']), 1)
+
+        # Check quantiles (relative accuracy of the sketch is 1%).
+        unweighted = StreamingStatistics()
+        for value in values:
+            unweighted.update(value)
+        for q in [0.5, 0.95]:
+            self.assertAlmostEqual(unweighted.quantile(q), np.quantile(values, q), delta=0.02)
+
+
+    def test_deferred_synchronization(self):
+        """ Tests whether tensor values are deferred and then materialized in the original order. """
+        stat_cols = [StatisticsCollector(keep_history=False), StatisticsCollector(keep_history=False)]
+        for stat_col in stat_cols:
+            stat_col.add_statistics('episode', '{:06d}')
+            stat_col.add_statistics('loss', '{:12.10f}', weighted=False)
+            stat_col.add_statistics('batch_size', '{:06d}')
+
+        with tempfile.TemporaryDirectory() as log_dir:
+            log_dir += '/'
+            for i, stat_col in enumerate(stat_cols):
+                stat_col.initialize_binary_file(log_dir, '{}.bin'.format(i), flush_interval=1)
+
+            for episode in range(5):
+                for stat_col, as_tensor in zip(stat_cols, [False, True]):
+                    stat_col['episode'] = episode
+                    loss = 0.5 * episode
+                    stat_col['loss'] = torch.tensor(loss) if as_tensor else loss
+                    stat_col['batch_size'] = torch.tensor(episode + 1) if as_tensor else episode + 1
+                    stat_col.export_to_csv()
+
+            # Nothing but the very first episode index was materialized yet.
+            self.assertEqual(len(stat_cols[1].deferred), 5 * 4 - 1)
+
+            # Reading triggers synchronization.
+            self.assertEqual(stat_cols[1]['loss'][-1], 2.0)
+            self.assertEqual(len(stat_cols[1].deferred), 0)
+            for key in ['episode', 'loss', 'batch_size']:
+                self.assertEqual(stat_cols[0].get_stream(key).mean, stat_cols[1].get_stream(key).mean)
+
+            for stat_col in stat_cols:
+                stat_col.sink.close()
+            values = [read_binary_statistics(log_dir + '{}.bin'.format(i))[2] for i in range(2)]
+            for key in ['episode', 'loss', 'batch_size']:
+                self.assertTrue(np.array_equal(values[0][key], values[1][key]))
+
+    def test_missing_values(self):
+        """ Tests whether statistics not collected in some episodes are marked as missing and properly weighted. """
+        stat_col = StatisticsCollector(keep_history=False, phase='training')
+        stat_col.add_statistics('episode', '{:06d}')
+        stat_col.add_statistics('batch_size', '{:06d}')
+        stat_col.add_statistics('acc', '{:6.4f}')
+
+        with tempfile.TemporaryDirectory() as log_dir:
+            log_dir += '/'
+            stat_col.initialize_binary_file(log_dir, 'stats.bin', flush_interval=2)
+            for episode in range(6):
+                self.assertEqual(stat_col.next_episode(), episode)
+                stat_col['episode'] = episode
+                stat_col['batch_size'] = episode + 1
+                # Collect accuracy every second episode only.
+                if episode % 2 == 0:
+                    stat_col['acc'] = torch.tensor(float(episode))
+                stat_col.export_to_csv()
+            self.assertFalse(stat_col.is_collected('acc'))
+            stat_col.sink.close()
+
+            # Only the sampled episodes are aggregated, weighted by their batch sizes.
+            acc = stat_col.get_stream('acc')
+            self.assertEqual(acc.count, 3)
+            self.assertAlmostEqual(acc.mean, (0 * 1 + 2 * 3 + 4 * 5) / 9)
+
+            # Missing values are masked...
+            _, _, values = read_binary_statistics(log_dir + 'stats.bin')
+            self.assertEqual(list(values['acc'].mask), [False, True, False, True, False, True])
+            self.assertEqual(list(values['episode']), list(range(6)))
+
+            # ... and left empty in csv.
+            convert_binary_statistics_to_csv(log_dir + 'stats.bin', log_dir + 'stats.csv')
+            with open(log_dir + 'stats.csv') as f:
+                lines = f.read().splitlines()
+            self.assertEqual(lines[2], '000001,000002,')
+            self.assertEqual(lines[3], '000002,000003,2.0000')
+
+
+    def test_exporter(self):
+        """ Tests whether exports done in background are identical to the synchronous ones. """
+        outputs = []
+        for exporter in [None, StatisticsExporter(max_queue_size=2)]:
+            stat_col = StatisticsCollector(keep_history=False)
+            stat_col.add_statistics('episode', '{:06d}')
+            stat_col.add_statistics('loss', '{:6.4f}')
+            if exporter is not None:
+                stat_col.initialize_exporter(exporter)
+            csv_file = io.StringIO()
+            for episode in range(10):
+                stat_col['episode'] = episode
+                if episode % 3 == 0:
+                    stat_col['loss'] = torch.tensor(episode / 4)
+                stat_col.export_to_csv(csv_file)
+            # Snapshots are immutable.
+            snapshot = stat_col.snapshot()
+            with self.assertRaises(AttributeError):
+                snapshot.values = {}
+            if exporter is not None:
+                exporter.close()
+            outputs.append(csv_file.getvalue())
+
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(outputs[0].splitlines()[3], '000003,0.7500')
+        self.assertEqual(outputs[0].splitlines()[4], '000004,')
+
+
+    def test_metrics_server(self):
+        """ Tests whether the published statistics are served in the Prometheus text format. """
+        metrics_server = MetricsServer(0, history=2)
+        try:
+            stat_col = StatisticsCollector(keep_history=False)
+            stat_col.add_statistics('episode', '{:06d}')
+            stat_col.add_statistics('batch_size', '{:06d}')
+            stat_col.add_statistics('loss', '{:6.4f}')
+            stat_col.initialize_metrics(metrics_server, 'training')
+            for episode in range(3):
+                stat_col['episode'] = episode
+                stat_col['batch_size'] = 8
+                stat_col['loss'] = torch.tensor(episode / 2)
+                stat_col.export_to_csv()
+            # Deferred episodes are published during synchronization.
+            stat_col.synchronize()
+
+            with urllib.request.urlopen('http://127.0.0.1:{}/metrics'.format(metrics_server.port)) as response:
+                lines = response.read().decode('utf-8').splitlines()
+        finally:
+            metrics_server.close()
+
+        self.assertIn('ptp_statistic{source="training",statistic="loss"} 1.0', lines)
+        self.assertIn('ptp_recent_statistic{source="training",statistic="episode",offset="1"} 1', lines)
+        self.assertNotIn('ptp_recent_statistic{source="training",statistic="episode",offset="2"} 0', lines)
+        self.assertIn('ptp_episodes_total{source="training"} 3', lines)
+
+    def test_single_snapshot_per_episode(self):
+        """ Tests whether the csv file and the metrics server share a single snapshot of a given episode. """
+        metrics_server = MetricsServer(0)
+        try:
+            with tempfile.TemporaryDirectory() as log_dir:
+                stat_col = StatisticsCollector()
+                stat_col.add_statistics('episode', '{:06d}')
+                stat_col.add_statistics('loss', '{:6.4f}')
+                stat_col.initialize_metrics(metrics_server, 'training')
+                sink = stat_col.initialize_csv_file(log_dir + '/', 'stats.csv')
+                # Count the created snapshots.
+                snapshots = []
+                snapshot = stat_col.snapshot
+                stat_col.snapshot = lambda: snapshots.append(snapshot()) or snapshots[-1]
+                for episode in range(3):
+                    stat_col['episode'] = episode
+                    stat_col['loss'] = episode / 2
+                    stat_col.export_to_csv()
+                    self.assertEqual(len(snapshots), episode + 1)
+                    self.assertIs(metrics_server.latest['training'], snapshots[-1])
+                sink.close()
+
+                with open(log_dir + '/stats.csv') as f:
+                    self.assertEqual(f.read().splitlines(), ['episode,loss', '000000,0.0000', '000001,0.5000', '000002,1.0000'])
+        finally:
+            metrics_server.close()
+
+
+
+#if __name__ == "__main__":
+#    unittest.main()
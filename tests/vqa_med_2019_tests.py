@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import unittest
+import os
+import string
+import tempfile
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from ptp.utils.app_state import AppState
+from ptp.configuration.config_interface import ConfigInterface
+from ptp.configuration.runtime_context import RuntimeContext
+from ptp.configuration.configuration_error import ConfigurationError
+from ptp.components.problems.image_text_to_class.vqa_med_2019 import VQAMED2019
+
+
+class TestVQAMED2019(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestVQAMED2019, self).__init__(*args, **kwargs)
+        # Extract absolute path to config.
+        abs_config_path = os.path.realpath(__file__)
+        # Save it in app_state!
+        AppState().absolute_config_path = abs_config_path[:abs_config_path.find("tests")]+"configs/"
+
+    def setUp(self):
+        # Create (small) training split: question files along with images.
+        self.data_folder = tempfile.TemporaryDirectory()
+        self.split_folder = split_folder = os.path.join(self.data_folder.name, "ImageClef-2019-VQA-Med-Training")
+        os.makedirs(os.path.join(split_folder, "QAPairsByCategory"))
+        os.makedirs(os.path.join(split_folder, "Train_images"))
+        self.qa_pairs = {
+            "C1_Modality_train.txt": ["img1|what modality is shown?|ct", "img2|is this an mri?|yes"],
+            "C2_Plane_train.txt": ["img1|which plane is this image taken?|axial", "img3|is this axial or coronal?|coronal"],
+            "C3_Organ_train.txt": ["img2|what organ system is shown?|lung, mediastinum, pleura"],
+            "C4_Abnormality_train.txt": ["img3|what is abnormal in the ct scan?|\"pneumonia\"", "img1|was the image normal?|no"],
+            }
+        for filename, lines in self.qa_pairs.items():
+            with open(os.path.join(split_folder, "QAPairsByCategory", filename), 'w') as f:
+                f.write("\n".join(lines) + "\n")
+        for i, image_id in enumerate(["img1", "img2", "img3"]):
+            image = np.full([10 + i, 12, 3], 40 * i, dtype=np.uint8)
+            Image.fromarray(image).save(os.path.join(split_folder, "Train_images", image_id + ".jpg"))
+
+    def tearDown(self):
+        self.data_folder.cleanup()
+
+    def build_problem(self, params={}):
+        """ Builds the problem (in its own context). """
+        config = ConfigInterface(context=RuntimeContext())
+        config.add_config_params(dict({'data_folder': self.data_folder.name, 'resize_image': [8, 8], 'image_cache': 'none'}, **params))
+        return VQAMED2019('vqa_med', config)
+
+    def test_former_augmentation_flag(self):
+        """ Tests whether the former use_augmentation flag is rejected. """
+        with self.assertRaises(ConfigurationError):
+            self.build_problem({'use_augmentation': True})
+        self.assertEqual(len(self.build_problem()), 7)
+
+    def load_rows(self, remove_punctuation):
+        """ Loads the samples row by row (as the original implementation did). """
+        table = str.maketrans({key: None for key in string.punctuation})
+        rows = []
+        for file_category, filename in enumerate(sorted(self.qa_pairs.keys())):
+            df = pd.read_csv(os.path.join(self.split_folder, "QAPairsByCategory", filename), sep='|', header=None,
+                names=['image_ids', 'questions', 'answers'])
+            for _, row in df.iterrows():
+                question, answer = row['questions'], row['answers']
+                if remove_punctuation in ["questions", "all"]:
+                    question = question.translate(table)
+                if remove_punctuation in ["answers", "all"]:
+                    answer = answer.translate(table)
+                # Check if this is binary question.
+                tokens = question.split(' ')
+                binary = tokens[0] in ['is', 'was', 'are', 'does'] and 'or' not in tokens
+                rows.append((row['image_ids'], question, answer, 4 if binary else file_category))
+        return rows
+
+    def test_columnar_index(self):
+        """ Tests whether samples from the columnar index are equal to the ones loaded row by row. """
+        for remove_punctuation in ['none', 'questions', 'answers', 'all']:
+            problem = self.build_problem({'remove_punctuation': remove_punctuation})
+            rows = self.load_rows(remove_punctuation)
+            self.assertEqual(len(problem), len(rows))
+            for index, (image_id, question, answer, category) in enumerate(rows):
+                sample = problem[index]
+                self.assertEqual(sample['image_ids'], image_id)
+                self.assertEqual(sample['questions'], question)
+                self.assertEqual(sample['answers'], answer)
+                self.assertEqual(sample['category_ids'], category)
+                self.assertEqual(sample['category_names'], problem.category_idx_to_word[category])
+                self.assertEqual(tuple(sample['images'].shape), (3, 8, 8))
+
+    def test_cached_index(self):
+        """ Tests whether the cached index is reused and recreated when the source files change. """
+        self.build_problem()
+        cache_folder = os.path.join(self.split_folder, 'index_cache')
+        self.assertEqual(len(os.listdir(cache_folder)), 1)
+
+        # Same samples from the cached index (with the same settings).
+        problem = self.build_problem()
+        self.assertEqual(len(os.listdir(cache_folder)), 1)
+        self.assertEqual(problem[5]['answers'], 'pneumonia')
+
+        # Different index for different settings.
+        self.build_problem({'categories': 'C1,C3'})
+        self.assertEqual(len(os.listdir(cache_folder)), 2)
+
+        # Modified source file invalidates the index.
+        filename = os.path.join(self.split_folder, "QAPairsByCategory", "C4_Abnormality_train.txt")
+        with open(filename, 'w') as f:
+            f.write("img2|what is abnormal?|nodule\n")
+        os.utime(filename, (os.path.getmtime(filename) + 10, os.path.getmtime(filename) + 10))
+        problem = self.build_problem()
+        self.assertEqual(len(problem), 6)
+        self.assertEqual(problem[5]['answers'], 'nodule')
+
+
+#if __name__ == "__main__":
+#    unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import unittest
+import logging
+import os
+import tempfile
+import torch
+
+import ptp.components.utils.io as io
+import ptp.components.utils.word_mappings as wm
+from ptp.utils.app_state import AppState
+from ptp.configuration.config_interface import ConfigInterface
+from ptp.configuration.runtime_context import RuntimeContext
+from ptp.configuration.configuration_error import ConfigurationError
+from ptp.application.problem_manager import ProblemManager
+from ptp.components.problems.text_to_text.wikitext_language_modeling import WikiTextLanguageModeling
+
+
+class TestWikiTextLanguageModeling(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestWikiTextLanguageModeling, self).__init__(*args, **kwargs)
+        # Extract absolute path to config.
+        abs_config_path = os.path.realpath(__file__)
+        # Save it in app_state!
+        AppState().absolute_config_path = abs_config_path[:abs_config_path.find("tests")]+"configs/"
+
+    def setUp(self):
+        # Create (small) source files, so nothing will be downloaded.
+        self.data_folder = tempfile.TemporaryDirectory()
+        self.lines = {
+            'train': [" = Title = \n", "\n", " the cat sat on the mat . \n", " a dog ran , the cat sat . \n", " end of text \n"],
+            'valid': [" the dog sat . \n"],
+            'test': [" a new word \n"]
+            }
+        for subset, lines in self.lines.items():
+            with open(os.path.join(self.data_folder.name, "wiki.{}.tokens".format(subset)), 'w') as f:
+                f.writelines(lines)
+
+    def tearDown(self):
+        self.data_folder.cleanup()
+
+    def build_problem(self, params):
+        """ Builds the problem (in its own context). """
+        config = ConfigInterface(context=RuntimeContext())
+        config.add_config_params(dict({'data_folder': self.data_folder.name, 'output_indices': True}, **params))
+        return WikiTextLanguageModeling('wikitext', config)
+
+    def tokens(self, subset='train'):
+        """ Returns tokens of the subset, tokenized as by the original implementation. """
+        return " <eos> ".join(self.lines[subset]).split()
+
+    def test_encode_tokens(self):
+        """ Tests whether the encoded subsets are equal to the texts tokenized by joining sentences with <eos> tokens. """
+        for subset in ['train', 'valid', 'test']:
+            problem = self.build_problem({'subset': subset, 'sentence_length': 1})
+            # Tokenization used by the original implementation.
+            sentences = io.load_string_list_from_txt_file(self.data_folder.name, "wiki.{}.tokens".format(subset))
+            tokens = " <eos> ".join(sentences).split()
+            self.assertEqual(problem.to_words(problem.token_ids), tokens)
+            self.assertEqual(len(problem), len(tokens) - 2)
+
+        # Vocabulary is shared by all subsets, with <PAD> and <eos> tokens.
+        self.assertEqual(problem.word_to_ix['<PAD>'], 0)
+        self.assertEqual(problem.word_to_ix['word'], len(problem.word_to_ix) - 2)
+        self.assertEqual(problem.word_to_ix['<eos>'], len(problem.word_to_ix) - 1)
+
+    def test_word_mappings_without_eos(self):
+        """ Tests whether <eos> token is added to word mappings created by other components and saved to the file. """
+        words = sorted(set(" ".join(sum(self.lines.values(), [])).split()))
+        wm.save_word_mappings_to_csv_file(logging.getLogger('test'), self.data_folder.name, 'wiki.all.tokenized_words', {w: i for i, w in enumerate(words)})
+
+        problem = self.build_problem({})
+        self.assertEqual(problem.word_to_ix['<eos>'], len(words))
+        self.assertEqual(wm.load_word_mappings_from_csv_file(logging.getLogger('test'), self.data_folder.name, 'wiki.all.tokenized_words'), problem.word_to_ix)
+        self.assertEqual(int(problem.token_ids.max()), len(words))
+
+    def test_contiguous_windows(self):
+        """ Tests whether consecutive batches contain consecutive windows of contiguous lanes. """
+        problem = self.build_problem({'batching': 'contiguous', 'batch_size': 3, 'sentence_length': 2})
+        tokens = self.tokens()
+        lane_length = len(tokens) // 3
+        num_windows = (lane_length - 3) // 2 + 1
+        self.assertEqual(len(problem), num_windows * 3)
+
+        for window in range(num_windows):
+            # Whole batch and single samples.
+            batch = problem.__getitems__(list(range(window * 3, window * 3 + 3)))
+            for lane in range(3):
+                start = lane * lane_length + window * 2
+                expected = tokens[start:start+3]
+                sample = problem[window * 3 + lane]
+                self.assertEqual(problem.to_words(sample['sources']), expected[:-1])
+                self.assertEqual(problem.to_words(sample['targets']), expected[1:])
+                self.assertTrue(torch.equal(batch['sources'][lane], sample['sources']))
+                self.assertTrue(torch.equal(batch['targets'][lane], sample['targets']))
+
+        # Batch of samples from different windows and lanes.
+        indices = [4, 0, len(problem) - 1]
+        batch = problem.__getitems__(indices)
+        for i, index in enumerate(indices):
+            self.assertTrue(torch.equal(batch['sources'][i], problem[index]['sources']))
+
+    def test_overlapping_windows(self):
+        """ Tests whether overlapping windows are rejected in contiguous batching mode. """
+        with self.assertRaises(ConfigurationError):
+            self.build_problem({'batching': 'contiguous', 'batch_size': 2, 'sentence_length': 3, 'bptt_stride': 2})
+
+    def test_sequential_batches_not_shuffled(self):
+        """ Tests whether contiguous batching disables shuffling and cannot be used along with sampler. """
+        for sampler, errors in [({}, 0), ({'name': 'SubsetRandomSampler', 'indices': '0, 2'}, 1)]:
+            config = ConfigInterface(context=RuntimeContext())
+            config.add_config_params({
+                'problem': {'type': 'WikiTextLanguageModeling', 'data_folder': self.data_folder.name, 'output_indices': True,
+                    'batching': 'contiguous', 'batch_size': 2, 'sentence_length': 2},
+                'sampler': sampler
+                })
+            manager = ProblemManager('training', config)
+            self.assertEqual(manager.build(log=False), errors)
+            if errors == 0:
+                self.assertFalse(config['dataloader']['shuffle'])
+                batches = [batch['indices'] for batch in manager.dataloader]
+                self.assertEqual(batches, [[i, i+1] for i in range(0, len(manager.problem), 2)])
+
+
+#if __name__ == "__main__":
+#    unittest.main()
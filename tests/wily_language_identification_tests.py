@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import unittest
+import os
+import tempfile
+
+import ptp.components.utils.io as io
+from ptp.utils.app_state import AppState
+from ptp.configuration.config_interface import ConfigInterface
+from ptp.configuration.runtime_context import RuntimeContext
+from ptp.components.problems.text_to_class.wily_language_identification import WiLYLanguageIdentification
+
+
+class TestWiLYLanguageIdentification(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestWiLYLanguageIdentification, self).__init__(*args, **kwargs)
+        # Extract absolute path to config.
+        abs_config_path = os.path.realpath(__file__)
+        # Save it in app_state!
+        AppState().absolute_config_path = abs_config_path[:abs_config_path.find("tests")]+"configs/"
+
+    def setUp(self):
+        # Create (small) dataset, so nothing will be downloaded.
+        self.data_folder = tempfile.TemporaryDirectory()
+        self.write("x_train.txt", b"Ein Satz.\r\nA sentence.\r\nZdanie.\r\nAnother sentence.")
+        self.write("y_train.txt", b"deu\r\neng\r\npol\r\neng")
+        self.write("x_test.txt", b"Test.\n")
+        self.write("y_test.txt", b"eng\n")
+
+    def tearDown(self):
+        self.data_folder.cleanup()
+
+    def write(self, filename, content):
+        """ Writes (binary) content to the file. """
+        with open(os.path.join(self.data_folder.name, filename), 'wb') as f:
+            f.write(content)
+
+    def build_problem(self, params):
+        """ Builds the problem (in its own context). """
+        config = ConfigInterface(context=RuntimeContext())
+        config.add_config_params(dict({'data_folder': self.data_folder.name}, **params))
+        return WiLYLanguageIdentification('wily', config)
+
+    def assertSamples(self, problem, inputs_file, targets_file):
+        """ Checks whether samples (and batch) are equal to the loaded lines. """
+        inputs = io.load_string_list_from_txt_file(self.data_folder.name, inputs_file)
+        targets = io.load_string_list_from_txt_file(self.data_folder.name, targets_file)
+        self.assertEqual(len(problem), len(targets))
+        self.assertEqual([problem[i]['inputs'] for i in range(len(problem))], inputs)
+        self.assertEqual([problem[i]['targets'] for i in range(len(problem))], targets)
+        indices = list(reversed(range(len(problem))))
+        batch = problem.__getitems__(indices)
+        self.assertEqual(batch['inputs'], [inputs[i] for i in indices])
+        self.assertEqual(batch['targets'], [targets[i] for i in indices])
+
+    def test_samples(self):
+        """ Tests whether samples are equal to the lines loaded from the files. """
+        problem = self.build_problem({'use_train_data': True})
+        self.assertSamples(problem, "x_train.txt", "y_train.txt")
+        # Labels are encoded in order of appearance.
+        self.assertEqual(problem.target_labels, ['deu', 'eng', 'pol'])
+        self.assertEqual(problem.target_codes.tolist(), [0, 1, 2, 1])
+
+        problem = self.build_problem({'use_train_data': False})
+        self.assertSamples(problem, "x_test.txt", "y_test.txt")
+
+    def test_targets_cache_invalidated(self):
+        """ Tests whether the cached codes of targets are reused, and rebuilt when the file with targets is changed. """
+        self.build_problem({'use_train_data': True})
+        codes_file = os.path.join(self.data_folder.name, "y_train.txt.codes.npy")
+        labels_file = os.path.join(self.data_folder.name, "y_train.txt.labels.txt")
+        self.assertTrue(os.path.isfile(codes_file))
+        self.assertTrue(os.path.isfile(labels_file))
+        # Make the cache older (and the targets even more), so the check does not rely on resolution of timestamps.
+        past = os.path.getmtime(codes_file) - 10
+        os.utime(os.path.join(self.data_folder.name, "y_train.txt"), (past - 10, past - 10))
+        os.utime(codes_file, (past, past))
+
+        # The cache is still valid.
+        problem = self.build_problem({'use_train_data': True})
+        self.assertEqual(os.path.getmtime(codes_file), past)
+        self.assertEqual(problem.target_labels, ['deu', 'eng', 'pol'])
+
+        # Change the targets.
+        self.write("y_train.txt", b"pol\nfra\nfra\npol\n")
+        problem = self.build_problem({'use_train_data': True})
+        self.assertGreater(os.path.getmtime(codes_file), past)
+        self.assertEqual(problem.target_labels, ['pol', 'fra'])
+        self.assertSamples(problem, "x_train.txt", "y_train.txt")
+
+
+#if __name__ == "__main__":
+#    unittest.main()
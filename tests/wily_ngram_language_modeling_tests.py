@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) tkornuta, IBM Corporation 2019
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Tomasz Kornuta"
+
+import unittest
+import logging
+import os
+import tempfile
+import collections
+import numpy as np
+import torch
+
+from ptp.utils.app_state import AppState
+from ptp.data_types.data_dict import DataDict
+from ptp.configuration.config_interface import ConfigInterface
+from ptp.configuration.runtime_context import RuntimeContext
+from ptp.application.problem_manager import ProblemManager
+from ptp.application.pipeline_manager import PipelineManager
+from ptp.components.losses.nll_loss import NLLLoss
+from ptp.components.problems.text_to_class.wily_ngram_language_modeling import WiLYNGramLanguageModeling
+from ptp.workers.trainer import Trainer
+
+
+class TestWiLYNGramLanguageModeling(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestWiLYNGramLanguageModeling, self).__init__(*args, **kwargs)
+        # Extract absolute path to config.
+        abs_config_path = os.path.realpath(__file__)
+        # Save it in app_state!
+        AppState().absolute_config_path = abs_config_path[:abs_config_path.find("tests")]+"configs/"
+
+    def setUp(self):
+        # Create (small) source file, so nothing will be downloaded.
+        self.data_folder = tempfile.TemporaryDirectory()
+        self.write_sentences([
+            "the cat sat on the mat\n",
+            "the cat sat on the mat\n",
+            "a\n",
+            "the dog sat on the cat sat on the mat\n",
+            "\n",
+            "a dog\n"
+            ])
+
+    def tearDown(self):
+        self.data_folder.cleanup()
+
+    def write_sentences(self, sentences):
+        """ Writes sentences to the source file. """
+        self.sentences = sentences
+        with open(os.path.join(self.data_folder.name, "x_train.txt"), 'w') as f:
+            f.writelines(sentences)
+
+    def build_problem(self, params):
+        """ Builds the problem (in its own context). """
+        config = ConfigInterface(context=RuntimeContext())
+        config.add_config_params(dict({'data_folder': self.data_folder.name, 'use_train_data': True}, **params))
+        return WiLYNGramLanguageModeling('wily_ngrams', config)
+
+    def ngrams(self, context):
+        """ Returns all n-grams, generated sentence by sentence. """
+        ngrams = []
+        for sentence in self.sentences:
+            words = sentence.split()
+            ngrams += [tuple(words[i:i+context+1]) for i in range(len(words) - context)]
+        return ngrams
+
+    def test_compute_ngram_starts(self):
+        """ Tests whether the start positions are equal to the ones computed sentence by sentence (also for sentences not longer than context). """
+        rng = np.random.RandomState(0)
+        for context in [1, 2, 5]:
+            # Lengths of sentences, with many of them shorter than context (or empty).
+            lengths = np.concatenate([[0, context, context + 1], rng.randint(0, 2 * context + 2, size=50), [context]])
+            offsets = np.concatenate([[0], np.cumsum(lengths)])
+            expected = [start for i in range(len(lengths)) for start in range(offsets[i], offsets[i+1] - context)]
+            starts = WiLYNGramLanguageModeling.compute_ngram_starts(offsets, context)
+            self.assertEqual(starts.dtype, np.int64)
+            self.assertEqual(starts.tolist(), expected)
+
+        # No n-grams at all.
+        self.assertEqual(len(WiLYNGramLanguageModeling.compute_ngram_starts(np.array([0, 1, 1, 3]), 2)), 0)
+
+    def test_ngrams_equal_to_sentence_loop(self):
+        """ Tests whether the n-grams are equal to the ones generated sentence by sentence. """
+        for context in [1, 2, 3, 6]:
+            problem = self.build_problem({'context': context, 'deduplicate': False})
+            ngrams = self.ngrams(context)
+            self.assertEqual(len(problem), len(ngrams))
+            self.assertEqual([tuple(problem.get_ngram(i)) for i in range(len(problem))], ngrams)
+            # Single samples and the whole batch.
+            batch = problem.__getitems__(list(range(len(problem))))
+            for i, ngram in enumerate(ngrams):
+                self.assertEqual(problem[i]['inputs'], ' '.join(ngram[:-1]))
+                self.assertEqual(problem[i]['targets'], ngram[-1])
+                self.assertEqual(batch['inputs'][i], ' '.join(ngram[:-1]))
+                self.assertEqual(batch['targets'][i], ngram[-1])
+
+    def test_collapse_ngrams(self):
+        """ Tests whether the unique n-grams are in order of their first occurrences, along with numbers of their occurrences. """
+        for context in [1, 2, 3]:
+            problem = self.build_problem({'context': context, 'deduplicate': True})
+            ngrams = self.ngrams(context)
+            expected = collections.Counter(ngrams)
+            # Order of first occurrences.
+            self.assertEqual([tuple(problem.get_ngram(i)) for i in range(len(problem))], list(expected.keys()))
+            self.assertEqual(problem.counts.tolist(), list(expected.values()))
+            self.assertEqual(problem.sample_weights.tolist(), list(expected.values()))
+            # Expanding by counts reproduces the multiset of all n-grams.
+            self.assertEqual(int(problem.counts.sum()), len(ngrams))
+
+            # Weights (normalized by the mean number of occurrences) returned along with the batch.
+            mean_count = len(ngrams) / len(problem)
+            batch = problem.__getitems__([len(problem) - 1, 0])
+            self.assertTrue(np.allclose(batch['weights'].tolist(), [problem.counts[-1] / mean_count, problem.counts[0] / mean_count]))
+            self.assertAlmostEqual(problem[0]['weights'], problem.counts[0] / mean_count)
+
+    def test_unique_cache_invalidated(self):
+        """ Tests whether the collapsed n-grams are recomputed when the indices of words are regenerated. """
+        problem = self.build_problem({'context': 2, 'deduplicate': True})
+        unique_file = os.path.join(self.data_folder.name, "ngrams_train_unique_c2.npy")
+        self.assertTrue(os.path.isfile(unique_file))
+        # Make the cache (and the indices of words even more) older, so the check does not rely on resolution of timestamps.
+        past = os.path.getmtime(unique_file) - 10
+        token_ids_file = os.path.join(self.data_folder.name, "ngrams_train_token_ids.npy")
+        os.utime(token_ids_file, (past - 10, past - 10))
+        os.utime(unique_file, (past, past))
+
+        # The cache is still valid.
+        problem = self.build_problem({'context': 2, 'deduplicate': True})
+        self.assertEqual(os.path.getmtime(unique_file), past)
+
+        # Regenerate the encoded sentences from a different source.
+        for suffix in ["_words.txt", "_token_ids.npy", "_offsets.npy"]:
+            os.remove(os.path.join(self.data_folder.name, "ngrams_train" + suffix))
+        self.write_sentences(["x y z x y z\n", "x y z\n"])
+        problem = self.build_problem({'context': 2, 'deduplicate': True})
+        self.assertGreater(os.path.getmtime(unique_file), past)
+        self.assertEqual([problem.get_ngram(i) for i in range(len(problem))], [['x', 'y', 'z'], ['y', 'z', 'x'], ['z', 'x', 'y']])
+        self.assertEqual(problem.counts.tolist(), [3, 1, 1])
+
+    def test_weighted_loss_equal_to_expanded(self):
+        """ Tests whether the loss weighted by counts of unique n-grams is equal to the loss over all n-grams. """
+        unique = self.build_problem({'context': 2, 'deduplicate': True})
+        expanded = self.build_problem({'context': 2, 'deduplicate': False})
+        num_classes = len(unique.words)
+
+        # Same (random) predictions for all occurrences of a given n-gram.
+        torch.manual_seed(0)
+        ngram_predictions = {}
+        def predict(problem):
+            ngrams = [tuple(problem.get_ngram(i)) for i in range(len(problem))]
+            predictions = torch.stack([ngram_predictions.setdefault(ngram, torch.randn(num_classes).log_softmax(dim=0)) for ngram in ngrams])
+            targets = torch.tensor([problem.words.index(ngram[-1]) for ngram in ngrams])
+            return predictions, targets
+
+        # Loss over unique n-grams, weighted by numbers of their occurrences.
+        config = ConfigInterface(context=RuntimeContext())
+        config.add_config_params({'use_weights': True})
+        loss = NLLLoss('nllloss', config)
+        unique_predictions, unique_targets = predict(unique)
+        batch = unique.__getitems__(list(range(len(unique))))
+        data_dict = DataDict({'predictions': unique_predictions, 'targets': unique_targets, 'weights': batch['weights']})
+        loss(data_dict)
+
+        # Loss over all n-grams.
+        config = ConfigInterface(context=RuntimeContext())
+        config.add_config_params({'use_weights': False})
+        reference = NLLLoss('nllloss', config)
+        predictions, targets = predict(expanded)
+        reference_dict = DataDict({'predictions': predictions, 'targets': targets})
+        reference(reference_dict)
+
+        self.assertEqual(len(expanded), int(unique.counts.sum()))
+        self.assertTrue(torch.allclose(data_dict['loss'], reference_dict['loss']))
+
+        # Normalization does not depend on weights in batch, so mean of losses of (equally sized) minibatches is unbiased.
+        minibatch_losses = []
+        for i in range(len(unique)):
+            minibatch_dict = DataDict({'predictions': unique_predictions[i:i+1], 'targets': unique_targets[i:i+1], 'weights': batch['weights'][i:i+1]})
+            loss(minibatch_dict)
+            minibatch_losses.append(minibatch_dict['loss'])
+        self.assertTrue(torch.allclose(torch.stack(minibatch_losses).mean(), reference_dict['loss']))
+
+    def test_weighted_loss_masking(self):
+        """ Tests whether masked samples do not contribute to the weighted loss. """
+        config = ConfigInterface(context=RuntimeContext())
+        config.add_config_params({'use_weights': True, 'use_masking': True})
+        loss = NLLLoss('nllloss', config)
+        predictions = torch.randn(4, 3).log_softmax(dim=1)
+        targets = torch.tensor([0, 1, 2, 1])
+        weights = torch.tensor([0.5, 1.5, 1.0, 1.0])
+        data_dict = DataDict({'predictions': predictions, 'targets': targets, 'weights': weights, 'masks': torch.tensor([1, 0, 1, 1])})
+        loss(data_dict)
+        losses = -predictions[[0, 2, 3], [0, 2, 1]]
+        self.assertTrue(torch.allclose(data_dict['loss'], (losses * weights[[0, 2, 3]]).sum() / 4))
+
+    def test_weighted_sampler_and_loss_forbidden(self):
+        """ Tests whether using weights of samples both by the WeightedRandomSampler and the loss is detected. """
+        for sampler, use_weights, errors in [({'name': 'WeightedRandomSampler'}, True, 1), ({'name': 'WeightedRandomSampler'}, False, 0), ({}, True, 0)]:
+            config = ConfigInterface(context=RuntimeContext())
+            config.add_config_params({
+                'training': {
+                    'problem': {'type': 'WiLYNGramLanguageModeling', 'data_folder': self.data_folder.name, 'context': 2, 'deduplicate': True},
+                    'sampler': sampler
+                    },
+                'pipeline': {'nllloss': {'type': 'NLLLoss', 'priority': 1, 'use_weights': use_weights}}
+                })
+            trainer = Trainer()
+            trainer.logger = logging.getLogger('trainer')
+            trainer.training = ProblemManager('training', config['training'])
+            self.assertEqual(trainer.training.build(False), 0)
+            trainer.pipeline = PipelineManager('pipeline', config['pipeline'])
+            self.assertEqual(trainer.pipeline.build(False), 0)
+            self.assertEqual(trainer.check_weighted_sampling(trainer.training), errors)
+
+
+#if __name__ == "__main__":
+#    unittest.main()